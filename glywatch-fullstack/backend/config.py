@@ -8,6 +8,13 @@ class NightscoutConfig:
         self.base_url = os.getenv("NIGHTSCOUT_URL", "https://your-nightscout-instance.herokuapp.com")
         self.api_secret = os.getenv("NIGHTSCOUT_API_SECRET", "")
         self.timeout = int(os.getenv("NIGHTSCOUT_TIMEOUT", "30"))
+        self.connect_timeout = float(os.getenv("NIGHTSCOUT_CONNECT_TIMEOUT", "5"))
+        self.max_connections = int(os.getenv("NIGHTSCOUT_MAX_CONNECTIONS", "100"))
+        self.max_keepalive_connections = int(os.getenv("NIGHTSCOUT_MAX_KEEPALIVE_CONNECTIONS", "20"))
+        self.max_connections_per_host = int(os.getenv("NIGHTSCOUT_MAX_CONNECTIONS_PER_HOST", "10"))
+        self.keepalive_expiry = float(os.getenv("NIGHTSCOUT_KEEPALIVE_EXPIRY", "30"))
+        self.client_cache_size = int(os.getenv("NIGHTSCOUT_CLIENT_CACHE_SIZE", "5000"))
+        self.page_size = int(os.getenv("NIGHTSCOUT_PAGE_SIZE", "1000"))  # Documents per paged window request
     
     def is_configured(self) -> bool:
         """Check if Nightscout is properly configured"""
@@ -22,6 +29,9 @@ class NightscoutConfig:
             "base_url": self.base_url,
             "api_secret_configured": bool(self.api_secret),
             "timeout": self.timeout,
+            "connect_timeout": self.connect_timeout,
+            "max_connections": self.max_connections,
+            "max_connections_per_host": self.max_connections_per_host,
             "is_configured": self.is_configured()
         }
 
@@ -32,6 +42,17 @@ class SupabaseConfig:
         self.url = os.getenv("SUPABASE_URL", "")
         self.key = os.getenv("SUPABASE_ANON_KEY", "")
         self.service_key = os.getenv("SUPABASE_SERVICE_KEY", "")
+        self.batch_size = int(os.getenv("SUPABASE_BATCH_SIZE", "500"))
+        self.page_size = int(os.getenv("SUPABASE_PAGE_SIZE", "1000"))  # Rows per read page; PostgREST max-rows
+        self.write_queue_size = int(os.getenv("SUPABASE_WRITE_QUEUE_SIZE", "10000"))  # Rows waiting to be written
+        self.write_flush_interval = float(os.getenv("SUPABASE_WRITE_FLUSH_INTERVAL_SECONDS", "0.5"))
+        self.timeout = float(os.getenv("SUPABASE_TIMEOUT", "10"))
+        self.connect_timeout = float(os.getenv("SUPABASE_CONNECT_TIMEOUT", "5"))
+        self.max_concurrency = int(os.getenv("SUPABASE_MAX_CONCURRENCY", "20"))  # PostgREST requests in flight
+        self.max_keepalive_connections = int(os.getenv("SUPABASE_MAX_KEEPALIVE_CONNECTIONS", "10"))
+        self.keepalive_expiry = float(os.getenv("SUPABASE_KEEPALIVE_EXPIRY", "30"))
+        self.db_url = os.getenv("SUPABASE_DB_URL", "")  # Direct Postgres DSN, used only for bulk imports
+        self.bulk_pool_size = int(os.getenv("SUPABASE_BULK_POOL_SIZE", "4"))
     
     def is_configured(self) -> bool:
         """Check if Supabase is properly configured"""
@@ -46,6 +67,90 @@ class SupabaseConfig:
             "is_configured": self.is_configured()
         }
 
+class IngestionConfig:
+    """Configuration for background Nightscout ingestion"""
+    
+    def __init__(self):
+        self.enabled = os.getenv("INGESTION_ENABLED", "true").lower() == "true"
+        self.interval = float(os.getenv("INGESTION_INTERVAL_SECONDS", "300"))  # CGM cadence
+        self.jitter = float(os.getenv("INGESTION_JITTER_SECONDS", "60"))
+        self.max_concurrency = int(os.getenv("INGESTION_MAX_CONCURRENCY", "20"))
+        self.host_rate_limit = float(os.getenv("INGESTION_HOST_RATE_LIMIT", "5"))  # requests/second per host
+        self.lookback_hours = int(os.getenv("INGESTION_LOOKBACK_HOURS", "24"))
+    
+    def get_config_status(self) -> dict:
+        """Get configuration status"""
+        return {
+            "enabled": self.enabled,
+            "interval_seconds": self.interval,
+            "jitter_seconds": self.jitter,
+            "max_concurrency": self.max_concurrency,
+            "host_rate_limit": self.host_rate_limit,
+            "lookback_hours": self.lookback_hours
+        }
+
+class CacheConfig:
+    """Configuration for in-process read caches"""
+    
+    def __init__(self):
+        self.cgm_interval = float(os.getenv("CGM_INTERVAL_SECONDS", "300"))  # Sensor reading cadence
+        self.latest_max_size = int(os.getenv("LATEST_CACHE_MAX_SIZE", "10000"))
+        self.latest_grace = float(os.getenv("LATEST_CACHE_GRACE_SECONDS", "15"))  # Upload delay after a reading
+        self.latest_min_ttl = float(os.getenv("LATEST_CACHE_MIN_TTL_SECONDS", "5"))
+        self.recent_capacity = int(os.getenv("RECENT_READINGS_CAPACITY", "288"))  # Readings kept per patient (24h)
+        self.recent_max_patients = int(os.getenv("RECENT_READINGS_MAX_PATIENTS", "10000"))
+
+class ResilienceConfig:
+    """Configuration for upstream retries and circuit breakers"""
+    
+    def __init__(self):
+        self.failure_threshold = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+        self.reset_timeout = float(os.getenv("CIRCUIT_RESET_TIMEOUT_SECONDS", "30"))
+        self.max_retries = int(os.getenv("UPSTREAM_MAX_RETRIES", "2"))
+        self.base_delay = float(os.getenv("UPSTREAM_RETRY_BASE_DELAY", "0.2"))
+        self.max_delay = float(os.getenv("UPSTREAM_RETRY_MAX_DELAY", "2"))
+        self.fanout_deadline = float(os.getenv("FANOUT_DEADLINE_SECONDS", "10"))  # Shared deadline for combined endpoints
+
+class AlertConfig:
+    """Default alert rules applied to ingested readings"""
+    
+    def __init__(self):
+        self.high_threshold = int(os.getenv("ALERT_HIGH_THRESHOLD", "180"))
+        self.low_threshold = int(os.getenv("ALERT_LOW_THRESHOLD", "70"))
+        self.hysteresis = int(os.getenv("ALERT_HYSTERESIS", "10"))  # mg/dL past a threshold before an alert clears
+        self.realert_minutes = float(os.getenv("ALERT_REALERT_MINUTES", "30"))
+        self.max_reading_age_minutes = float(os.getenv("ALERT_MAX_READING_AGE_MINUTES", "30"))  # Older readings never alert
+        self.recent_limit = int(os.getenv("ALERT_RECENT_LIMIT", "200"))
+        self.recent_per_patient = int(os.getenv("ALERT_RECENT_PER_PATIENT", "50"))
+        self.predictive_horizon_minutes = float(os.getenv("PREDICTIVE_LOW_HORIZON_MINUTES", "30"))
+        self.predictive_window_minutes = float(os.getenv("PREDICTIVE_LOW_WINDOW_MINUTES", "20"))  # Readings used for the fit
+        self.predictive_min_points = int(os.getenv("PREDICTIVE_LOW_MIN_POINTS", "3"))
+
+class SOSConfig:
+    """Configuration for SOS dispatch"""
+    
+    def __init__(self):
+        self.workers = int(os.getenv("SOS_WORKERS", "4"))
+        self.db_slots = int(os.getenv("SOS_DB_SLOTS", "2"))  # PostgREST requests reserved for SOS, beyond the shared limit
+        self.dedup_seconds = float(os.getenv("SOS_DEDUP_SECONDS", "60"))  # Repeats within this window are merged
+        self.max_attempts = int(os.getenv("SOS_MAX_ATTEMPTS", "5"))
+        self.delivery_timeout = float(os.getenv("SOS_DELIVERY_TIMEOUT_SECONDS", "5"))
+        self.recovery_hours = float(os.getenv("SOS_RECOVERY_HOURS", "1"))  # Undelivered outbox rows resent on startup
+
+class ReportsConfig:
+    """Configuration for clinical reports"""
+    
+    def __init__(self):
+        self.agp_days = int(os.getenv("AGP_DAYS", "14"))
+        self.agp_max_patients = int(os.getenv("AGP_MAX_PATIENTS", "500"))  # Precomputed profiles kept in memory
+        self.utc_offset_minutes = int(os.getenv("REPORTS_UTC_OFFSET_MINUTES", "0"))  # Local time for time-of-day bins
+
 # Global configuration instances
 nightscout_config = NightscoutConfig()
-supabase_config = SupabaseConfig() 
\ No newline at end of file
+supabase_config = SupabaseConfig()
+ingestion_config = IngestionConfig()
+cache_config = CacheConfig()
+resilience_config = ResilienceConfig()
+reports_config = ReportsConfig()
+alert_config = AlertConfig()
+sos_config = SOSConfig() 
\ No newline at end of file
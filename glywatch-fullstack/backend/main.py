@@ -1,8 +1,35 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from routers import auth, cgm, alerts, chat, sos, location, ai, preferences, reports, users
+from config import ingestion_config, supabase_config
+from services.http_client import close_http_clients
+from services.bulk_loader import bulk_loader
+from services.ingestion import ingestion_scheduler
+from services.sos_dispatcher import sos_dispatcher
+from services.supabase_service import supabase_service
+from services.write_behind import write_queue
 
-app = FastAPI(title="GlyWatch API", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # SOS dispatch first, resending anything left undelivered by the last run
+    await sos_dispatcher.start()
+    # Batch database writes off the request path
+    write_queue.start()
+    # Poll every patient's Nightscout in the background so reads can be served from storage
+    if ingestion_config.enabled and supabase_config.is_configured():
+        ingestion_scheduler.start()
+    yield
+    await ingestion_scheduler.stop()
+    await sos_dispatcher.stop()
+    # Flush queued writes before the process exits
+    await write_queue.stop()
+    # Release pooled upstream connections on shutdown
+    await close_http_clients()
+    await supabase_service.aclose()
+    await bulk_loader.aclose()
+
+app = FastAPI(title="GlyWatch API", version="1.0.0", lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -0,0 +1,63 @@
+-- Migration 001: sensor-time indexes
+-- Run in your Supabase SQL Editor on databases created from an earlier supabase_tables.sql
+--
+-- Latest and range reads filter on patient_id and order by the reading's own sensor time,
+-- newest first. A btree on (patient_id, sensor time) answers them with one backward range
+-- scan, so the natural-key unique indexes already serve glucose readings and device
+-- status. The glucose key gains INCLUDE columns so the history and latest-reading
+-- projections are served from the index alone, without a second index to maintain on
+-- every insert. Single-column patient_id indexes are a prefix of the composites and only
+-- cost writes, so they are dropped.
+--
+-- Plain CREATE INDEX locks writes to each table while it builds. On a large table, run
+-- each CREATE INDEX on its own as CREATE INDEX CONCURRENTLY outside a transaction instead.
+
+-- Glucose readings: latest reading, history pages and the latest_glucose_readings view.
+-- An index cannot gain INCLUDE columns in place, so the key is rebuilt once under a new
+-- name and swapped in; ON CONFLICT (patient_id, timestamp) keeps inferring it.
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_index
+        WHERE indexrelid = to_regclass('idx_glucose_readings_patient_timestamp')
+            AND indnatts > indnkeyatts
+    ) THEN
+        CREATE UNIQUE INDEX idx_glucose_readings_patient_timestamp_covering
+            ON glucose_readings(patient_id, timestamp)
+            INCLUDE (glucose, trend, status, raw, filtered, noise);
+        DROP INDEX IF EXISTS idx_glucose_readings_patient_timestamp;
+        ALTER INDEX idx_glucose_readings_patient_timestamp_covering
+            RENAME TO idx_glucose_readings_patient_timestamp;
+    END IF;
+END $$;
+DROP INDEX IF EXISTS idx_glucose_readings_patient_id;
+
+-- Readings without a sensor time cannot be deduplicated by the key and would sort as the newest
+DELETE FROM glucose_readings WHERE timestamp IS NULL;
+
+CREATE OR REPLACE VIEW latest_glucose_readings AS
+SELECT DISTINCT ON (patient_id)
+    patient_id, glucose, timestamp, trend, status, raw, filtered, noise
+FROM glucose_readings
+WHERE timestamp IS NOT NULL
+ORDER BY patient_id, timestamp DESC;
+
+-- Treatments: per-patient treatment windows by sensor time
+CREATE INDEX IF NOT EXISTS idx_treatments_patient_timestamp_desc
+    ON treatments(patient_id, timestamp DESC);
+DROP INDEX IF EXISTS idx_treatments_patient_id;
+
+-- Device status: its sensor time is last_communication, already indexed by the natural key
+-- idx_device_status_patient_communication (patient_id, last_communication)
+DROP INDEX IF EXISTS idx_device_status_patient_id;
+DELETE FROM device_status WHERE last_communication IS NULL;
+
+-- Refresh planner statistics for the new indexes
+ANALYZE glucose_readings;
+ANALYZE treatments;
+ANALYZE device_status;
+
+-- Index-only scans also depend on the visibility map, which autovacuum keeps current.
+-- To have it ready immediately, run this separately afterwards (VACUUM cannot run inside
+-- the transaction the SQL Editor wraps a script in):
+--     VACUUM glucose_readings;
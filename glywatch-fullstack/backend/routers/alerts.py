@@ -1,48 +1,33 @@
 from fastapi import APIRouter, HTTPException
 from typing import List, Optional
 from datetime import datetime
+from services.alert_engine import alert_engine
+from services.prediction import predictive_lows
 
 router = APIRouter(prefix="/alerts", tags=["Alerts"])
 
 @router.get("/")
-async def get_alerts():
-    # TODO: Implement actual alerts retrieval
-    return {
-        "alerts": [
-            {
-                "id": 1,
-                "type": "high_glucose",
-                "message": "Glucose level is high: 180 mg/dL",
-                "timestamp": "2024-01-01T10:15:00",
-                "severity": "warning",
-                "acknowledged": False
-            },
-            {
-                "id": 2,
-                "type": "low_glucose",
-                "message": "Glucose level is low: 70 mg/dL",
-                "timestamp": "2024-01-01T09:30:00",
-                "severity": "critical",
-                "acknowledged": True
-            }
-        ]
-    }
+async def get_alerts(patient_id: Optional[str] = None, limit: int = 50):
+    """Get the newest alerts raised from ingested readings, for one patient or everyone"""
+    return await alert_engine.get_alerts(patient_id, limit)
+
+@router.get("/predicted-lows")
+async def get_predicted_lows():
+    """Get patients projected to go low from the last ingestion tick"""
+    return predictive_lows.last_scan
 
 @router.post("/acknowledge/{alert_id}")
-async def acknowledge_alert(alert_id: int):
-    # TODO: Implement alert acknowledgment
+async def acknowledge_alert(alert_id: str):
+    """Acknowledge an alert"""
+    result = await alert_engine.acknowledge(alert_id)
+    if "error" in result:
+        raise HTTPException(status_code=404, detail=result["error"])
     return {"message": f"Alert {alert_id} acknowledged"}
 
 @router.get("/settings")
-async def get_alert_settings():
-    # TODO: Implement alert settings retrieval
-    return {
-        "high_threshold": 180,
-        "low_threshold": 70,
-        "trend_alerts": True,
-        "sound_enabled": True,
-        "vibration_enabled": True
-    }
+async def get_alert_settings(patient_id: Optional[str] = None):
+    """Get the alert rules for a patient, or the defaults"""
+    return alert_engine.get_settings(patient_id)
 
 @router.put("/settings")
 async def update_alert_settings(
@@ -50,18 +35,22 @@ async def update_alert_settings(
     low_threshold: int = 70,
     trend_alerts: bool = True,
     sound_enabled: bool = True,
-    vibration_enabled: bool = True
+    vibration_enabled: bool = True,
+    patient_id: Optional[str] = None
 ):
-    # TODO: Implement alert settings update
+    """Update the alert rules applied to a patient's readings, or the defaults"""
+    if low_threshold >= high_threshold:
+        raise HTTPException(status_code=400, detail="low_threshold must be below high_threshold")
+    settings = alert_engine.update_settings(patient_id, {
+        "high_threshold": high_threshold,
+        "low_threshold": low_threshold,
+        "trend_alerts": trend_alerts,
+        "sound_enabled": sound_enabled,
+        "vibration_enabled": vibration_enabled
+    })
     return {
         "message": "Alert settings updated",
-        "settings": {
-            "high_threshold": high_threshold,
-            "low_threshold": low_threshold,
-            "trend_alerts": trend_alerts,
-            "sound_enabled": sound_enabled,
-            "vibration_enabled": vibration_enabled
-        }
+        "settings": settings
     }
 
 @router.post("/test")
@@ -1,52 +1,159 @@
+import asyncio
+import json
 from fastapi import APIRouter, HTTPException
-from typing import List, Optional
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime
 from services.nightscout import (
     get_latest_glucose, 
     get_glucose_history, 
+    stream_glucose_history,
     get_device_status, 
     get_treatments,
-    test_nightscout_connection
+    test_nightscout_connection,
+    nightscout_registry,
+    NIGHTSCOUT_ERRORS
 )
+from services.ingestion import ingestion_scheduler
+from services.cache import latest_glucose_cache
+from services.singleflight import upstream_flights
+from services.resilience import get_breaker_stats
+from services.fanout import gather_with_deadline
+from services.write_behind import write_queue
+from services.recent_readings import recent_readings
+from services.agp import agp_profiles
+from services.downsample import downsample_readings
+from services.dashboard import get_caregiver_dashboard
+from config import resilience_config, supabase_config
 from services.supabase_service import (
+    HISTORY_COLUMNS,
+    HISTORY_EXTRA_FIELDS,
     test_supabase_connection,
     get_latest_glucose_from_db,
-    get_glucose_history_from_db
+    get_glucose_history_from_db,
+    get_caregiver_patients
 )
 
 router = APIRouter(prefix="/cgm", tags=["Continuous Glucose Monitoring"])
 
+MAX_DASHBOARD_PATIENTS = 200
+
+class DashboardRequest(BaseModel):
+    patient_ids: List[str]
+
 @router.get("/test-connection")
 async def test_nightscout_connection_endpoint():
     """Test the connection to Nightscout"""
-    return test_nightscout_connection()
+    return await test_nightscout_connection()
 
 @router.get("/test-db-connection")
 async def test_supabase_connection_endpoint():
     """Test the connection to Supabase database"""
-    return test_supabase_connection()
+    return await test_supabase_connection()
 
 @router.get("/test-all-connections")
-async def test_all_connections():
-    """Test connections to both Nightscout and Supabase"""
-    nightscout_result = test_nightscout_connection()
-    supabase_result = test_supabase_connection()
+async def test_all_connections(deadline: Optional[float] = None):
+    """Test connections to both Nightscout and Supabase concurrently under a shared deadline"""
+    fanout = await gather_with_deadline(
+        {
+            "nightscout": test_nightscout_connection(),
+            "supabase": test_supabase_connection()
+        },
+        deadline or resilience_config.fanout_deadline
+    )
+    nightscout_result = fanout["results"]["nightscout"]
+    supabase_result = fanout["results"]["supabase"]
     
     return {
         "nightscout": nightscout_result,
         "supabase": supabase_result,
-        "all_working": nightscout_result.get("connected", False) and supabase_result.get("connected", False)
+        "all_working": nightscout_result.get("connected", False) and supabase_result.get("connected", False),
+        "complete": fanout["complete"],
+        "elapsed_ms": fanout["elapsed_ms"]
+    }
+
+@router.get("/snapshot/{patient_id}")
+async def get_patient_snapshot(patient_id: str, hours: int = 6, deadline: Optional[float] = None):
+    """Get latest glucose, device status and recent treatments for a patient in one call
+    
+    The three Nightscout fetches run concurrently; anything not back by the deadline is
+    reported as timed out while the rest is returned.
+    """
+    fanout = await gather_with_deadline(
+        {
+            "latest_glucose": get_latest_glucose(patient_id),
+            "device_status": get_device_status(patient_id),
+            "treatments": get_treatments(patient_id, hours)
+        },
+        deadline or resilience_config.fanout_deadline
+    )
+    
+    return {
+        "patient_id": patient_id,
+        **fanout["results"],
+        "complete": fanout["complete"],
+        "elapsed_ms": fanout["elapsed_ms"]
+    }
+
+@router.get("/ingestion-status")
+async def get_ingestion_status():
+    """Get the background ingestion scheduler and write-behind queue status"""
+    return {**ingestion_scheduler.get_status(), "write_queue": write_queue.get_stats()}
+
+@router.get("/cache-stats")
+async def get_cache_stats():
+    """Get hit/miss counters for the read caches, recent readings buffers and Nightscout client registry"""
+    return {
+        "latest_glucose": latest_glucose_cache.get_stats(),
+        "nightscout_clients": nightscout_registry.get_stats(),
+        "single_flight": upstream_flights.get_stats(),
+        "recent_readings": recent_readings.get_stats(),
+        "agp_profiles": agp_profiles.get_stats()
     }
 
+@router.get("/upstream-health")
+async def get_upstream_health():
+    """Get circuit breaker state and counters for every upstream"""
+    return {"circuits": get_breaker_stats()}
+
 @router.get("/latest/{patient_id}")
-def latest_glucose(patient_id: str):
+async def latest_glucose(patient_id: str):
     """Get the latest glucose reading for a specific patient from Nightscout and store in database"""
-    return get_latest_glucose(patient_id)
+    return await get_latest_glucose(patient_id)
 
 @router.get("/latest-db/{patient_id}")
-def latest_glucose_from_db(patient_id: str):
+async def latest_glucose_from_db(patient_id: str):
     """Get the latest glucose reading for a specific patient from database"""
-    return get_latest_glucose_from_db(patient_id)
+    recent = recent_readings.latest(patient_id)
+    if recent is not None:
+        return {"patient_id": patient_id, **recent}
+    return await upstream_flights.do(
+        ("supabase", "latest", patient_id),
+        lambda: get_latest_glucose_from_db(patient_id)
+    )
+
+async def _dashboard(patient_ids: List[str]) -> Dict:
+    patient_ids = list(dict.fromkeys(patient_ids))
+    if len(patient_ids) > MAX_DASHBOARD_PATIENTS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_DASHBOARD_PATIENTS} patients per dashboard")
+    return await get_caregiver_dashboard(patient_ids)
+
+@router.post("/dashboard")
+async def get_dashboard(request: DashboardRequest):
+    """Get latest glucose, trend, staleness and active alerts for a set of patients in one call"""
+    return await _dashboard(request.patient_ids)
+
+@router.get("/dashboard/{caregiver_id}")
+async def get_caregiver_dashboard_endpoint(caregiver_id: str):
+    """Get the dashboard for every patient a caregiver is assigned to"""
+    assigned = await upstream_flights.do(
+        ("supabase", "caregiver-patients", caregiver_id),
+        lambda: get_caregiver_patients(caregiver_id)
+    )
+    if "error" in assigned:
+        return assigned
+    return {"caregiver_id": caregiver_id, **await _dashboard(assigned["patient_ids"])}
 
 @router.get("/readings")
 async def get_glucose_readings():
@@ -69,15 +176,96 @@ async def get_current_reading():
         "status": "normal"
     }
 
+async def _stream_history_json(patient_id: str, hours: int):
+    """Encode a streamed glucose history as one JSON document, reading by reading"""
+    summary = {}
+    yield json.dumps({"patient_id": patient_id, "period_hours": hours})[:-1].encode() + b', "readings": ['
+    error = None
+    try:
+        separator = b""
+        async for reading in stream_glucose_history(patient_id, hours, summary):
+            yield separator + json.dumps(reading).encode()
+            separator = b","
+    except NIGHTSCOUT_ERRORS as e:
+        error = f"Failed to stream history from Nightscout: {str(e)}"
+    summary.setdefault("total_readings", 0)
+    summary.setdefault("stored_in_db", 0)
+    if error:
+        summary["error"] = error
+    yield b"], " + json.dumps(summary)[1:].encode()
+
+def _check_max_points(max_points: Optional[int]):
+    if max_points is not None and max_points < 3:
+        raise HTTPException(status_code=400, detail="max_points must be at least 3")
+
+async def _downsampled(result: Dict, max_points: Optional[int]) -> Dict:
+    """Reduce a history response's readings to `max_points` with LTTB, leaving shared results untouched"""
+    if max_points is None or len(result.get("readings", [])) <= max_points:
+        return result
+    readings = await asyncio.to_thread(downsample_readings, result["readings"], max_points)
+    return {**result, "readings": readings, "returned_readings": len(readings)}
+
 @router.get("/history/{patient_id}")
-async def get_glucose_history_endpoint(patient_id: str, hours: int = 24):
-    """Get glucose history for a specific patient from Nightscout and store in database"""
-    return get_glucose_history(patient_id, hours)
+async def get_glucose_history_endpoint(patient_id: str, hours: int = 24, stream: bool = False,
+                                       max_points: Optional[int] = None):
+    """Get glucose history for a specific patient from Nightscout and store in database
+    
+    With `stream=true` the whole window is read from Nightscout and sent back as it is
+    parsed, so memory stays flat for multi-day windows. With `max_points` the readings
+    are downsampled for charting, keeping peaks and nadirs.
+    """
+    _check_max_points(max_points)
+    if stream:
+        if max_points is not None:
+            raise HTTPException(status_code=400, detail="max_points cannot be combined with stream")
+        return StreamingResponse(_stream_history_json(patient_id, hours), media_type="application/json")
+    return await _downsampled(await get_glucose_history(patient_id, hours), max_points)
+
+def _history_page(patient_id: str, hours: int, readings: List[Dict], limit: Optional[int],
+                  fields: Tuple[str, ...]) -> Dict:
+    """Shape recent readings buffer output like a history page read from the database"""
+    columns = HISTORY_COLUMNS + fields
+    page = readings if limit is None else readings[:limit]
+    return {
+        "patient_id": patient_id,
+        "readings": [{column: reading.get(column) for column in columns} for reading in page],
+        "period_hours": hours,
+        "total_readings": len(page),
+        "next_before": page[-1]["timestamp"] if len(page) < len(readings) else None
+    }
 
 @router.get("/history-db/{patient_id}")
-async def get_glucose_history_from_db_endpoint(patient_id: str, hours: int = 24):
-    """Get glucose history for a specific patient from database"""
-    return get_glucose_history_from_db(patient_id, hours)
+async def get_glucose_history_from_db_endpoint(patient_id: str, hours: int = 24, limit: Optional[int] = None,
+                                               before: Optional[str] = None, fields: Optional[str] = None,
+                                               max_points: Optional[int] = None):
+    """Get glucose history for a specific patient from database, newest first, a page at a time
+    
+    Readings carry timestamp, glucose, trend and status; `fields` adds any of raw, filtered,
+    noise and created_at (comma separated). Pass the returned `next_before` as `before` to
+    get the next page. With `max_points` the whole window is read and downsampled instead.
+    """
+    _check_max_points(max_points)
+    extra = tuple(field for field in HISTORY_EXTRA_FIELDS if field in (fields or "").split(","))
+    unknown = set((fields or "").split(",")) - set(HISTORY_EXTRA_FIELDS) - {""}
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    if max_points is not None:
+        if limit is not None or before is not None:
+            raise HTTPException(status_code=400, detail="max_points cannot be combined with limit or before")
+    else:
+        limit = limit or supabase_config.page_size
+        if not 1 <= limit <= supabase_config.page_size:
+            raise HTTPException(status_code=400, detail=f"limit must be between 1 and {supabase_config.page_size}")
+    
+    # The buffer serves first pages; it holds no insert times
+    if before is None and "created_at" not in extra:
+        recent = recent_readings.window(patient_id, hours)
+        if recent is not None:
+            return await _downsampled(_history_page(patient_id, hours, recent, limit, extra), max_points)
+    return await _downsampled(await upstream_flights.do(
+        ("supabase", "history", patient_id, hours, limit, before, extra),
+        lambda: get_glucose_history_from_db(patient_id, hours, limit, before, extra)
+    ), max_points)
 
 @router.get("/history")
 async def get_glucose_history_general(days: int = 7):
@@ -98,7 +286,7 @@ async def calibrate_sensor():
 @router.get("/device-status/{patient_id}")
 async def get_device_status_endpoint(patient_id: str):
     """Get device status for a specific patient from Nightscout and store in database"""
-    return get_device_status(patient_id)
+    return await get_device_status(patient_id)
 
 @router.get("/device-status")
 async def get_device_status_general():
@@ -113,4 +301,4 @@ async def get_device_status_general():
 @router.get("/treatments/{patient_id}")
 async def get_treatments_endpoint(patient_id: str, hours: int = 24):
     """Get treatments (insulin, carbs, etc.) for a specific patient from Nightscout and store in database"""
-    return get_treatments(patient_id, hours) 
\ No newline at end of file
+    return await get_treatments(patient_id, hours) 
\ No newline at end of file
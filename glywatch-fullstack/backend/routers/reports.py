@@ -1,13 +1,29 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
+from services.metrics import get_glycemic_summary
+from services.agp import get_agp_report
+from services.singleflight import upstream_flights
+from services.sos_dispatcher import sos_dispatcher
 
 router = APIRouter(prefix="/reports", tags=["Reports"])
 
+MAX_SUMMARY_DAYS = 90
+
 @router.get("/summary/{patient_id}")
-async def get_summary_report(patient_id: str):
-    # TODO: Implement summary report generation
-    return {"patient_id": patient_id, "summary": {}}
+async def get_summary_report(patient_id: str, days: int = 14):
+    """Get time in ranges, variability and risk metrics over a patient's stored readings"""
+    if not 1 <= days <= MAX_SUMMARY_DAYS:
+        raise HTTPException(status_code=400, detail=f"days must be between 1 and {MAX_SUMMARY_DAYS}")
+    await sos_dispatcher.routine_turn()
+    return await upstream_flights.do(
+        ("supabase", "summary", patient_id, days),
+        lambda: get_glycemic_summary(patient_id, days)
+    )
 
 @router.get("/history/{patient_id}")
 async def get_history_report(patient_id: str):
-    # TODO: Implement history report generation
-    return {"patient_id": patient_id, "history": []} 
\ No newline at end of file
+    """Get the ambulatory glucose profile (5/25/50/75/95th percentiles by time of day)"""
+    await sos_dispatcher.routine_turn()
+    return await upstream_flights.do(
+        ("supabase", "agp", patient_id),
+        lambda: get_agp_report(patient_id)
+    )
\ No newline at end of file
@@ -1,7 +1,7 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import List, Optional
-from datetime import datetime
+from services.sos_dispatcher import sos_dispatcher
 
 router = APIRouter(prefix="/sos", tags=["SOS"])
 
@@ -20,52 +20,36 @@ class SOSResponse(BaseModel):
 
 @router.post("/send")
 async def send_sos(request: SOSRequest):
-    """Send an SOS alert"""
+    """Send an SOS alert to the patient's caregivers"""
     try:
-        # TODO: Implement actual SOS sending logic
-        # This could include:
-        # - Sending notifications to caregivers
-        # - Logging the SOS event
-        # - Triggering emergency protocols
-        
-        sos_id = f"sos_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-        
+        event = await sos_dispatcher.submit(
+            request.patient_id,
+            request.type,
+            request.timestamp,
+            request.description or f"{request.type.title()} SOS alert"
+        )
         return SOSResponse(
-            id=sos_id,
-            type=request.type,
-            timestamp=request.timestamp,
-            description=request.description or f"{request.type.title()} SOS alert"
+            id=event["id"],
+            type=event["type"],
+            timestamp=event["timestamp"],
+            description=event["description"],
+            status=event["status"]
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to send SOS: {str(e)}")
 
 @router.get("/history/{patient_id}")
-async def get_sos_history(patient_id: str):
+async def get_sos_history(patient_id: str, limit: int = 50):
     """Get SOS history for a patient"""
-    try:
-        # TODO: Implement actual SOS history retrieval
-        # This would typically fetch from a database
-        
-        mock_history = [
-            {
-                "id": "sos_001",
-                "type": "manual",
-                "timestamp": "2024-01-15T14:30:00Z",
-                "description": "Manual SOS alert triggered",
-                "status": "sent"
-            },
-            {
-                "id": "sos_002", 
-                "type": "automated",
-                "timestamp": "2024-01-15T11:15:00Z",
-                "description": "Automated alert due to glucose levels",
-                "status": "sent"
-            }
-        ]
-        
-        return {"patient_id": patient_id, "sos_history": mock_history}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to get SOS history: {str(e)}")
+    result = await sos_dispatcher.get_history(patient_id, limit)
+    if "error" in result:
+        raise HTTPException(status_code=500, detail=f"Failed to get SOS history: {result['error']}")
+    return result
+
+@router.get("/dispatch-status")
+async def get_dispatch_status():
+    """Get SOS queue depth and delivery counters"""
+    return sos_dispatcher.get_stats()
 
 @router.post("/stop")
 async def stop_sos_sharing():
@@ -8,9 +8,12 @@ from services.nightscout_manager import (
     update_user_nightscout_config,
     delete_user_nightscout
 )
+from services.nightscout import backfill_patient
 
 router = APIRouter(prefix="/users", tags=["User Management"])
 
+MAX_BACKFILL_DAYS = 365
+
 class UserRegistration(BaseModel):
     user_id: str
     user_email: str
@@ -124,6 +127,17 @@ async def delete_user_nightscout_instance(user_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to delete Nightscout: {str(e)}")
 
+@router.post("/{user_id}/backfill")
+async def backfill_user_history(user_id: str, days: int = 90):
+    """Import a user's Nightscout history straight into the database, for onboarding and re-imports"""
+    if not 1 <= days <= MAX_BACKFILL_DAYS:
+        raise HTTPException(status_code=400, detail=f"days must be between 1 and {MAX_BACKFILL_DAYS}")
+    result = await backfill_patient(user_id, days)
+    error = result["glucose_readings"].get("error") or result["treatments"].get("error")
+    if error:
+        raise HTTPException(status_code=500, detail=f"Failed to backfill history: {error}")
+    return result
+
 @router.get("/{user_id}/status")
 async def get_user_status(user_id: str):
     """Get comprehensive status for a user"""
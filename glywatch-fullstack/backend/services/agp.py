@@ -0,0 +1,224 @@
+import asyncio
+import threading
+import time
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+import logging
+from config import reports_config
+from services.metrics import timestamps_to_ms
+from services.supabase_service import get_glucose_series
+
+logger = logging.getLogger(__name__)
+
+DAY_MS = 24 * 3600 * 1000
+BIN_MINUTES = 15
+BINS = 24 * 60 // BIN_MINUTES
+BIN_MS = BIN_MINUTES * 60 * 1000
+
+# Glucose histogram buckets of 2 mg/dL over the 40-400 mg/dL sensor range
+GLUCOSE_MIN = 40
+BUCKET_WIDTH = 2
+BUCKETS = (400 - GLUCOSE_MIN) // BUCKET_WIDTH + 1
+CELLS = BINS * BUCKETS
+
+PERCENTILES = (5, 25, 50, 75, 95)
+
+class AGPProfile:
+    """Glucose histograms per time-of-day bin for one patient's rolling window
+
+    Histograms are mergeable, so new readings are added and expired days subtracted
+    without touching the rest of the window. Each day's cells are kept so that day can
+    be taken out again when it ages out, and its timestamps so a reading offered twice
+    is only counted once.
+    """
+
+    def __init__(self):
+        self.histogram = np.zeros(CELLS, dtype=np.uint16)
+        self.day_cells: Dict[int, List[np.ndarray]] = {}
+        self.day_timestamps: Dict[int, List[np.ndarray]] = {}
+        self.newest = 0
+        self.readings = 0
+        self._percentiles: Optional[List[Dict]] = None
+
+    def add(self, timestamps_ms: np.ndarray, glucose: np.ndarray, first_day: int):
+        """Count readings from `first_day` on into the histograms"""
+        if timestamps_ms.size:
+            self.newest = max(self.newest, int(timestamps_ms.max()))
+        local = timestamps_ms + reports_config.utc_offset_minutes * 60 * 1000
+        days = local // DAY_MS
+        keep = (days >= first_day) & (glucose > 0)
+        if not keep.any():
+            return
+        timestamps_ms, local, days, glucose = timestamps_ms[keep], local[keep], days[keep], glucose[keep]
+        buckets = np.clip((glucose.astype(np.int64) - GLUCOSE_MIN) // BUCKET_WIDTH, 0, BUCKETS - 1)
+        cells = ((local % DAY_MS) // BIN_MS * BUCKETS + buckets).astype(np.uint16)
+
+        self.histogram += np.bincount(cells, minlength=CELLS).astype(np.uint16)
+        for day in np.unique(days):
+            self.day_cells.setdefault(int(day), []).append(cells[days == day])
+            self.day_timestamps.setdefault(int(day), []).append(timestamps_ms[days == day])
+        self.readings += cells.size
+        self._percentiles = None
+
+    def expire(self, first_day: int):
+        """Subtract days before `first_day` from the histograms"""
+        for day in [day for day in self.day_cells if day < first_day]:
+            cells = np.concatenate(self.day_cells.pop(day))
+            self.day_timestamps.pop(day, None)
+            self.histogram -= np.bincount(cells, minlength=CELLS).astype(np.uint16)
+            self.readings -= cells.size
+            self._percentiles = None
+
+    def uncounted(self, timestamps_ms: np.ndarray, glucose: np.ndarray, first_day: int) -> np.ndarray:
+        """Mask of the readings `add` would count that are not in the histograms yet"""
+        days = (timestamps_ms + reports_config.utc_offset_minutes * 60 * 1000) // DAY_MS
+        mask = (days >= first_day) & (glucose > 0)
+        if self.day_timestamps and mask.any():
+            held = np.concatenate([chunk for chunks in self.day_timestamps.values() for chunk in chunks])
+            mask &= ~np.isin(timestamps_ms, held)
+        return mask
+
+    def percentiles(self) -> List[Dict]:
+        """Get AGP percentiles for every time-of-day bin, interpolated within histogram buckets"""
+        if self._percentiles is not None:
+            return self._percentiles
+
+        counts = self.histogram.reshape(BINS, BUCKETS).astype(np.float64)
+        cumulative = counts.cumsum(axis=1)
+        totals = cumulative[:, -1]
+        rows = np.arange(BINS)
+        values = {}
+        for percentile in PERCENTILES:
+            target = totals * percentile / 100
+            bucket = np.minimum((cumulative < target[:, None]).sum(axis=1), BUCKETS - 1)
+            before = cumulative[rows, bucket] - counts[rows, bucket]
+            inside = np.divide(
+                target - before, counts[rows, bucket],
+                out=np.zeros(BINS), where=counts[rows, bucket] > 0
+            )
+            values[percentile] = GLUCOSE_MIN + (bucket + inside) * BUCKET_WIDTH
+
+        self._percentiles = [
+            {
+                "time": f"{index * BIN_MINUTES // 60:02d}:{index * BIN_MINUTES % 60:02d}",
+                "readings": int(totals[index]),
+                **{
+                    f"p{percentile}": round(float(values[percentile][index]), 1) if totals[index] else None
+                    for percentile in PERCENTILES
+                }
+            }
+            for index in range(BINS)
+        ]
+        return self._percentiles
+
+class AGPStore:
+    """Precomputed per-patient AGPs, updated as readings are stored and rebuilt after backfills"""
+
+    def __init__(self, days: int, max_patients: int):
+        self.days = days
+        self.max_patients = max_patients
+        self._profiles: "OrderedDict[str, AGPProfile]" = OrderedDict()
+        # Bumped on every write so a rebuild that raced one is not cached
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.rebuilds = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def _first_day(self) -> int:
+        now_ms = int(time.time() * 1000) + reports_config.utc_offset_minutes * 60 * 1000
+        return now_ms // DAY_MS - (self.days - 1)
+
+    def record(self, patient_id: str, timestamps_ms: Sequence[int], glucose: Sequence[int]):
+        """Fold newly stored readings into a patient's AGP; an older reading it has not counted invalidates it"""
+        timestamps_ms = np.asarray(timestamps_ms, dtype=np.int64)
+        glucose = np.asarray(glucose, dtype=np.int64)
+        with self._lock:
+            self._versions[patient_id] = self._versions.get(patient_id, 0) + 1
+            profile = self._profiles.get(patient_id)
+            if profile is None or not timestamps_ms.size:
+                return
+            first_day = self._first_day()
+            # Re-stored duplicates and overlapping pages are already counted; only new readings matter
+            fresh = profile.uncounted(timestamps_ms, glucose, first_day)
+            timestamps_ms, glucose = timestamps_ms[fresh], glucose[fresh]
+            if not timestamps_ms.size:
+                return
+            if timestamps_ms.min() <= profile.newest:
+                # Backfill into the window; cheaper to rebuild on the next view than to merge in place
+                del self._profiles[patient_id]
+                self.invalidations += 1
+                return
+            profile.add(timestamps_ms, glucose, first_day)
+            profile.expire(first_day)
+
+    async def get(self, patient_id: str) -> Dict:
+        """Get a patient's AGP, building it from stored readings when it is not cached"""
+        with self._lock:
+            profile = self._profiles.get(patient_id)
+            if profile is not None:
+                profile.expire(self._first_day())
+                self._profiles.move_to_end(patient_id)
+                self.hits += 1
+                return self._report(patient_id, profile)
+            version = self._versions.get(patient_id, 0)
+
+        series = await get_glucose_series(patient_id, self.days)
+        if "error" in series:
+            return {"patient_id": patient_id, "error": series["error"]}
+        profile = await asyncio.to_thread(self._build, series)
+
+        with self._lock:
+            self.rebuilds += 1
+            if self._versions.get(patient_id, 0) == version:
+                self._profiles[patient_id] = profile
+                while len(self._profiles) > self.max_patients:
+                    self._profiles.popitem(last=False)
+                    self.evictions += 1
+            return self._report(patient_id, profile)
+
+    def invalidate(self, patient_id: str):
+        """Drop a patient's AGP so the next view rebuilds it, e.g. after a bulk import"""
+        with self._lock:
+            self._versions[patient_id] = self._versions.get(patient_id, 0) + 1
+            if self._profiles.pop(patient_id, None) is not None:
+                self.invalidations += 1
+
+    def _build(self, series: Dict) -> AGPProfile:
+        profile = AGPProfile()
+        profile.add(
+            timestamps_to_ms(series["timestamps"]),
+            np.array(series["glucose"], dtype=np.int64),
+            self._first_day()
+        )
+        return profile
+
+    def _report(self, patient_id: str, profile: AGPProfile) -> Dict:
+        return {
+            "patient_id": patient_id,
+            "period_days": self.days,
+            "bin_minutes": BIN_MINUTES,
+            "readings": profile.readings,
+            "history": profile.percentiles()
+        }
+
+    def get_stats(self) -> Dict:
+        """Get profile count and rebuild counters"""
+        with self._lock:
+            return {
+                "size": len(self._profiles),
+                "max_size": self.max_patients,
+                "hits": self.hits,
+                "rebuilds": self.rebuilds,
+                "invalidations": self.invalidations,
+                "evictions": self.evictions
+            }
+
+# Create a global instance
+agp_profiles = AGPStore(reports_config.agp_days, reports_config.agp_max_patients)
+
+async def get_agp_report(patient_id: str) -> Dict:
+    """Get the ambulatory glucose profile for a patient"""
+    return await agp_profiles.get(patient_id)
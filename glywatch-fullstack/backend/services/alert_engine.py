@@ -0,0 +1,245 @@
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+import logging
+from config import alert_config
+from services.singleflight import upstream_flights
+from services.supabase_service import get_recent_alerts, acknowledge_alert as acknowledge_stored_alert
+from services.write_behind import write_queue
+
+logger = logging.getLogger(__name__)
+
+LOW = "low_glucose"
+HIGH = "high_glucose"
+FALLING = "falling_fast"
+RISING = "rising_fast"
+PREDICTED_LOW = "predicted_low"
+
+FALLING_TRENDS = {"DoubleDown", "SingleDown"}
+RISING_TRENDS = {"DoubleUp", "SingleUp"}
+
+SEVERITIES = {LOW: "critical", HIGH: "warning", FALLING: "warning", RISING: "info", PREDICTED_LOW: "warning"}
+
+class PatientAlertState:
+    """Constant-size rule state for one patient: which rules are active and when each last alerted"""
+
+    __slots__ = ("last_reading", "active", "last_raised")
+
+    def __init__(self):
+        self.last_reading = 0
+        self.active = {LOW: False, HIGH: False, FALLING: False, RISING: False, PREDICTED_LOW: False}
+        self.last_raised = {LOW: 0, HIGH: 0, FALLING: 0, RISING: 0, PREDICTED_LOW: 0}
+
+class AlertEngine:
+    """Evaluates alert rules reading by reading as they are ingested
+
+    A rule alerts when its condition starts, then stays quiet while it holds unless it
+    is still holding after the re-alert interval. Glucose rules only clear once the value
+    is back past the threshold by the hysteresis margin, so readings hovering at a
+    threshold do not flap.
+    """
+
+    def __init__(self):
+        self.default_settings = {
+            "high_threshold": alert_config.high_threshold,
+            "low_threshold": alert_config.low_threshold,
+            "trend_alerts": True,
+            "sound_enabled": True,
+            "vibration_enabled": True
+        }
+        self._settings: Dict[str, Dict] = {}
+        self._states: Dict[str, PatientAlertState] = {}
+        # Newest alerts first; the None key holds alerts for every patient
+        self._recent: Dict[Optional[str], Deque[Dict]] = {}
+        self._loaded = set()
+        self._predicted_lows = set()
+        self.evaluated = 0
+        self.raised = 0
+
+    def get_settings(self, patient_id: Optional[str] = None) -> Dict:
+        """Get the alert settings for a patient, or the defaults"""
+        if patient_id is None:
+            return self.default_settings
+        return self._settings.get(patient_id, self.default_settings)
+
+    def update_settings(self, patient_id: Optional[str], settings: Dict) -> Dict:
+        """Replace the alert settings for a patient, or the defaults"""
+        if patient_id is None:
+            self.default_settings = {**self.default_settings, **settings}
+            return self.default_settings
+        self._settings[patient_id] = {**self.get_settings(patient_id), **settings}
+        return self._settings[patient_id]
+
+    def custom_low_thresholds(self) -> Dict[str, int]:
+        """Get low thresholds for patients whose settings differ from the defaults"""
+        return {patient_id: settings["low_threshold"] for patient_id, settings in self._settings.items()}
+
+    async def evaluate(self, patient_id: str, readings: Iterable[Tuple[int, int, Optional[str]]]) -> List[Dict]:
+        """Run the rules over new (epoch ms, glucose, trend) readings and persist any alerts raised"""
+        state = self._states.get(patient_id)
+        if state is None:
+            state = self._states[patient_id] = PatientAlertState()
+        settings = self.get_settings(patient_id)
+        oldest_alerting = (time.time() - alert_config.max_reading_age_minutes * 60) * 1000
+        realert_ms = alert_config.realert_minutes * 60 * 1000
+
+        alerts = []
+        for timestamp, glucose, trend in sorted(readings, key=lambda reading: reading[0]):
+            # Readings can be offered again until their write lands; each is evaluated once
+            if timestamp <= state.last_reading or not glucose:
+                continue
+            state.last_reading = timestamp
+            self.evaluated += 1
+
+            for rule, met in self._conditions(state, settings, glucose, trend).items():
+                if not met:
+                    state.active[rule] = False
+                    continue
+                due = not state.active[rule] or timestamp - state.last_raised[rule] >= realert_ms
+                state.active[rule] = True
+                # A stale reading updates state but is too old to be worth alerting on
+                if due and timestamp >= oldest_alerting:
+                    state.last_raised[rule] = timestamp
+                    alerts.append(self._alert(patient_id, rule, glucose, timestamp))
+
+        if alerts:
+            self.raised += len(alerts)
+            for alert in alerts:
+                self._remember(alert)
+            await write_queue.submit("alerts", patient_id, alerts)
+        return alerts
+
+    async def raise_predicted_lows(self, predictions: List[Dict]) -> List[Dict]:
+        """Alert on patients newly projected to go low, with the same re-alert suppression as the reading rules"""
+        flagged = {prediction["patient_id"]: prediction for prediction in predictions}
+        for patient_id in self._predicted_lows - flagged.keys():
+            self._states[patient_id].active[PREDICTED_LOW] = False
+        self._predicted_lows = set(flagged)
+
+        now_ms = int(time.time() * 1000)
+        realert_ms = alert_config.realert_minutes * 60 * 1000
+        alerts = []
+        for patient_id, prediction in flagged.items():
+            state = self._states.get(patient_id)
+            if state is None:
+                state = self._states[patient_id] = PatientAlertState()
+            due = not state.active[PREDICTED_LOW] or now_ms - state.last_raised[PREDICTED_LOW] >= realert_ms
+            state.active[PREDICTED_LOW] = True
+            if due:
+                state.last_raised[PREDICTED_LOW] = now_ms
+                message = (
+                    f"Glucose projected below {prediction['threshold']} mg/dL "
+                    f"in {prediction['minutes_to_low']:.0f} minutes: {prediction['glucose']} mg/dL"
+                )
+                alerts.append(self._alert(
+                    patient_id, PREDICTED_LOW, prediction["glucose"], prediction["reading_date"], message
+                ))
+
+        self.raised += len(alerts)
+        for alert in alerts:
+            self._remember(alert)
+            await write_queue.submit("alerts", alert["patient_id"], [alert])
+        return alerts
+
+    def _conditions(self, state: PatientAlertState, settings: Dict, glucose: int, trend: Optional[str]) -> Dict:
+        low, high = settings["low_threshold"], settings["high_threshold"]
+        margin = alert_config.hysteresis
+        return {
+            LOW: glucose < (low + margin if state.active[LOW] else low),
+            HIGH: glucose > (high - margin if state.active[HIGH] else high),
+            FALLING: settings["trend_alerts"] and trend in FALLING_TRENDS,
+            RISING: settings["trend_alerts"] and trend in RISING_TRENDS
+        }
+
+    def _alert(self, patient_id: str, rule: str, glucose: int, timestamp: int,
+               message: Optional[str] = None) -> Dict:
+        messages = {
+            LOW: f"Glucose level is low: {glucose} mg/dL",
+            HIGH: f"Glucose level is high: {glucose} mg/dL",
+            FALLING: f"Glucose is falling fast: {glucose} mg/dL",
+            RISING: f"Glucose is rising fast: {glucose} mg/dL"
+        }
+        return {
+            "id": str(uuid.uuid4()),
+            "patient_id": patient_id,
+            "type": rule,
+            "severity": SEVERITIES[rule],
+            "message": message or messages[rule],
+            "glucose": glucose,
+            "timestamp": datetime.fromtimestamp(timestamp / 1000, tz=timezone.utc).isoformat(),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "acknowledged": False
+        }
+
+    def _remember(self, alert: Dict):
+        for key, size in ((None, alert_config.recent_limit), (alert["patient_id"], alert_config.recent_per_patient)):
+            recent = self._recent.get(key)
+            if recent is None:
+                recent = self._recent[key] = deque(maxlen=size)
+            recent.appendleft(alert)
+
+    async def get_alerts(self, patient_id: Optional[str] = None, limit: int = 50) -> Dict:
+        """Get the newest alerts, loading stored ones once per process instead of on every poll"""
+        if patient_id not in self._loaded:
+            size = alert_config.recent_limit if patient_id is None else alert_config.recent_per_patient
+            stored = await upstream_flights.do(
+                ("supabase", "alerts", patient_id),
+                lambda: get_recent_alerts(patient_id, size)
+            )
+            if "error" in stored:
+                logger.warning(f"Stored alerts not loaded: {stored['error']}")
+            elif patient_id not in self._loaded:
+                # Alerts raised while loading may also be in the stored rows
+                recent = self._recent.get(patient_id, deque())
+                seen = {alert["id"] for alert in recent}
+                merged = list(recent) + [alert for alert in stored["alerts"] if alert["id"] not in seen]
+                merged.sort(key=lambda alert: alert.get("created_at") or "", reverse=True)
+                self._recent[patient_id] = deque(merged, maxlen=size)
+                self._loaded.add(patient_id)
+
+        alerts = list(self._recent.get(patient_id, ()))[:limit]
+        return {"alerts": alerts, "total": len(alerts)}
+
+    async def acknowledge(self, alert_id: str) -> Dict:
+        """Acknowledge an alert in memory and in storage"""
+        found = False
+        for recent in self._recent.values():
+            for alert in recent:
+                if alert["id"] == alert_id:
+                    # Alerts still waiting in the write queue are stored acknowledged
+                    alert["acknowledged"] = True
+                    found = True
+        result = await acknowledge_stored_alert(alert_id)
+        if found:
+            return {"success": True, "message": f"Alert {alert_id} acknowledged"}
+        return result
+
+    def get_active(self, patient_id: str) -> List[Dict]:
+        """Get the rules currently holding for a patient and when each last alerted"""
+        state = self._states.get(patient_id)
+        if state is None:
+            return []
+        return [
+            {
+                "type": rule,
+                "severity": SEVERITIES[rule],
+                "last_alerted": datetime.fromtimestamp(state.last_raised[rule] / 1000, tz=timezone.utc).isoformat()
+                if state.last_raised[rule] else None
+            }
+            for rule, active in state.active.items()
+            if active
+        ]
+
+    def get_stats(self) -> Dict:
+        """Get evaluation counters"""
+        return {
+            "patients": len(self._states),
+            "readings_evaluated": self.evaluated,
+            "alerts_raised": self.raised,
+            "active": sum(1 for state in self._states.values() if any(state.active.values()))
+        }
+
+# Create a global instance
+alert_engine = AlertEngine()
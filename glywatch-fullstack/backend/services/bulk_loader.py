@@ -0,0 +1,164 @@
+import asyncpg
+import json
+import time
+from decimal import Decimal, InvalidOperation
+from typing import AsyncIterable, Dict, Iterable, Optional, Tuple, Union
+import logging
+from config import supabase_config
+from services.cache import parse_timestamp
+
+logger = logging.getLogger(__name__)
+
+Rows = Union[Iterable[Dict], AsyncIterable[Dict]]
+
+GLUCOSE_COLUMNS = ("patient_id", "glucose", "timestamp", "trend", "status", "raw", "filtered", "noise")
+TREATMENT_COLUMNS = (
+    "patient_id", "treatment_type", "timestamp", "insulin", "carbs",
+    "notes", "entered_by", "nightscout_id", "raw_data"
+)
+
+def _decimal(value) -> Optional[Decimal]:
+    try:
+        return Decimal(str(value)) if value is not None else None
+    except InvalidOperation:
+        return None
+
+def _glucose_record(patient_id: str, reading: Dict) -> Optional[Tuple]:
+    """Build a glucose_readings COPY record from a reading, or None if it has no sensor time"""
+    timestamp = parse_timestamp(reading.get("timestamp") or "")
+    if timestamp is None:
+        return None
+    return (
+        patient_id,
+        reading.get("glucose", 0),
+        timestamp,
+        reading.get("trend", "unknown"),
+        reading.get("status", "unknown"),
+        reading.get("raw", 0),
+        reading.get("filtered", 0),
+        reading.get("noise", 0)
+    )
+
+def _treatment_record(patient_id: str, treatment: Dict) -> Optional[Tuple]:
+    """Build a treatments COPY record from a Nightscout treatment, or None if it has no `_id` or time"""
+    timestamp = parse_timestamp(treatment.get("created_at") or "")
+    if not treatment.get("_id") or timestamp is None:
+        return None
+    return (
+        patient_id,
+        treatment.get("eventType", "unknown"),
+        timestamp,
+        _decimal(treatment.get("insulin") or 0),
+        treatment.get("carbs") or 0,
+        treatment.get("notes", ""),
+        treatment.get("enteredBy", ""),
+        treatment["_id"],
+        json.dumps(treatment)
+    )
+
+# Table -> (columns, natural key, record builder)
+TABLES = {
+    "glucose_readings": (GLUCOSE_COLUMNS, "patient_id, timestamp", _glucose_record),
+    "treatments": (TREATMENT_COLUMNS, "patient_id, nightscout_id", _treatment_record)
+}
+
+class BulkLoader:
+    """Loads large imports straight into Postgres with binary COPY and a set-based merge
+
+    Rows are streamed into a temporary staging table, then moved into the real table
+    with one INSERT ... SELECT DISTINCT ON the natural key ... ON CONFLICT DO NOTHING,
+    so re-imports and overlapping windows are idempotent and nothing is held in memory.
+    """
+
+    def __init__(self, dsn: str, pool_size: int):
+        self.dsn = dsn
+        self.pool_size = pool_size
+        self._pool: Optional[asyncpg.Pool] = None
+
+    def is_configured(self) -> bool:
+        return bool(self.dsn)
+
+    async def _get_pool(self) -> asyncpg.Pool:
+        if self._pool is None:
+            # No prepared statement cache, so the DSN may point at Supabase's transaction pooler
+            self._pool = await asyncpg.create_pool(
+                self.dsn, min_size=1, max_size=self.pool_size, statement_cache_size=0
+            )
+        return self._pool
+
+    async def load(self, table: str, patient_id: str, rows: Rows) -> Dict:
+        """COPY rows for one patient into `table`, skipping rows already stored"""
+        if not self.is_configured():
+            return {"error": "Direct database access not configured (SUPABASE_DB_URL)"}
+
+        columns, key, build_record = TABLES[table]
+        staging = f"staging_{table}"
+        counts = {"copied": 0, "skipped": 0}
+
+        def build(row: Dict) -> Optional[Tuple]:
+            record = build_record(patient_id, row)
+            counts["skipped" if record is None else "copied"] += 1
+            return record
+
+        async def records():
+            if hasattr(rows, "__aiter__"):
+                async for row in rows:
+                    record = build(row)
+                    if record is not None:
+                        yield record
+            else:
+                for row in rows:
+                    record = build(row)
+                    if record is not None:
+                        yield record
+
+        started = time.monotonic()
+        column_list = ", ".join(columns)
+        try:
+            pool = await self._get_pool()
+            async with pool.acquire() as connection:
+                async with connection.transaction():
+                    await connection.execute(
+                        f"CREATE TEMP TABLE {staging} ON COMMIT DROP AS "
+                        f"SELECT {column_list} FROM {table} WITH NO DATA"
+                    )
+                    await connection.copy_records_to_table(staging, records=records(), columns=columns)
+                    status = await connection.execute(
+                        f"INSERT INTO {table} ({column_list}) "
+                        f"SELECT DISTINCT ON ({key}) {column_list} FROM {staging} ORDER BY {key} "
+                        f"ON CONFLICT ({key}) DO NOTHING"
+                    )
+        except Exception as e:
+            logger.error(f"Failed to bulk load {table} for {patient_id}: {e}")
+            return {"error": f"Failed to bulk load {table}: {str(e)}"}
+
+        elapsed = time.monotonic() - started
+        inserted = int(status.split()[-1])
+        logger.info(f"Bulk loaded {inserted}/{counts['copied']} {table} rows for {patient_id} in {elapsed:.2f}s")
+        return {
+            "success": True,
+            "copied": counts["copied"],
+            "inserted": inserted,
+            "duplicates": counts["copied"] - inserted,
+            "skipped": counts["skipped"],
+            "duration_seconds": round(elapsed, 3),
+            "rows_per_second": round(counts["copied"] / elapsed) if elapsed > 0 else None
+        }
+
+    async def aclose(self):
+        """Close the Postgres connection pool"""
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+            logger.info("Closed bulk load connection pool")
+
+# Create a global instance
+bulk_loader = BulkLoader(supabase_config.db_url, supabase_config.bulk_pool_size)
+
+async def bulk_load_glucose_readings(patient_id: str, readings: Rows) -> Dict:
+    """Bulk load glucose readings for a patient"""
+    return await bulk_loader.load("glucose_readings", patient_id, readings)
+
+async def bulk_load_treatments(patient_id: str, treatments: Rows) -> Dict:
+    """Bulk load Nightscout treatments for a patient"""
+    return await bulk_loader.load("treatments", patient_id, treatments)
@@ -0,0 +1,114 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, Hashable, Optional
+from config import cache_config
+
+class TTLCache:
+    """Bounded LRU cache where every entry carries its own expiry"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Get a live entry, or None if it is missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: float):
+        """Store an entry for `ttl` seconds, evicting the least recently used beyond max_size"""
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        """Drop an entry"""
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def get_stats(self) -> Dict:
+        """Get size and hit/miss counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations
+            }
+
+# Fractional seconds of any length, and a UTC offset written without a colon
+_FRACTION = re.compile(r"\.(\d+)")
+_COMPACT_OFFSET = re.compile(r"([+-]\d{2})(\d{2})$")
+
+def _fraction_to_micros(match: "re.Match") -> str:
+    return "." + match.group(1)[:6].ljust(6, "0")
+
+def parse_timestamp(value: str) -> Optional[datetime]:
+    """Parse an ISO 8601 reading timestamp, treating naive values as UTC
+
+    Before Python 3.11 fromisoformat only takes 3 or 6 fraction digits and "+HH:MM" offsets,
+    while PostgREST trims trailing zeros ("...:00.12+00:00"), so both are normalised first.
+    """
+    if not value:
+        return None
+    normalised = _FRACTION.sub(_fraction_to_micros, value.replace("Z", "+00:00"), count=1)
+    normalised = _COMPACT_OFFSET.sub(r"\1:\2", normalised)
+    try:
+        parsed = datetime.fromisoformat(normalised)
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+def reading_ttl(timestamp: str) -> float:
+    """Seconds until the next CGM reading is expected, based on the age of this one"""
+    reading_time = parse_timestamp(timestamp)
+    if reading_time is None:
+        return cache_config.latest_min_ttl
+    age = (datetime.now(timezone.utc) - reading_time).total_seconds()
+    ttl = cache_config.cgm_interval - age + cache_config.latest_grace
+    # A stale sensor keeps being re-checked at the minimum interval
+    return min(max(ttl, cache_config.latest_min_ttl), cache_config.cgm_interval)
+
+# Latest reading per (source, patient_id), source is "nightscout" or "db"
+latest_glucose_cache = TTLCache(cache_config.latest_max_size)
+
+def get_cached_latest(source: str, patient_id: str) -> Optional[Dict]:
+    """Get a cached latest reading"""
+    return latest_glucose_cache.get((source, patient_id))
+
+def cache_latest(source: str, patient_id: str, reading: Dict):
+    """Cache a latest reading until the next one is due; errors are not cached"""
+    if "error" in reading:
+        return
+    latest_glucose_cache.set((source, patient_id), reading, reading_ttl(reading.get("timestamp", "")))
+
+def invalidate_latest(patient_id: str):
+    """Drop cached latest readings for a patient after a newer one is stored"""
+    for source in ("nightscout", "db"):
+        latest_glucose_cache.invalidate((source, patient_id))
@@ -0,0 +1,63 @@
+import time
+from typing import Dict, List, Optional
+from config import cache_config
+from services.alert_engine import alert_engine
+from services.cache import parse_timestamp
+from services.recent_readings import recent_readings
+from services.singleflight import upstream_flights
+from services.supabase_service import get_latest_glucose_many_from_db
+
+def _patient_card(patient_id: str, reading: Optional[Dict], now: float) -> Dict:
+    """Summarize one patient's latest reading for the dashboard"""
+    parsed = parse_timestamp(reading.get("timestamp") or "") if reading else None
+    minutes_ago = round((now - parsed.timestamp()) / 60, 1) if parsed is not None else None
+    return {
+        "patient_id": patient_id,
+        "glucose": reading.get("glucose") if reading else None,
+        "trend": reading.get("trend") if reading else None,
+        "status": reading.get("status") if reading else None,
+        "timestamp": reading.get("timestamp") if reading else None,
+        "minutes_ago": minutes_ago,
+        # Stale once a reading has been missed, the same freshness rule the predictions use
+        "stale": minutes_ago is None or minutes_ago * 60 > 2 * cache_config.cgm_interval,
+        "active_alerts": alert_engine.get_active(patient_id)
+    }
+
+async def get_caregiver_dashboard(patient_ids: List[str]) -> Dict:
+    """Get latest reading, trend, staleness and active alerts for many patients
+
+    Patients with a current reading in memory are answered from their ring buffer;
+    the rest are read together in one query against the latest_glucose_readings view.
+    """
+    readings: Dict[str, Dict] = {}
+    missing = []
+    for patient_id in patient_ids:
+        recent = recent_readings.latest(patient_id)
+        if recent is not None:
+            readings[patient_id] = recent
+        else:
+            missing.append(patient_id)
+
+    error = None
+    if missing:
+        key = tuple(sorted(missing))
+        stored = await upstream_flights.do(
+            ("supabase", "latest-many", key),
+            lambda: get_latest_glucose_many_from_db(list(key))
+        )
+        if "error" in stored:
+            error = stored["error"]
+        else:
+            for patient_id, reading in stored["readings"].items():
+                recent_readings.record(patient_id, [reading])
+                readings[patient_id] = reading
+
+    now = time.time()
+    result = {
+        "patients": [_patient_card(patient_id, readings.get(patient_id), now) for patient_id in patient_ids],
+        "total": len(patient_ids),
+        "from_memory": len(patient_ids) - len(missing)
+    }
+    if error:
+        result["error"] = error
+    return result
@@ -0,0 +1,47 @@
+import numpy as np
+from typing import Dict, List
+from services.metrics import timestamps_to_ms
+
+def lttb(x: np.ndarray, y: np.ndarray, max_points: int) -> np.ndarray:
+    """Largest-triangle-three-buckets: indexes of `max_points` points that keep the shape of (x, y)
+
+    `x` must be ascending. The first and last points are always kept; every bucket in
+    between contributes the point forming the largest triangle with the point kept from
+    the previous bucket and the average of the next one, so peaks and nadirs survive.
+    """
+    count = x.size
+    if max_points >= count or max_points < 3:
+        return np.arange(count)
+
+    x = x.astype(np.float64)
+    y = y.astype(np.float64)
+    edges = np.linspace(1, count - 1, max_points - 1).astype(np.int64)
+    starts, ends = edges[:-1], edges[1:]
+    # Average of each bucket, then the last point as the "next bucket" of the final one
+    sums_x, sums_y = np.add.reduceat(x[1:count - 1], starts - 1), np.add.reduceat(y[1:count - 1], starts - 1)
+    sizes = ends - starts
+    next_x = np.append((sums_x / sizes)[1:], x[-1])
+    next_y = np.append((sums_y / sizes)[1:], y[-1])
+
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0], selected[-1] = 0, count - 1
+    previous = 0
+    for bucket, (start, end) in enumerate(zip(starts, ends)):
+        # Twice the triangle area for every candidate in the bucket at once
+        areas = np.abs(
+            (x[previous] - next_x[bucket]) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y[bucket] - y[previous])
+        )
+        previous = start + int(areas.argmax())
+        selected[bucket + 1] = previous
+    return selected
+
+def downsample_readings(readings: List[Dict], max_points: int) -> List[Dict]:
+    """Reduce readings to at most `max_points` with LTTB, keeping their original order"""
+    if len(readings) <= max_points:
+        return readings
+    timestamps = timestamps_to_ms([reading.get("timestamp") or "" for reading in readings])
+    glucose = np.array([reading.get("glucose") or 0 for reading in readings], dtype=np.float64)
+    order = np.argsort(timestamps, kind="stable")
+    keep = np.sort(order[lttb(timestamps[order], glucose[order], max_points)])
+    return [readings[index] for index in keep]
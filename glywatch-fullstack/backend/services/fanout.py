@@ -0,0 +1,35 @@
+import asyncio
+import time
+from typing import Awaitable, Dict
+import logging
+
+logger = logging.getLogger(__name__)
+
+async def gather_with_deadline(calls: Dict[str, Awaitable], deadline: float) -> Dict:
+    """Run named upstream calls concurrently and return whatever finished within `deadline` seconds
+
+    Calls still running at the deadline are cancelled and reported with a timeout error,
+    and a call that raised is reported with its error, so one slow or failing source
+    never holds back the others.
+    """
+    started = time.monotonic()
+    tasks = {name: asyncio.ensure_future(call) for name, call in calls.items()}
+    done, pending = await asyncio.wait(tasks.values(), timeout=deadline)
+    for task in pending:
+        task.cancel()
+
+    results = {}
+    for name, task in tasks.items():
+        if task in pending:
+            results[name] = {"status": "timeout", "error": f"No response within {deadline}s"}
+        elif task.exception() is not None:
+            logger.error(f"Fan-out call {name} failed: {task.exception()}")
+            results[name] = {"status": "error", "error": str(task.exception())}
+        else:
+            results[name] = task.result()
+
+    return {
+        "results": results,
+        "complete": not pending,
+        "elapsed_ms": round((time.monotonic() - started) * 1000, 2)
+    }
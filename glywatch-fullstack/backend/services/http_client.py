@@ -0,0 +1,81 @@
+import asyncio
+import httpx
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+from urllib.parse import urlsplit
+import logging
+from config import nightscout_config
+
+logger = logging.getLogger(__name__)
+
+class PooledHTTPClient:
+    """Shared keep-alive HTTP client with a per-host connection limit"""
+
+    def __init__(
+        self,
+        timeout: float,
+        connect_timeout: float,
+        max_connections: int,
+        max_keepalive_connections: int,
+        max_connections_per_host: int,
+        keepalive_expiry: float
+    ):
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.max_connections_per_host = max_connections_per_host
+        self._client: Optional[httpx.AsyncClient] = None
+        self._host_slots: Dict[str, asyncio.Semaphore] = {}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Lazily create the underlying client inside the running event loop"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=self.timeout, limits=self.limits)
+        return self._client
+
+    def _host_slot(self, url: str) -> asyncio.Semaphore:
+        """Get the semaphore bounding concurrent requests to one host"""
+        host = urlsplit(url).netloc
+        slot = self._host_slots.get(host)
+        if slot is None:
+            slot = asyncio.Semaphore(self.max_connections_per_host)
+            self._host_slots[host] = slot
+        return slot
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        """Send a GET request through the shared pool"""
+        async with self._host_slot(url):
+            return await self.client.get(url, **kwargs)
+
+    @asynccontextmanager
+    async def stream(self, url: str, **kwargs) -> AsyncIterator[httpx.Response]:
+        """Send a GET request through the shared pool without reading the body up front"""
+        async with self._host_slot(url):
+            async with self.client.stream("GET", url, **kwargs) as response:
+                yield response
+
+    async def aclose(self):
+        """Close pooled connections"""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+            logger.info("Closed pooled HTTP client")
+        self._client = None
+        self._host_slots.clear()
+
+# Shared pool for all Nightscout instances
+nightscout_http = PooledHTTPClient(
+    timeout=nightscout_config.timeout,
+    connect_timeout=nightscout_config.connect_timeout,
+    max_connections=nightscout_config.max_connections,
+    max_keepalive_connections=nightscout_config.max_keepalive_connections,
+    max_connections_per_host=nightscout_config.max_connections_per_host,
+    keepalive_expiry=nightscout_config.keepalive_expiry
+)
+
+async def close_http_clients():
+    """Close all shared HTTP clients"""
+    await nightscout_http.aclose()
@@ -0,0 +1,153 @@
+import asyncio
+import random
+import time
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+import logging
+from config import ingestion_config
+from services.nightscout import nightscout_registry, NIGHTSCOUT_ERRORS
+from services.prediction import predictive_lows
+from services.sos_dispatcher import sos_dispatcher
+from services.supabase_service import get_active_nightscout_configs
+
+logger = logging.getLogger(__name__)
+
+class HostRateLimiter:
+    """Spaces out requests to the same host to at most `rate` per second"""
+
+    def __init__(self, rate: float):
+        self.min_interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_slot: Dict[str, float] = {}
+
+    async def wait(self, url: str):
+        """Wait until the host behind `url` may receive another request"""
+        if not self.min_interval:
+            return
+        host = urlsplit(url).netloc
+        now = time.monotonic()
+        # Reserve the next free slot before sleeping so concurrent callers queue up behind it
+        slot = max(now, self._next_slot.get(host, now))
+        self._next_slot[host] = slot + self.min_interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+class IngestionScheduler:
+    """Polls every registered patient's Nightscout on the CGM cadence and stores new data"""
+
+    def __init__(self, interval: float, jitter: float, max_concurrency: int,
+                 host_rate_limit: float, lookback_hours: int):
+        self.interval = interval
+        self.jitter = jitter
+        self.max_concurrency = max_concurrency
+        self.lookback_hours = lookback_hours
+        self.rate_limiter = HostRateLimiter(host_rate_limit)
+        self._task: Optional[asyncio.Task] = None
+        self._stopping: Optional[asyncio.Event] = None
+        self.last_cycle: Dict = {}
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Start the polling loop in the background"""
+        if self.running:
+            return
+        self._stopping = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Ingestion scheduler started (every {self.interval}s, jitter {self.jitter}s)")
+
+    async def stop(self):
+        """Stop the polling loop, letting an in-flight cycle be cancelled cleanly"""
+        if not self.running:
+            return
+        self._stopping.set()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        logger.info("Ingestion scheduler stopped")
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            started = time.monotonic()
+            try:
+                await self.run_cycle()
+            except Exception as e:
+                logger.error(f"Ingestion cycle failed: {e}")
+            # Keep to the cadence regardless of how long the cycle took
+            delay = max(0.0, self.interval - (time.monotonic() - started))
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run_cycle(self) -> Dict:
+        """Poll all active patients once"""
+        started = time.monotonic()
+        result = await get_active_nightscout_configs()
+        if "error" in result:
+            logger.warning(f"Skipping ingestion cycle: {result['error']}")
+            return result
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        configs = [config for config in result["configs"] if config.get("nightscout_url")]
+        outcomes = await asyncio.gather(
+            *(self._ingest_patient(config, semaphore) for config in configs)
+        )
+
+        # One vectorized projection over every patient once this tick's readings are in
+        predictions = await predictive_lows.scan()
+
+        self.last_cycle = {
+            "patients": len(configs),
+            "succeeded": sum(1 for outcome in outcomes if "error" not in outcome),
+            "failed": sum(1 for outcome in outcomes if "error" in outcome),
+            "new_readings": sum(outcome.get("stored", 0) for outcome in outcomes),
+            "predicted_lows": len(predictions),
+            "duration_ms": round((time.monotonic() - started) * 1000, 2),
+            "finished_at": time.time()
+        }
+        logger.info(f"Ingestion cycle complete: {self.last_cycle}")
+        return self.last_cycle
+
+    async def _ingest_patient(self, config: Dict, semaphore: asyncio.Semaphore) -> Dict:
+        """Sync one patient, spread across the jitter window"""
+        patient_id = config["user_id"]
+        await asyncio.sleep(random.uniform(0, self.jitter))
+        # Hold back while an SOS is being dispatched
+        await sos_dispatcher.routine_turn()
+        async with semaphore:
+            try:
+                service = nightscout_registry.warm(patient_id, config["nightscout_url"], config.get("api_secret"))
+                await self.rate_limiter.wait(service.base_url)
+                result = await service.sync_glucose(patient_id, self.lookback_hours)
+                await self.rate_limiter.wait(service.base_url)
+                await service.get_device_status(patient_id)
+                return result
+            except NIGHTSCOUT_ERRORS as e:
+                logger.warning(f"Ingestion failed for {patient_id}: {e}")
+                return {"patient_id": patient_id, "error": str(e)}
+            except Exception as e:
+                # One bad site or malformed document must not abort the cycle for every patient
+                logger.error(f"Unexpected ingestion failure for {patient_id}: {e}")
+                return {"patient_id": patient_id, "error": str(e)}
+
+    def get_status(self) -> Dict:
+        """Get scheduler state and the last cycle's results"""
+        return {
+            "running": self.running,
+            "config": ingestion_config.get_config_status(),
+            "last_cycle": self.last_cycle
+        }
+
+# Create a global instance
+ingestion_scheduler = IngestionScheduler(
+    interval=ingestion_config.interval,
+    jitter=ingestion_config.jitter,
+    max_concurrency=ingestion_config.max_concurrency,
+    host_rate_limit=ingestion_config.host_rate_limit,
+    lookback_hours=ingestion_config.lookback_hours
+)
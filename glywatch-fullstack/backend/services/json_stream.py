@@ -0,0 +1,59 @@
+import codecs
+import json
+from typing import Any, AsyncIterator
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+_DELIMITERS = _WHITESPACE + ",]"
+
+async def iter_json_array(chunks: AsyncIterator[bytes]) -> AsyncIterator[Any]:
+    """Yield the elements of a top-level JSON array as their bytes arrive
+
+    Only the unparsed tail of the body is buffered, so memory stays bounded by the
+    largest single element rather than the whole response.
+    """
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    position = 0
+    started = False
+    finished = False
+
+    async for chunk in chunks:
+        buffer += text_decoder.decode(chunk)
+        while True:
+            while position < len(buffer) and buffer[position] in _WHITESPACE:
+                position += 1
+            if position >= len(buffer):
+                break
+
+            char = buffer[position]
+            if not started:
+                if char != "[":
+                    raise ValueError("Expected a JSON array")
+                started = True
+                position += 1
+                continue
+            if char == "]":
+                finished = True
+                break
+            if char == ",":
+                position += 1
+                continue
+
+            try:
+                value, end = _decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # Element is incomplete; wait for more bytes
+                break
+            if not isinstance(value, (dict, list)) and (end == len(buffer) or buffer[end] not in _DELIMITERS):
+                # A scalar is only complete once a delimiter follows it; "1." may still become "1.5"
+                break
+            position = end
+            yield value
+
+        if finished:
+            return
+        buffer = buffer[position:]
+        position = 0
+
+    raise ValueError("Truncated JSON array")
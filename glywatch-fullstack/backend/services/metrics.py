@@ -0,0 +1,137 @@
+import asyncio
+import numpy as np
+from typing import Dict, List, Sequence
+import logging
+from config import cache_config
+from services.cache import parse_timestamp
+from services.supabase_service import get_glucose_series
+
+logger = logging.getLogger(__name__)
+
+# International consensus glucose bands in mg/dL: <54, 54-69, 70-180, 181-250, >250
+BAND_EDGES = np.array([54, 70, 181, 251])
+BAND_NAMES = ("very_low", "low", "in_range", "high", "very_high")
+
+HYPO_THRESHOLD = 70
+HYPER_THRESHOLD = 180
+EVENT_MIN_MINUTES = 15
+
+def timestamps_to_ms(timestamps: Sequence[str]) -> np.ndarray:
+    """Convert ISO 8601 UTC timestamps to epoch milliseconds"""
+    naive = [value[:-6] if value.endswith("+00:00") else value.rstrip("Z") for value in timestamps]
+    if any("+" in value[19:] or "-" in value[19:] for value in naive):
+        # Offsets other than UTC need a full parse
+        return np.array(
+            [int(parse_timestamp(value).timestamp() * 1000) for value in timestamps], dtype=np.int64
+        )
+    return np.array(naive, dtype="datetime64[ms]").astype(np.int64)
+
+def compute_glycemic_metrics(timestamps_ms: np.ndarray, glucose: np.ndarray, period_seconds: float) -> Dict:
+    """Compute glycemic control metrics over a patient's readings with vectorized array passes"""
+    valid = glucose > 0
+    timestamps_ms = timestamps_ms[valid]
+    glucose = glucose[valid].astype(np.float64)
+    count = glucose.size
+    if not count:
+        return {"readings": 0}
+    if count > 1 and np.any(np.diff(timestamps_ms) < 0):
+        order = np.argsort(timestamps_ms, kind="stable")
+        timestamps_ms, glucose = timestamps_ms[order], glucose[order]
+
+    mean = float(glucose.mean())
+    sd = float(glucose.std(ddof=1)) if count > 1 else 0.0
+    bands = np.bincount(np.digitize(glucose, BAND_EDGES), minlength=len(BAND_NAMES))
+    lbgi, hbgi = _risk_indices(glucose)
+    interval_ms = cache_config.cgm_interval * 1000
+
+    return {
+        "readings": count,
+        "sensor_active_percent": round(min(100.0, count * cache_config.cgm_interval / period_seconds * 100), 1),
+        "time_in_ranges": {name: round(float(band) / count * 100, 1) for name, band in zip(BAND_NAMES, bands)},
+        "mean_glucose": round(mean, 1),
+        "sd": round(sd, 1),
+        "cv": round(sd / mean * 100, 1),
+        "gmi": round(3.31 + 0.02392 * mean, 2),
+        "mage": round(_mage(glucose, sd), 1),
+        "lbgi": round(lbgi, 2),
+        "hbgi": round(hbgi, 2),
+        "hypo_events": _count_events(glucose < HYPO_THRESHOLD, timestamps_ms, interval_ms),
+        "hyper_events": _count_events(glucose > HYPER_THRESHOLD, timestamps_ms, interval_ms)
+    }
+
+def _risk_indices(glucose: np.ndarray):
+    """Kovatchev low and high blood glucose indices"""
+    risk = 1.509 * (np.log(glucose) ** 1.084 - 5.381)
+    weighted = 10 * risk * risk
+    return float(np.where(risk < 0, weighted, 0).mean()), float(np.where(risk > 0, weighted, 0).mean())
+
+def _mage(glucose: np.ndarray, sd: float) -> float:
+    """Mean amplitude of glycemic excursions larger than one SD, in either direction"""
+    if sd == 0:
+        return 0.0
+    # Only local extremes can start or end an excursion; flat stretches are skipped
+    moves = np.diff(glucose)
+    moving = np.flatnonzero(moves)
+    if moving.size == 0:
+        return 0.0
+    direction = np.sign(moves[moving])
+    turns = moving[1:][direction[1:] != direction[:-1]]
+    extremes = glucose[np.concatenate(([moving[0]], turns, [moving[-1] + 1]))].tolist()
+
+    # Swings smaller than one SD are noise inside a larger excursion
+    excursions: List[float] = []
+    low = high = extremes[0]
+    pivot = peak = extremes[0]
+    rising = None
+    for value in extremes[1:]:
+        if rising is None:
+            low, high = min(low, value), max(high, value)
+            if value - low > sd:
+                rising, pivot, peak = True, low, value
+            elif high - value > sd:
+                rising, pivot, peak = False, high, value
+        elif rising:
+            if value > peak:
+                peak = value
+            elif peak - value > sd:
+                excursions.append(peak - pivot)
+                rising, pivot, peak = False, peak, value
+        else:
+            if value < peak:
+                peak = value
+            elif value - peak > sd:
+                excursions.append(pivot - peak)
+                rising, pivot, peak = True, peak, value
+    if rising is not None:
+        excursions.append(abs(peak - pivot))
+    return float(np.mean(excursions)) if excursions else 0.0
+
+def _count_events(in_range: np.ndarray, timestamps_ms: np.ndarray, interval_ms: float) -> int:
+    """Count runs of readings in a range lasting at least EVENT_MIN_MINUTES, split by sensor gaps"""
+    if not in_range.any():
+        return 0
+    # A run starts at the first reading, wherever the condition flips, or after a missed reading or more
+    starts = np.concatenate((
+        [True],
+        (in_range[1:] != in_range[:-1]) | (np.diff(timestamps_ms) > 2 * interval_ms)
+    ))
+    start_index = np.flatnonzero(starts)
+    end_index = np.concatenate((start_index[1:], [in_range.size])) - 1
+    durations = timestamps_ms[end_index] - timestamps_ms[start_index] + interval_ms
+    return int(np.count_nonzero(in_range[start_index] & (durations >= EVENT_MIN_MINUTES * 60 * 1000)))
+
+def _series_metrics(series: Dict, days: int) -> Dict:
+    return compute_glycemic_metrics(
+        timestamps_to_ms(series["timestamps"]),
+        np.array(series["glucose"], dtype=np.float64),
+        days * 86400
+    )
+
+async def get_glycemic_summary(patient_id: str, days: int) -> Dict:
+    """Load a patient's stored readings for the last `days` and compute their metrics"""
+    series = await get_glucose_series(patient_id, days)
+    if "error" in series:
+        return {"patient_id": patient_id, "error": series["error"]}
+
+    summary = await asyncio.to_thread(_series_metrics, series, days)
+    return {"patient_id": patient_id, "period_days": days, "summary": summary}
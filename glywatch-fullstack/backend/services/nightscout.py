@@ -1,13 +1,28 @@
-import requests
-from typing import Dict, List, Optional
-from datetime import datetime, timedelta
-import os
+import asyncio
+import time
+import httpx
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, List, Optional
+from datetime import datetime, timedelta, timezone
 import logging
-from config import nightscout_config
+from urllib.parse import urlsplit
+from config import alert_config, nightscout_config, resilience_config, supabase_config
+from services.http_client import nightscout_http
+from services.json_stream import iter_json_array
+from services.sync_state import sync_cursors, GLUCOSE_ENTRIES
+from services.cache import get_cached_latest, cache_latest, invalidate_latest
+from services.singleflight import upstream_flights
+from services.resilience import CircuitOpenError, get_breaker, call_async, backoff_delay
+from services.write_behind import write_queue
+from services.recent_readings import recent_readings
+from services.agp import agp_profiles
+from services.alert_engine import alert_engine
+from services.prediction import predictive_lows
+from services.bulk_loader import bulk_load_glucose_readings, bulk_load_treatments
 from services.supabase_service import (
-    store_glucose_reading,
-    store_device_status,
-    store_treatment,
+    store_glucose_readings,
+    get_glucose_history_from_db,
+    get_nightscout_config,
     test_supabase_connection
 )
 
@@ -15,24 +30,133 @@ from services.supabase_service import (
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Errors that mean Nightscout could not be reached or answered usefully; a body that
+# is not the expected JSON (e.g. a maintenance page) raises ValueError while decoding
+NIGHTSCOUT_ERRORS = (httpx.HTTPError, CircuitOpenError, ValueError)
+
+def is_nightscout_failure(error: Exception) -> bool:
+    """Whether an error should count against the Nightscout host's circuit"""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500 or error.response.status_code == 429
+    return isinstance(error, httpx.TransportError)
+
+def is_nightscout_retryable(error: Exception) -> bool:
+    """Retry refused connections and overload, but not a request that already waited out its read timeout"""
+    if isinstance(error, httpx.HTTPStatusError):
+        return is_nightscout_failure(error)
+    return isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError))
+
+# Reading fields returned by the history endpoints
+READING_FIELDS = ("timestamp", "glucose", "trend", "status", "raw", "filtered", "noise")
+
 class NightscoutService:
-    def __init__(self):
-        self.base_url = os.getenv("NIGHTSCOUT_URL", "https://your-nightscout-instance.herokuapp.com")
-        self.api_secret = os.getenv("NIGHTSCOUT_API_SECRET", "")
-        self.timeout = 30  # 30 seconds timeout
+    def __init__(self, base_url: Optional[str] = None, api_secret: Optional[str] = None):
+        self.base_url = (base_url or nightscout_config.base_url).rstrip("/")
+        self.api_secret = nightscout_config.api_secret if api_secret is None else api_secret
+        self.http = nightscout_http
+    
+    def _breaker(self):
+        """Circuit breaker for this instance's host, so one dead Nightscout does not affect others"""
+        return get_breaker(f"nightscout:{urlsplit(self.base_url).netloc}")
+    
+    async def _get_json(self, path: str, params: Optional[Dict] = None):
+        """GET a Nightscout API path through the shared connection pool and the host's circuit breaker"""
+        headers = {"api-secret": self.api_secret} if self.api_secret else {}
         
-    def test_connection(self) -> Dict:
-        """Test the connection to Nightscout"""
-        try:
-            headers = {"api-secret": self.api_secret} if self.api_secret else {}
-            response = requests.get(
-                f"{self.base_url}/api/v1/status.json",
+        async def request():
+            response = await self.http.get(
+                f"{self.base_url}{path}",
                 headers=headers,
-                timeout=self.timeout
+                params=params
             )
             response.raise_for_status()
-            
-            status_data = response.json()
+            return response.json()
+        
+        return await call_async(self._breaker(), request, is_nightscout_failure, is_nightscout_retryable)
+    
+    async def _stream_json(self, path: str, params: Optional[Dict] = None) -> AsyncIterator[Dict]:
+        """Stream the documents of a Nightscout API array response as they are parsed
+        
+        Failures are retried like `_get_json` until the first document has been yielded.
+        """
+        headers = {"api-secret": self.api_secret} if self.api_secret else {}
+        breaker = self._breaker()
+        attempt = 0
+        while True:
+            breaker.before_call()
+            yielded = False
+            try:
+                async with self.http.stream(f"{self.base_url}{path}", headers=headers, params=params) as response:
+                    response.raise_for_status()
+                    async for document in iter_json_array(response.aiter_bytes()):
+                        yielded = True
+                        yield document
+            except (asyncio.CancelledError, GeneratorExit):
+                breaker.cancel_call()
+                raise
+            except Exception as e:
+                if not is_nightscout_failure(e):
+                    breaker.record_success()
+                    raise
+                breaker.record_failure()
+                if yielded or attempt >= resilience_config.max_retries or not is_nightscout_retryable(e):
+                    raise
+                await asyncio.sleep(backoff_delay(attempt))
+                attempt += 1
+            else:
+                breaker.record_success()
+                return
+    
+    async def _iter_window(self, path: str, field: str, lower, upper,
+                           lower_op: str = "$gte") -> AsyncIterator[Dict]:
+        """Stream every document with `field` inside [lower, upper], newest first, paging server-side"""
+        page_size = nightscout_config.page_size
+        params = {
+            f"find[{field}][{lower_op}]": lower,
+            f"find[{field}][$lte]": upper,
+            "count": page_size
+        }
+        # Only documents sharing the page boundary time can repeat, so only their ids are kept
+        boundary, boundary_ids = None, set()
+        while True:
+            count = fresh = 0
+            tail, tail_ids = None, set()
+            async for document in self._stream_json(path, params=params):
+                count += 1
+                value, document_id = document.get(field), document.get("_id")
+                if value != tail:
+                    tail, tail_ids = value, set()
+                tail_ids.add(document_id)
+                if value == boundary and document_id in boundary_ids:
+                    continue
+                fresh += 1
+                yield document
+            if count < params["count"]:
+                return
+            if fresh:
+                # The next page ends at the oldest time seen, inclusive so documents sharing that time are not lost
+                boundary_ids = boundary_ids | tail_ids if tail == boundary else tail_ids
+                boundary = tail
+                params["count"] = page_size
+            else:
+                # A whole page shared the boundary time; widen the page rather than skip past it
+                params["count"] = count * 2
+            params[f"find[{field}][$lte]"] = boundary
+    
+    async def _get_window(self, path: str, field: str, lower, upper, lower_op: str = "$gte") -> List[Dict]:
+        """Fetch every document with `field` inside [lower, upper], newest first"""
+        return [document async for document in self._iter_window(path, field, lower, upper, lower_op)]
+    
+    async def _get_entries_since(self, since: int) -> List[Dict]:
+        """Fetch all SGV entries with a `date` (epoch ms) after `since`"""
+        return await self._get_window(
+            "/api/v1/entries.json", "date", since, int(time.time() * 1000), lower_op="$gt"
+        )
+        
+    async def test_connection(self) -> Dict:
+        """Test the connection to Nightscout"""
+        try:
+            status_data = await self._get_json("/api/v1/status.json")
             return {
                 "connected": True,
                 "status": "success",
@@ -41,27 +165,34 @@ class NightscoutService:
                 "base_url": self.base_url
             }
             
-        except requests.exceptions.ConnectionError:
+        except httpx.ConnectError:
             return {
                 "connected": False,
                 "status": "connection_error",
                 "error": "Unable to connect to Nightscout server",
                 "base_url": self.base_url
             }
-        except requests.exceptions.Timeout:
+        except httpx.TimeoutException:
             return {
                 "connected": False,
                 "status": "timeout",
                 "error": "Connection timeout",
                 "base_url": self.base_url
             }
-        except requests.exceptions.HTTPError as e:
+        except httpx.HTTPStatusError as e:
             return {
                 "connected": False,
                 "status": "http_error",
                 "error": f"HTTP error: {e.response.status_code}",
                 "base_url": self.base_url
             }
+        except CircuitOpenError as e:
+            return {
+                "connected": False,
+                "status": "circuit_open",
+                "error": str(e),
+                "base_url": self.base_url
+            }
         except Exception as e:
             return {
                 "connected": False,
@@ -70,35 +201,29 @@ class NightscoutService:
                 "base_url": self.base_url
             }
     
-    def get_latest_glucose(self, patient_id: str) -> Dict:
-        """Get the latest glucose reading from Nightscout and store in Supabase"""
+    async def get_latest_glucose(self, patient_id: str) -> Dict:
+        """Get the latest glucose reading from Nightscout and queue it for Supabase if it is new"""
         try:
-            headers = {"api-secret": self.api_secret} if self.api_secret else {}
-            response = requests.get(
-                f"{self.base_url}/api/v1/entries.json",
-                headers=headers,
-                params={"count": 1},
-                timeout=self.timeout
-            )
-            response.raise_for_status()
-            
-            entries = response.json()
+            entries = await self._get_json("/api/v1/entries.json", params={"count": 1})
             if entries:
                 latest = entries[0]
-                glucose_data = {
-                    "patient_id": patient_id,
-                    "glucose": latest.get("sgv", 0),
-                    "timestamp": latest.get("dateString", ""),
-                    "trend": latest.get("direction", "unknown"),
-                    "status": self._get_glucose_status(latest.get("sgv", 0)),
-                    "raw": latest.get("raw", 0),
-                    "filtered": latest.get("filtered", 0),
-                    "noise": latest.get("noise", 0)
-                }
+                glucose_data = {"patient_id": patient_id, **self._entry_to_reading(latest)}
+                recent_readings.record(patient_id, [glucose_data])
                 
-                # Store in Supabase
-                storage_result = store_glucose_reading(patient_id, glucose_data)
-                glucose_data["storage_result"] = storage_result
+                # Queue for Supabase only when the reading is past the sync cursor
+                sync_result = await self._store_new_entries(patient_id, entries)
+                if sync_result["new_entries"]:
+                    glucose_data["storage_result"] = {
+                        "success": True,
+                        "queued": True,
+                        "message": "Glucose reading queued for storage"
+                    }
+                else:
+                    glucose_data["storage_result"] = {
+                        "success": True,
+                        "skipped": True,
+                        "message": "Glucose reading already stored"
+                    }
                 
                 return glucose_data
             else:
@@ -107,75 +232,263 @@ class NightscoutService:
                     "error": "No glucose data available"
                 }
                 
-        except requests.RequestException as e:
+        except NIGHTSCOUT_ERRORS as e:
             logger.error(f"Failed to fetch glucose data: {str(e)}")
             return {
                 "patient_id": patient_id,
                 "error": f"Failed to fetch data from Nightscout: {str(e)}"
             }
     
-    def get_glucose_history(self, patient_id: str, hours: int = 24) -> Dict:
-        """Get glucose history from Nightscout and store in Supabase"""
+    async def get_glucose_history(self, patient_id: str, hours: int = 24) -> Dict:
+        """Get glucose history, fetching only entries newer than the sync cursor from Nightscout"""
         try:
-            headers = {"api-secret": self.api_secret} if self.api_secret else {}
-            response = requests.get(
-                f"{self.base_url}/api/v1/entries.json",
-                headers=headers,
-                params={"count": hours * 12},  # Assuming 5-minute intervals
-                timeout=self.timeout
-            )
-            response.raise_for_status()
+            window_start = int((time.time() - hours * 3600) * 1000)
+            cursor = await sync_cursors.get(patient_id, GLUCOSE_ENTRIES)
+            since = max(cursor["last_entry_date"], window_start)
+            
+            # Anything at or before the cursor was stored by an earlier sync
+            fetch = self._get_entries_since(since)
+            if since > window_start:
+                entries, stored = await asyncio.gather(
+                    fetch,
+                    get_glucose_history_from_db(patient_id, hours, fields=READING_FIELDS)
+                )
+            else:
+                entries, stored = await fetch, {}
             
-            entries = response.json()
-            readings = []
-            stored_count = 0
+            sync_result = await self._store_new_entries(patient_id, entries)
+            queued_count = sync_result["queued"]
             
-            for entry in entries:
-                reading_data = {
-                    "timestamp": entry.get("dateString", ""),
-                    "glucose": entry.get("sgv", 0),
-                    "trend": entry.get("direction", "unknown"),
-                    "raw": entry.get("raw", 0),
-                    "filtered": entry.get("filtered", 0),
-                    "noise": entry.get("noise", 0)
-                }
-                
-                readings.append(reading_data)
-                
-                # Store each reading in Supabase
-                storage_result = store_glucose_reading(patient_id, reading_data)
-                if storage_result.get("success"):
-                    stored_count += 1
+            readings = [self._entry_to_reading(entry) for entry in entries]
+            readings.extend(
+                {field: row.get(field) for field in READING_FIELDS}
+                for row in stored.get("readings", [])
+            )
+            # Stored rows fill in the window before the cursor, so this is the whole window
+            recent_readings.record(patient_id, readings, since=window_start)
             
             return {
                 "patient_id": patient_id,
                 "readings": readings,
                 "period_hours": hours,
                 "total_readings": len(readings),
-                "stored_in_db": stored_count,
-                "storage_status": f"Stored {stored_count}/{len(readings)} readings in database"
+                "new_readings": len(entries),
+                "queued_for_db": queued_count,
+                "storage_status": f"Queued {queued_count} new readings for database"
             }
                 
-        except requests.RequestException as e:
+        except NIGHTSCOUT_ERRORS as e:
             logger.error(f"Failed to fetch glucose history: {str(e)}")
             return {
                 "patient_id": patient_id,
                 "error": f"Failed to fetch history from Nightscout: {str(e)}"
             }
     
-    def get_device_status(self, patient_id: str) -> Dict:
-        """Get device status from Nightscout and store in Supabase"""
-        try:
-            headers = {"api-secret": self.api_secret} if self.api_secret else {}
-            response = requests.get(
-                f"{self.base_url}/api/v1/devicestatus.json",
-                headers=headers,
-                params={"count": 1},
-                timeout=self.timeout
+    async def stream_glucose_history(self, patient_id: str, hours: int, summary: Dict) -> AsyncIterator[Dict]:
+        """Stream the window's readings from Nightscout, storing entries past the sync cursor in batches
+        
+        Only one storage batch is held at a time, so memory does not grow with the window.
+        Totals are written into `summary` once the stream is exhausted.
+        """
+        window_start = int((time.time() - hours * 3600) * 1000)
+        cursor = await sync_cursors.get(patient_id, GLUCOSE_ENTRIES)
+        summary.update(total_readings=0, stored_in_db=0)
+        batch: List[Dict] = []
+        # Newest entry stored after the last failed batch; the cursor may not pass a failure
+        resume_from = None
+        
+        async def flush():
+            nonlocal resume_from
+            # Streamed entries past the cursor get the same alert and projection pass as synced ones
+            await self._observe_new_entries(patient_id, batch)
+            storage_result = await store_glucose_readings(
+                patient_id, [self._entry_to_reading(entry) for entry in batch]
             )
-            response.raise_for_status()
+            summary["stored_in_db"] += storage_result.get("stored", 0)
+            if storage_result.get("stored"):
+                # Streamed windows reach back past the newest reading, so this usually invalidates the AGP
+                agp_profiles.record(
+                    patient_id,
+                    [entry.get("date", 0) for entry in batch],
+                    [entry.get("sgv", 0) for entry in batch]
+                )
+            if storage_result.get("success"):
+                resume_from = resume_from or batch[0]
+            else:
+                resume_from = None
+            batch.clear()
+        
+        async for entry in self._iter_window(
+            "/api/v1/entries.json", "date", window_start, int(time.time() * 1000)
+        ):
+            summary["total_readings"] += 1
+            yield self._entry_to_reading(entry)
+            if entry.get("date", 0) > cursor["last_entry_date"] and entry.get("_id") != cursor["last_entry_id"]:
+                batch.append(entry)
+                if len(batch) >= supabase_config.batch_size:
+                    await flush()
+        if batch:
+            await flush()
+        
+        if resume_from is not None:
+            invalidate_latest(patient_id)
+            await sync_cursors.advance(
+                patient_id,
+                GLUCOSE_ENTRIES,
+                resume_from.get("date", 0),
+                resume_from.get("_id"),
+                summary["stored_in_db"]
+            )
+    
+    async def backfill(self, patient_id: str, days: int) -> Dict:
+        """Import a patient's Nightscout history for the last `days` straight into Postgres
+        
+        Entries and treatments are streamed page by page from Nightscout into COPY, so a
+        months-long import never holds more than one page in memory.
+        """
+        end_time = datetime.now(timezone.utc)
+        start_time = end_time - timedelta(days=days)
+        cursor = await sync_cursors.get(patient_id, GLUCOSE_ENTRIES)
+        # Entries young enough to alert on; older ones only matter to the stored history
+        recent_since = int(end_time.timestamp() * 1000) - alert_config.max_reading_age_minutes * 60 * 1000
+        newest = {}
+        recent: List[Dict] = []
+        
+        async def readings():
+            async for entry in self._iter_window(
+                "/api/v1/entries.json", "date",
+                int(start_time.timestamp() * 1000), int(end_time.timestamp() * 1000)
+            ):
+                # Entries arrive newest first
+                if not newest:
+                    newest.update(entry)
+                if entry.get("date", 0) >= max(recent_since, cursor["last_entry_date"] + 1):
+                    recent.append(entry)
+                yield self._entry_to_reading(entry)
+        
+        glucose_result = await bulk_load_glucose_readings(patient_id, readings())
+        treatments_result = await bulk_load_treatments(patient_id, self._iter_window(
+            "/api/v1/treatments.json", "created_at",
+            self._to_nightscout_time(start_time), self._to_nightscout_time(end_time)
+        ))
+        
+        # A backfill can land in the middle of a low, so its newest entries are evaluated like synced ones
+        await self._observe_new_entries(patient_id, recent)
+        if glucose_result.get("inserted"):
+            invalidate_latest(patient_id)
+            recent_readings.invalidate(patient_id)
+            # The next AGP view rebuilds from storage, taking in every imported reading
+            agp_profiles.invalidate(patient_id)
+        if newest and glucose_result.get("success"):
+            # Routine syncs pick up from the newest imported entry
+            await sync_cursors.advance(
+                patient_id, GLUCOSE_ENTRIES, newest.get("date", 0), newest.get("_id"), glucose_result["inserted"]
+            )
+        
+        return {
+            "patient_id": patient_id,
+            "period_days": days,
+            "glucose_readings": glucose_result,
+            "treatments": treatments_result
+        }
+    
+    async def sync_glucose(self, patient_id: str, hours: int = 24) -> Dict:
+        """Pull entries newer than the sync cursor (within the last `hours`) from Nightscout and store them"""
+        window_start = int((time.time() - hours * 3600) * 1000)
+        cursor = await sync_cursors.get(patient_id, GLUCOSE_ENTRIES)
+        since = max(cursor["last_entry_date"], window_start)
+        entries = await self._get_entries_since(since)
+        recent_readings.record(patient_id, [self._entry_to_reading(entry) for entry in entries], since=since)
+        sync_result = await self._store_new_entries(patient_id, entries, wait=True)
+        return {
+            "patient_id": patient_id,
+            "fetched": len(entries),
+            "new_entries": sync_result["new_entries"],
+            "stored": sync_result["stored"]
+        }
+    
+    async def _observe_new_entries(self, patient_id: str, entries: List[Dict]):
+        """Run entries past the sync cursor through the alert rules and the low-glucose projection, oldest first"""
+        ordered = sorted(entries, key=lambda entry: entry.get("date", 0))
+        await alert_engine.evaluate(
+            patient_id,
+            [(entry.get("date", 0), entry.get("sgv", 0), entry.get("direction")) for entry in ordered]
+        )
+        predictive_lows.observe(
+            patient_id,
+            [entry.get("date", 0) for entry in ordered],
+            [entry.get("sgv", 0) for entry in ordered]
+        )
+    
+    async def _store_new_entries(self, patient_id: str, entries: List[Dict], wait: bool = False) -> Dict:
+        """Queue entries newer than the patient's sync cursor for storage; the cursor advances once they are written
+        
+        With `wait` the call returns only after the write-behind queue has flushed them.
+        """
+        cursor = await sync_cursors.get(patient_id, GLUCOSE_ENTRIES)
+        new_entries = sorted(
+            (
+                entry for entry in entries
+                if entry.get("date", 0) > cursor["last_entry_date"]
+                and entry.get("_id") != cursor["last_entry_id"]
+            ),
+            key=lambda entry: entry.get("date", 0)
+        )
+        
+        if not new_entries:
+            return {"new_entries": 0, "queued": 0, "stored": 0, "storage_result": {}}
+        
+        await self._observe_new_entries(patient_id, new_entries)
+        
+        async def on_stored(storage_result: Dict):
+            # Only advance past the leading run of saved rows so the cursor never skips an unsaved reading
+            stored_entries = []
+            counted_entries = []
+            for entry, row_result in zip(new_entries, storage_result.get("results", [])):
+                if not row_result.get("success"):
+                    break
+                stored_entries.append(entry)
+                # Entries skipped for lacking a sensor time let the cursor pass but were not stored
+                if not row_result.get("skipped"):
+                    counted_entries.append(entry)
             
-            devices = response.json()
+            if stored_entries:
+                last_stored = stored_entries[-1]
+                invalidate_latest(patient_id)
+                agp_profiles.record(
+                    patient_id,
+                    [entry.get("date", 0) for entry in counted_entries],
+                    [entry.get("sgv", 0) for entry in counted_entries]
+                )
+                await sync_cursors.advance(
+                    patient_id,
+                    GLUCOSE_ENTRIES,
+                    last_stored.get("date", 0),
+                    last_stored.get("_id"),
+                    storage_result.get("stored", 0)
+                )
+        
+        stored = await write_queue.submit(
+            "glucose_readings",
+            patient_id,
+            [self._entry_to_reading(entry) for entry in new_entries],
+            on_stored
+        )
+        if not wait:
+            return {"new_entries": len(new_entries), "queued": len(new_entries)}
+        
+        storage_result = await stored
+        return {
+            "new_entries": len(new_entries),
+            "queued": len(new_entries),
+            "stored": storage_result.get("stored", 0),
+            "storage_result": storage_result
+        }
+    
+    async def get_device_status(self, patient_id: str) -> Dict:
+        """Get device status from Nightscout and queue it for Supabase"""
+        try:
+            devices = await self._get_json("/api/v1/devicestatus.json", params={"count": 1})
             if devices:
                 latest_device = devices[0]
                 device_data = {
@@ -189,9 +502,13 @@ class NightscoutService:
                     "loop_status": latest_device.get("loop", {})
                 }
                 
-                # Store in Supabase
-                storage_result = store_device_status(patient_id, device_data)
-                device_data["storage_result"] = storage_result
+                # Written to Supabase by the write-behind queue
+                await write_queue.submit("device_status", patient_id, [device_data])
+                device_data["storage_result"] = {
+                    "success": True,
+                    "queued": True,
+                    "message": "Device status queued for storage"
+                }
                 
                 return device_data
             else:
@@ -201,50 +518,60 @@ class NightscoutService:
                     "error": "No device status available"
                 }
                 
-        except requests.RequestException as e:
+        except NIGHTSCOUT_ERRORS as e:
             logger.error(f"Failed to fetch device status: {str(e)}")
             return {
                 "patient_id": patient_id,
                 "error": f"Failed to fetch device status: {str(e)}"
             }
     
-    def get_treatments(self, patient_id: str, hours: int = 24) -> Dict:
-        """Get treatments from Nightscout and store in Supabase"""
+    async def get_treatments(self, patient_id: str, hours: int = 24) -> Dict:
+        """Get treatments from Nightscout and queue them for Supabase"""
         try:
-            headers = {"api-secret": self.api_secret} if self.api_secret else {}
-            response = requests.get(
-                f"{self.base_url}/api/v1/treatments.json",
-                headers=headers,
-                params={"count": hours * 4},  # Assuming treatments every 15 minutes
-                timeout=self.timeout
+            end_time = datetime.now(timezone.utc)
+            start_time = end_time - timedelta(hours=hours)
+            treatments = await self._get_window(
+                "/api/v1/treatments.json",
+                "created_at",
+                self._to_nightscout_time(start_time),
+                self._to_nightscout_time(end_time)
             )
-            response.raise_for_status()
-            
-            treatments = response.json()
-            stored_count = 0
             
-            for treatment in treatments:
-                # Store each treatment in Supabase
-                storage_result = store_treatment(patient_id, treatment)
-                if storage_result.get("success"):
-                    stored_count += 1
+            # Written to Supabase in batches by the write-behind queue
+            await write_queue.submit("treatments", patient_id, treatments)
             
             return {
                 "patient_id": patient_id,
                 "treatments": treatments,
                 "period_hours": hours,
                 "total_treatments": len(treatments),
-                "stored_in_db": stored_count,
-                "storage_status": f"Stored {stored_count}/{len(treatments)} treatments in database"
+                "queued_for_db": len(treatments),
+                "storage_status": f"Queued {len(treatments)} treatments for database"
             }
                 
-        except requests.RequestException as e:
+        except NIGHTSCOUT_ERRORS as e:
             logger.error(f"Failed to fetch treatments: {str(e)}")
             return {
                 "patient_id": patient_id,
                 "error": f"Failed to fetch treatments from Nightscout: {str(e)}"
             }
     
+    def _to_nightscout_time(self, value: datetime) -> str:
+        """Format a UTC datetime the way Nightscout stores `created_at`"""
+        return value.isoformat(timespec="milliseconds").replace("+00:00", "Z")
+    
+    def _entry_to_reading(self, entry: Dict) -> Dict:
+        """Convert a Nightscout SGV entry into a glucose reading"""
+        return {
+            "glucose": entry.get("sgv", 0),
+            "timestamp": entry.get("dateString", ""),
+            "trend": entry.get("direction", "unknown"),
+            "status": self._get_glucose_status(entry.get("sgv", 0)),
+            "raw": entry.get("raw", 0),
+            "filtered": entry.get("filtered", 0),
+            "noise": entry.get("noise", 0)
+        }
+    
     def _get_glucose_status(self, glucose: int) -> str:
         """Determine glucose status based on value"""
         if glucose < 70:
@@ -254,25 +581,142 @@ class NightscoutService:
         else:
             return "normal"
 
-# Create a global instance
+class NightscoutClientRegistry:
+    """Bounded LRU of per-patient Nightscout clients resolved from user_nightscout_config"""
+    
+    def __init__(self, capacity: int, default: NightscoutService):
+        self.capacity = capacity
+        self.default = default
+        self._clients: "OrderedDict[str, NightscoutService]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    async def get(self, patient_id: str) -> NightscoutService:
+        """Get the client for a patient, looking up their config only on a cache miss"""
+        client = self._clients.get(patient_id)
+        if client is not None:
+            self.hits += 1
+            self._clients.move_to_end(patient_id)
+            return client
+        
+        self.misses += 1
+        config = await upstream_flights.do(
+            ("supabase", "nightscout_config", patient_id),
+            lambda: get_nightscout_config(patient_id)
+        )
+        client = self._clients.get(patient_id)
+        if client is not None:
+            # A concurrent miss for the same patient already built the client
+            return client
+        if config.get("success") and config.get("nightscout_url"):
+            client = NightscoutService(config["nightscout_url"], config.get("api_secret") or "")
+        elif config.get("success") is None:
+            # Lookup failed rather than finding no row; use the default without caching it
+            return self.default
+        else:
+            # Patients without their own instance use the globally configured Nightscout
+            client = self.default
+        self._store(patient_id, client)
+        return client
+    
+    def warm(self, patient_id: str, nightscout_url: str, api_secret: Optional[str]) -> NightscoutService:
+        """Register a client from an already loaded config, reusing the cached one if unchanged"""
+        client = self._clients.get(patient_id)
+        if client is None or client.base_url != nightscout_url.rstrip("/") or client.api_secret != (api_secret or ""):
+            client = NightscoutService(nightscout_url, api_secret or "")
+        self._store(patient_id, client)
+        return client
+    
+    def invalidate(self, patient_id: str):
+        """Drop a patient's cached client so the next request reloads their config"""
+        self._clients.pop(patient_id, None)
+    
+    def _store(self, patient_id: str, client: NightscoutService):
+        self._clients[patient_id] = client
+        self._clients.move_to_end(patient_id)
+        while len(self._clients) > self.capacity:
+            self._clients.popitem(last=False)
+            self.evictions += 1
+    
+    def get_stats(self) -> Dict:
+        """Get cache size and hit/miss counters"""
+        return {
+            "size": len(self._clients),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+# Create global instances
 nightscout_service = NightscoutService()
+nightscout_registry = NightscoutClientRegistry(nightscout_config.client_cache_size, nightscout_service)
 
-def test_nightscout_connection() -> Dict:
+async def test_nightscout_connection() -> Dict:
     """Test connection to Nightscout"""
-    return nightscout_service.test_connection()
+    return await nightscout_service.test_connection()
 
-def get_latest_glucose(patient_id: str) -> Dict:
-    """Get latest glucose reading for a patient"""
-    return nightscout_service.get_latest_glucose(patient_id)
+async def get_latest_glucose(patient_id: str) -> Dict:
+    """Get latest glucose reading for a patient, cached until the next reading is due"""
+    recent = recent_readings.latest(patient_id)
+    if recent is not None:
+        return {"patient_id": patient_id, **recent}
+    cached = get_cached_latest("nightscout", patient_id)
+    if cached is not None:
+        return cached
+    
+    async def fetch():
+        service = await nightscout_registry.get(patient_id)
+        result = await service.get_latest_glucose(patient_id)
+        cache_latest("nightscout", patient_id, result)
+        return result
+    
+    return await upstream_flights.do(("nightscout", "latest", patient_id), fetch)
 
-def get_glucose_history(patient_id: str, hours: int = 24) -> Dict:
-    """Get glucose history for a patient"""
-    return nightscout_service.get_glucose_history(patient_id, hours)
+async def get_glucose_history(patient_id: str, hours: int = 24) -> Dict:
+    """Get glucose history for a patient, from the recent readings buffer when it covers the window"""
+    recent = recent_readings.window(patient_id, hours)
+    if recent is not None:
+        return {
+            "patient_id": patient_id,
+            "readings": recent,
+            "period_hours": hours,
+            "total_readings": len(recent),
+            "new_readings": 0,
+            "queued_for_db": 0,
+            "storage_status": "Served from recent readings"
+        }
+    
+    async def fetch():
+        service = await nightscout_registry.get(patient_id)
+        return await service.get_glucose_history(patient_id, hours)
+    
+    return await upstream_flights.do(("nightscout", "history", patient_id, hours), fetch)
+
+async def stream_glucose_history(patient_id: str, hours: int, summary: Dict) -> AsyncIterator[Dict]:
+    """Stream glucose history for a patient, storing new readings as they arrive"""
+    service = await nightscout_registry.get(patient_id)
+    async for reading in service.stream_glucose_history(patient_id, hours, summary):
+        yield reading
+
+async def backfill_patient(patient_id: str, days: int) -> Dict:
+    """Bulk import a patient's Nightscout history into the database"""
+    service = await nightscout_registry.get(patient_id)
+    return await service.backfill(patient_id, days)
 
-def get_device_status(patient_id: str) -> Dict:
+async def get_device_status(patient_id: str) -> Dict:
     """Get device status for a patient"""
-    return nightscout_service.get_device_status(patient_id)
+    async def fetch():
+        service = await nightscout_registry.get(patient_id)
+        return await service.get_device_status(patient_id)
+    
+    return await upstream_flights.do(("nightscout", "device_status", patient_id), fetch)
 
-def get_treatments(patient_id: str, hours: int = 24) -> Dict:
+async def get_treatments(patient_id: str, hours: int = 24) -> Dict:
     """Get treatments for a patient"""
-    return nightscout_service.get_treatments(patient_id, hours) 
\ No newline at end of file
+    async def fetch():
+        service = await nightscout_registry.get(patient_id)
+        return await service.get_treatments(patient_id, hours)
+    
+    return await upstream_flights.do(("nightscout", "treatments", patient_id, hours), fetch) 
\ No newline at end of file
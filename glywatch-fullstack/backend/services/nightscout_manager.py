@@ -6,6 +6,8 @@ from typing import Dict, List, Optional
 from datetime import datetime
 import logging
 from config import supabase_config
+from services.nightscout import nightscout_registry
+from services.recent_readings import recent_readings
 
 logger = logging.getLogger(__name__)
 
@@ -132,6 +134,9 @@ class NightscoutManager:
             )
             
             if response.status_code == 200:
+                # Cached client and readings may come from the old endpoint
+                nightscout_registry.invalidate(user_id)
+                recent_readings.invalidate(user_id)
                 return {
                     "success": True,
                     "message": "User configuration updated"
@@ -167,6 +172,8 @@ class NightscoutManager:
                 },
                 params={"user_id": f"eq.{user_id}"}
             )
+            nightscout_registry.invalidate(user_id)
+            recent_readings.invalidate(user_id)
             
             return {
                 "success": True,
@@ -0,0 +1,117 @@
+import time
+import numpy as np
+from typing import Dict, List, Sequence
+import logging
+from config import alert_config, cache_config
+from services.alert_engine import alert_engine
+
+logger = logging.getLogger(__name__)
+
+class PredictiveLowMonitor:
+    """Projects every patient's glucose a short horizon ahead in one vectorized pass
+
+    The last `history` readings of all patients sit in two (patients x history) matrices,
+    oldest to newest along each row, so a scan fits one least-squares line per row over
+    the recent window with whole-matrix operations instead of a loop over patients.
+    """
+
+    def __init__(self, history: int = 6, initial_patients: int = 256):
+        self.history = history
+        self._rows: Dict[str, int] = {}
+        self._patients: List[str] = []
+        self.dates = np.full((initial_patients, history), np.nan)
+        self.glucose = np.full((initial_patients, history), np.nan)
+        self.last_scan: Dict = {}
+
+    def observe(self, patient_id: str, dates: Sequence[int], glucose: Sequence[int]):
+        """Shift a patient's newest readings (ascending epoch ms) into their row"""
+        row = self._rows.get(patient_id)
+        if row is None:
+            row = self._add_row(patient_id)
+        for date, value in zip(dates, glucose):
+            if not value or date <= np.nan_to_num(self.dates[row, -1], nan=-1):
+                continue
+            self.dates[row, :-1] = self.dates[row, 1:]
+            self.glucose[row, :-1] = self.glucose[row, 1:]
+            self.dates[row, -1] = date
+            self.glucose[row, -1] = value
+
+    def _add_row(self, patient_id: str) -> int:
+        row = len(self._patients)
+        if row == self.dates.shape[0]:
+            # Grow by doubling so adding patients stays amortized O(1)
+            self.dates = np.vstack((self.dates, np.full_like(self.dates, np.nan)))
+            self.glucose = np.vstack((self.glucose, np.full_like(self.glucose, np.nan)))
+        self._rows[patient_id] = row
+        self._patients.append(patient_id)
+        return row
+
+    def project(self, now_ms: float) -> List[Dict]:
+        """Get patients whose fitted trend crosses their low threshold within the horizon"""
+        count = len(self._patients)
+        if not count:
+            return []
+        dates, glucose = self.dates[:count], self.glucose[:count]
+        thresholds = np.full(count, float(alert_engine.default_settings["low_threshold"]))
+        for patient_id, threshold in alert_engine.custom_low_thresholds().items():
+            row = self._rows.get(patient_id)
+            if row is not None:
+                thresholds[row] = threshold
+
+        latest = dates[:, -1]
+        with np.errstate(invalid="ignore"):
+            in_window = dates >= (latest - alert_config.predictive_window_minutes * 60 * 1000)[:, None]
+        points = in_window.sum(axis=1)
+        usable = points >= alert_config.predictive_min_points
+
+        # Least squares per row over the readings in the window, in minutes relative to the latest
+        minutes = np.where(in_window, (dates - latest[:, None]) / 60000, 0.0)
+        values = np.where(in_window, glucose, 0.0)
+        divisor = np.maximum(points, 1)
+        mean_minutes = minutes.sum(axis=1) / divisor
+        mean_glucose = values.sum(axis=1) / divisor
+        offsets = np.where(in_window, minutes - mean_minutes[:, None], 0.0)
+        spread = (offsets * offsets).sum(axis=1)
+        slopes = np.divide(
+            (offsets * (values - mean_glucose[:, None])).sum(axis=1), spread,
+            out=np.zeros(count), where=spread > 0
+        )
+
+        age_minutes = (now_ms - np.nan_to_num(latest)) / 60000
+        fitted_now = mean_glucose + slopes * (age_minutes - mean_minutes)
+        projected = fitted_now + slopes * alert_config.predictive_horizon_minutes
+        fresh = age_minutes <= 2 * cache_config.cgm_interval / 60
+        # Patients already below the threshold are covered by the low glucose rule
+        flagged = usable & fresh & (slopes < 0) & (fitted_now >= thresholds) & (projected < thresholds)
+
+        return [
+            {
+                "patient_id": self._patients[row],
+                "glucose": int(glucose[row, -1]),
+                "reading_date": int(latest[row]),
+                "slope_per_minute": round(float(slopes[row]), 2),
+                "projected_glucose": round(float(projected[row]), 1),
+                "threshold": int(thresholds[row]),
+                "minutes_to_low": round(float((thresholds[row] - fitted_now[row]) / slopes[row]), 1)
+            }
+            for row in np.flatnonzero(flagged)
+        ]
+
+    async def scan(self) -> List[Dict]:
+        """Project all patients, raise predicted-low alerts and keep the result for polling"""
+        started = time.monotonic()
+        predictions = self.project(time.time() * 1000)
+        await alert_engine.raise_predicted_lows(predictions)
+        self.last_scan = {
+            "patients": len(self._patients),
+            "predicted_lows": predictions,
+            "horizon_minutes": alert_config.predictive_horizon_minutes,
+            "duration_ms": round((time.monotonic() - started) * 1000, 2),
+            "scanned_at": time.time()
+        }
+        if predictions:
+            logger.info(f"Predicted lows for {len(predictions)} patients")
+        return predictions
+
+# Create a global instance
+predictive_lows = PredictiveLowMonitor()
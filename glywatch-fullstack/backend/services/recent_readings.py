@@ -0,0 +1,217 @@
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional
+from config import cache_config
+from services.cache import parse_timestamp
+
+# Nightscout trend arrows and reading statuses are stored as indexes into these tuples
+TREND_CODES = (
+    "unknown", "NONE", "DoubleUp", "SingleUp", "FortyFiveUp", "Flat",
+    "FortyFiveDown", "SingleDown", "DoubleDown", "NOT COMPUTABLE", "RATE OUT OF RANGE"
+)
+STATUS_CODES = ("unknown", "low", "normal", "elevated", "high")
+
+_TREND_INDEX = {trend: code for code, trend in enumerate(TREND_CODES)}
+_STATUS_INDEX = {status: code for code, status in enumerate(STATUS_CODES)}
+
+def _int(value, low: int, high: int) -> int:
+    """Coerce a reading field to an int that fits its typed array"""
+    try:
+        return min(max(int(value or 0), low), high)
+    except (TypeError, ValueError):
+        return 0
+
+class GlucoseRingBuffer:
+    """Fixed-capacity ring of one patient's most recent readings, oldest to newest
+
+    Fields live in parallel typed arrays (about 20 bytes per reading) instead of dicts.
+    `covered_from` is the epoch ms from which the buffer is known to hold every reading,
+    and `synced_at` is when that was last confirmed against Nightscout.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.dates = array("q", [0]) * capacity
+        self.glucose = array("H", [0]) * capacity
+        self.trends = array("B", [0]) * capacity
+        self.statuses = array("B", [0]) * capacity
+        self.noise = array("B", [0]) * capacity
+        self.raw = array("i", [0]) * capacity
+        self.filtered = array("i", [0]) * capacity
+        self.start = 0
+        self.count = 0
+        self.covered_from: Optional[int] = None
+        self.synced_at = 0.0
+
+    def newest_date(self) -> Optional[int]:
+        if not self.count:
+            return None
+        return self.dates[(self.start + self.count - 1) % self.capacity]
+
+    def clear(self):
+        self.start = 0
+        self.count = 0
+        self.covered_from = None
+
+    def append(self, date: int, reading: Dict):
+        """Add a reading newer than every reading held, overwriting the oldest when full"""
+        index = (self.start + self.count) % self.capacity
+        if self.count == self.capacity:
+            # Everything up to the evicted reading is no longer held
+            self.covered_from = max(self.covered_from or 0, self.dates[index] + 1)
+            self.start = (self.start + 1) % self.capacity
+        else:
+            self.count += 1
+        self.dates[index] = date
+        self.glucose[index] = _int(reading.get("glucose"), 0, 0xFFFF)
+        self.trends[index] = _TREND_INDEX.get(reading.get("trend"), 0)
+        self.statuses[index] = _STATUS_INDEX.get(reading.get("status"), 0)
+        self.noise[index] = _int(reading.get("noise"), 0, 0xFF)
+        self.raw[index] = _int(reading.get("raw"), -2**31, 2**31 - 1)
+        self.filtered[index] = _int(reading.get("filtered"), -2**31, 2**31 - 1)
+
+    def newest_first(self, since: int) -> Iterator[int]:
+        """Yield slot indexes of readings at or after `since`, newest first"""
+        for offset in range(self.count - 1, -1, -1):
+            index = (self.start + offset) % self.capacity
+            if self.dates[index] < since:
+                return
+            yield index
+
+    def reading(self, index: int) -> Dict:
+        """Build the reading dict for one slot"""
+        timestamp = datetime.fromtimestamp(self.dates[index] / 1000, tz=timezone.utc)
+        return {
+            "glucose": self.glucose[index],
+            "timestamp": timestamp.isoformat(timespec="milliseconds").replace("+00:00", "Z"),
+            "trend": TREND_CODES[self.trends[index]],
+            "status": STATUS_CODES[self.statuses[index]],
+            "raw": self.raw[index],
+            "filtered": self.filtered[index],
+            "noise": self.noise[index]
+        }
+
+class RecentReadingsStore:
+    """Per-patient ring buffers that serve latest and short-window reads without I/O"""
+
+    def __init__(self, capacity: int, max_patients: int):
+        self.capacity = capacity
+        self.max_patients = max_patients
+        self._buffers: "OrderedDict[str, GlucoseRingBuffer]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def record(self, patient_id: str, readings: Iterable[Dict], since: Optional[int] = None):
+        """Add readings fetched for a patient
+
+        With `since` (epoch ms) the readings are every reading from that time on; without it
+        they are just the newest readings as of now, so a gap may sit in front of them.
+        """
+        dated = sorted(
+            (
+                (int(parsed.timestamp() * 1000), reading)
+                for reading in readings
+                for parsed in [parse_timestamp(reading.get("timestamp", ""))]
+                if parsed is not None
+            ),
+            key=lambda item: item[0]
+        )
+        now = time.time()
+        with self._lock:
+            buffer = self._buffer(patient_id)
+            newest = buffer.newest_date()
+            if since is not None:
+                if newest is not None and (buffer.covered_from or 0) < since <= newest:
+                    dated = [item for item in dated if item[0] > newest]
+                else:
+                    # Empty, superseded or disjoint from what is held: start over from `since`
+                    buffer.clear()
+                    buffer.covered_from = since
+                for date, reading in dated:
+                    buffer.append(date, reading)
+                buffer.synced_at = now
+                return
+
+            if not dated:
+                return
+            date, reading = dated[-1]
+            if newest is not None and date <= newest:
+                # Nothing newer than what is held exists yet
+                buffer.synced_at = now
+                return
+            # The next reading after the held ones keeps their coverage; past a missed reading
+            # there may be a gap, so coverage restarts here
+            next_gap = (cache_config.cgm_interval + cache_config.latest_grace) * 1000
+            if newest is None or date - newest > next_gap:
+                buffer.covered_from = date
+            buffer.append(date, reading)
+            buffer.synced_at = now
+
+    def latest(self, patient_id: str) -> Optional[Dict]:
+        """Get the newest reading while the next one is not yet due"""
+        with self._lock:
+            buffer = self._buffers.get(patient_id)
+            newest = buffer.newest_date() if buffer is not None else None
+            due = (newest or 0) / 1000 + cache_config.cgm_interval + cache_config.latest_grace
+            if newest is None or due <= time.time():
+                self.misses += 1
+                return None
+            self._buffers.move_to_end(patient_id)
+            self.hits += 1
+            return buffer.reading((buffer.start + buffer.count - 1) % buffer.capacity)
+
+    def window(self, patient_id: str, hours: float) -> Optional[List[Dict]]:
+        """Get every reading from the last `hours`, newest first, or None if the buffer cannot vouch for it"""
+        now = time.time()
+        since = int((now - hours * 3600) * 1000)
+        with self._lock:
+            buffer = self._buffers.get(patient_id)
+            if (
+                buffer is None
+                or buffer.covered_from is None
+                or buffer.covered_from > since
+                or now - buffer.synced_at > cache_config.cgm_interval
+            ):
+                self.misses += 1
+                return None
+            self._buffers.move_to_end(patient_id)
+            self.hits += 1
+            return [buffer.reading(index) for index in buffer.newest_first(since)]
+
+    def invalidate(self, patient_id: str):
+        """Drop a patient's buffer, e.g. after their Nightscout endpoint changes"""
+        with self._lock:
+            self._buffers.pop(patient_id, None)
+
+    def _buffer(self, patient_id: str) -> GlucoseRingBuffer:
+        buffer = self._buffers.get(patient_id)
+        if buffer is None:
+            buffer = GlucoseRingBuffer(self.capacity)
+            self._buffers[patient_id] = buffer
+            while len(self._buffers) > self.max_patients:
+                self._buffers.popitem(last=False)
+                self.evictions += 1
+        self._buffers.move_to_end(patient_id)
+        return buffer
+
+    def get_stats(self) -> Dict:
+        """Get buffer count and hit/miss counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "patients": len(self._buffers),
+                "max_patients": self.max_patients,
+                "capacity": self.capacity,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions
+            }
+
+# Create a global instance
+recent_readings = RecentReadingsStore(cache_config.recent_capacity, cache_config.recent_max_patients)
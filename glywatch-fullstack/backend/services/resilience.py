@@ -0,0 +1,140 @@
+import asyncio
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+import logging
+from config import resilience_config
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuit for {name} is open; retry in {retry_after:.1f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    """Opens after consecutive failures, then lets one probe through once the reset timeout passes"""
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self.successes = 0
+        self.failures = 0
+        self.rejected = 0
+        self.times_opened = 0
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go through now"""
+        with self._lock:
+            if self.state == OPEN:
+                remaining = self.opened_at + self.reset_timeout - time.monotonic()
+                if remaining > 0:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.name, remaining)
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN:
+                if self._probe_in_flight:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.name, self.reset_timeout)
+                self._probe_in_flight = True
+
+    def cancel_call(self):
+        """Release a half-open probe slot when the call was cancelled before it finished"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self.successes += 1
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+            if self.state != CLOSED:
+                logger.info(f"Circuit for {self.name} closed")
+            self.state = CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.consecutive_failures += 1
+            self._probe_in_flight = False
+            if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.times_opened += 1
+                    logger.warning(f"Circuit for {self.name} opened after {self.consecutive_failures} failures")
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "successes": self.successes,
+                "failures": self.failures,
+                "rejected": self.rejected,
+                "times_opened": self.times_opened
+            }
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Get the circuit breaker for an upstream, creating it on first use"""
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = CircuitBreaker(name, resilience_config.failure_threshold, resilience_config.reset_timeout)
+            _breakers[name] = breaker
+        return breaker
+
+def get_breaker_stats() -> Dict:
+    """Get state and counters for every upstream circuit"""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.get_stats() for breaker in breakers}
+
+def backoff_delay(attempt: int) -> float:
+    """Capped exponential backoff with full jitter"""
+    cap = min(resilience_config.max_delay, resilience_config.base_delay * (2 ** attempt))
+    return random.uniform(0, cap)
+
+async def call_async(breaker: CircuitBreaker, fn: Callable[[], Awaitable[Any]],
+                     is_failure: Callable[[Exception], bool],
+                     is_retryable: Optional[Callable[[Exception], bool]] = None) -> Any:
+    """Await `fn` through the breaker, retrying retryable upstream failures with backoff"""
+    is_retryable = is_retryable or is_failure
+    attempt = 0
+    while True:
+        breaker.before_call()
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            breaker.cancel_call()
+            raise
+        except Exception as e:
+            if not is_failure(e):
+                # The upstream answered; the request itself was bad
+                breaker.record_success()
+                raise
+            breaker.record_failure()
+            if attempt >= resilience_config.max_retries or not is_retryable(e):
+                raise
+            await asyncio.sleep(backoff_delay(attempt))
+            attempt += 1
+        else:
+            breaker.record_success()
+            return result
@@ -0,0 +1,41 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one in-flight call whose result all callers share"""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self.started = 0
+        self.shared = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run `fn` unless an identical call is already in flight, in which case wait for that one"""
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            self.started += 1
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.shared += 1
+        # Shield so one caller disconnecting does not cancel the fetch for everyone else
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Mark the exception retrieved in case every caller was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    def get_stats(self) -> Dict:
+        """Get counts of started and coalesced calls"""
+        return {
+            "in_flight": len(self._calls),
+            "started": self.started,
+            "shared": self.shared
+        }
+
+# Shared by the Nightscout and Supabase read paths
+upstream_flights = SingleFlight()
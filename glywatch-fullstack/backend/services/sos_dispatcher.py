@@ -0,0 +1,253 @@
+import asyncio
+import itertools
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+import logging
+from config import sos_config
+from services.resilience import backoff_delay
+from services.supabase_service import (
+    priority_requests,
+    create_sos_event,
+    update_sos_event,
+    get_undelivered_sos_events,
+    get_sos_history,
+    get_caregiver_contacts
+)
+
+logger = logging.getLogger(__name__)
+
+# Manual SOS goes out ahead of automated ones
+PRIORITIES = {"manual": 0, "automated": 1}
+
+# Notified when no caregiver contacts can be found, so an SOS is never dropped
+ON_CALL_CONTACT = {"caregiver_id": "on-call", "channel": "log", "address": "on-call"}
+
+class LogNotifier:
+    """Local stand-in for push, SMS and email delivery that records each notification in the log"""
+
+    async def send(self, contact: Dict, event: Dict) -> Dict:
+        logger.warning(
+            f"SOS {event['id']} for {event.get('patient_id') or 'unknown patient'} "
+            f"-> {contact['channel']}:{contact['address']}: {event.get('description')}"
+        )
+        return {"status": "delivered", "at": datetime.now(timezone.utc).isoformat()}
+
+class SOSDispatcher:
+    """Outbox-backed SOS delivery on its own lane
+
+    Every SOS is written to the sos_events outbox before it is queued, and rows that
+    never finished are resent on startup. Dispatch runs on dedicated worker tasks and
+    reserved Supabase request slots, and routine work waits on `routine_turn()` while any SOS
+    is in flight, so SOS latency does not depend on how busy the rest of the server is.
+    """
+
+    def __init__(self, workers: int, notifiers: Optional[Dict] = None):
+        self.workers = workers
+        self.notifiers = notifiers or {}
+        self.default_notifier = LogNotifier()
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._order = itertools.count()
+        self._recent: Dict[Tuple[Optional[str], str], Tuple[str, float]] = {}
+        self._in_flight = 0
+        self._idle: Optional[asyncio.Event] = None
+        self.received = 0
+        self.duplicates = 0
+        self.delivered = 0
+        self.failed = 0
+        self.last_latency_ms = 0.0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def _db(self, fn, *args):
+        """Make a Supabase call through the request slots reserved for SOS"""
+        with priority_requests():
+            return await fn(*args)
+
+    async def start(self):
+        """Start the dispatch workers and resend anything left undelivered in the outbox"""
+        if self.running:
+            return
+        self._queue = asyncio.PriorityQueue()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+        since = datetime.now(timezone.utc) - timedelta(hours=sos_config.recovery_hours)
+        result = await self._db(get_undelivered_sos_events, since.isoformat())
+        for event in result.get("events", []):
+            event["deliveries"] = event.get("deliveries") or {}
+            self._enqueue(event)
+        if result.get("events"):
+            logger.warning(f"Resending {len(result['events'])} undelivered SOS events")
+        logger.info(f"SOS dispatcher started with {self.workers} workers")
+
+    async def stop(self, timeout: float = 10.0):
+        """Give queued SOS events a chance to go out, then stop the workers"""
+        if not self.running:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Stopping with {self._queue.qsize()} SOS events undelivered; they stay in the outbox")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info("SOS dispatcher stopped")
+
+    async def routine_turn(self):
+        """Wait until no SOS is in flight; routine ingestion and report work call this first"""
+        if self._idle is not None:
+            await self._idle.wait()
+
+    async def submit(self, patient_id: Optional[str], sos_type: str, timestamp: str,
+                     description: str) -> Dict:
+        """Record an SOS in the outbox and queue it for dispatch, merging repeats within the dedup window"""
+        now = time.monotonic()
+        self._recent = {key: value for key, value in self._recent.items() if value[1] > now}
+        previous = self._recent.get((patient_id, sos_type))
+        if previous is not None:
+            self.duplicates += 1
+            return {"id": previous[0], "type": sos_type, "timestamp": timestamp,
+                    "description": description, "status": "duplicate"}
+
+        event = {
+            "id": str(uuid.uuid4()),
+            "patient_id": patient_id,
+            "type": sos_type,
+            "timestamp": timestamp,
+            "description": description,
+            "status": "pending",
+            "attempts": 0,
+            "deliveries": {},
+            "created_at": datetime.now(timezone.utc).isoformat()
+        }
+        self._recent[(patient_id, sos_type)] = (event["id"], now + sos_config.dedup_seconds)
+        self.received += 1
+
+        if not self.running:
+            await self._db(create_sos_event, dict(event))
+            await self._dispatch(event)
+            return event
+
+        self._begin()
+        result = await self._db(create_sos_event, dict(event))
+        if "error" in result:
+            # Better delivered without a record than recorded and late
+            logger.error(f"SOS {event['id']} not written to the outbox; dispatching from memory")
+        self._enqueue(event, counted=True)
+        return event
+
+    def _begin(self):
+        self._in_flight += 1
+        self._idle.clear()
+
+    def _finish(self):
+        self._in_flight -= 1
+        if self._in_flight == 0:
+            self._idle.set()
+
+    def _enqueue(self, event: Dict, counted: bool = False):
+        if not counted:
+            self._begin()
+        self._queue.put_nowait((PRIORITIES.get(event["type"], 1), next(self._order), event))
+
+    async def _worker(self):
+        while True:
+            item = await self._queue.get()
+            event = item[2]
+            try:
+                delivered = await self._dispatch(event)
+            except Exception as e:
+                logger.error(f"SOS {event['id']} dispatch failed: {e}")
+                delivered = False
+            finally:
+                self._queue.task_done()
+
+            if delivered or event["attempts"] >= sos_config.max_attempts:
+                self._finish()
+            else:
+                # Retry undelivered contacts after a backoff without holding a worker
+                asyncio.get_running_loop().call_later(
+                    backoff_delay(event["attempts"]), self._queue.put_nowait,
+                    (item[0], next(self._order), event)
+                )
+
+    async def _dispatch(self, event: Dict) -> bool:
+        """Notify every contact not yet reached, concurrently, and record the outcome"""
+        started = time.monotonic()
+        event["attempts"] += 1
+        result = await self._db(get_caregiver_contacts, event.get("patient_id"))
+        lookup_failed = "error" in result
+        if lookup_failed:
+            # On-call still hears about it, but the event stays undelivered until caregivers are reached
+            logger.error(f"SOS {event['id']} contact lookup failed: {result['error']}")
+        contacts = result.get("contacts") or [ON_CALL_CONTACT]
+
+        deliveries = event["deliveries"]
+        pending = [
+            contact for contact in contacts
+            if deliveries.get(self._contact_key(contact), {}).get("status") != "delivered"
+        ]
+        outcomes = await asyncio.gather(*(self._deliver(contact, event) for contact in pending))
+        for contact, outcome in zip(pending, outcomes):
+            deliveries[self._contact_key(contact)] = outcome
+
+        delivered = sum(1 for outcome in deliveries.values() if outcome.get("status") == "delivered")
+        if delivered == len(deliveries) and not lookup_failed:
+            event["status"] = "delivered"
+        elif event["attempts"] < sos_config.max_attempts:
+            event["status"] = "dispatching"
+        else:
+            event["status"] = "partial" if delivered else "failed"
+
+        self.last_latency_ms = round((time.monotonic() - started) * 1000, 2)
+        if event["status"] == "delivered":
+            self.delivered += 1
+        elif event["status"] in ("partial", "failed"):
+            self.failed += 1
+            logger.error(f"SOS {event['id']} {event['status']} after {event['attempts']} attempts")
+
+        await self._db(update_sos_event, event["id"], {
+            "status": event["status"],
+            "attempts": event["attempts"],
+            "deliveries": deliveries,
+            "dispatched_at": datetime.now(timezone.utc).isoformat()
+        })
+        return event["status"] == "delivered"
+
+    async def _deliver(self, contact: Dict, event: Dict) -> Dict:
+        notifier = self.notifiers.get(contact["channel"], self.default_notifier)
+        try:
+            return await asyncio.wait_for(notifier.send(contact, event), timeout=sos_config.delivery_timeout)
+        except Exception as e:
+            logger.warning(f"SOS {event['id']} to {contact['channel']}:{contact['address']} failed: {e}")
+            return {"status": "failed", "error": str(e) or type(e).__name__}
+
+    def _contact_key(self, contact: Dict) -> str:
+        return f"{contact['channel']}:{contact['address']}"
+
+    async def get_history(self, patient_id: str, limit: int = 50) -> Dict:
+        """Get a patient's SOS events from the outbox"""
+        return await self._db(get_sos_history, patient_id, limit)
+
+    def get_stats(self) -> Dict:
+        """Get queue depth and delivery counters"""
+        return {
+            "running": self.running,
+            "in_flight": self._in_flight,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "received": self.received,
+            "duplicates": self.duplicates,
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "last_latency_ms": self.last_latency_ms
+        }
+
+# Create a global instance
+sos_dispatcher = SOSDispatcher(workers=sos_config.workers)
@@ -1,21 +1,94 @@
-from supabase import create_client, Client
-from typing import Dict, List, Optional
+import asyncio
+import contextvars
+import httpx
+from contextlib import contextmanager
+from postgrest import AsyncPostgrestClient
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
 from datetime import datetime
 import logging
-from config import supabase_config
+from config import supabase_config, sos_config
+from services.cache import get_cached_latest, cache_latest
+from services.resilience import get_breaker, call_async
 
 logger = logging.getLogger(__name__)
 
+# Natural keys used to upsert ingested Nightscout data idempotently
+GLUCOSE_READING_KEY = "patient_id,timestamp"
+TREATMENT_KEY = "patient_id,nightscout_id"
+DEVICE_STATUS_KEY = "patient_id,last_communication"
+ALERT_KEY = "id"
+
+# Sensor time of each ingested table; rows without one are skipped rather than stored as NULL,
+# which the natural keys cannot deduplicate and which would sort as the newest row
+SENSOR_TIME_COLUMNS = {
+    "glucose_readings": "timestamp",
+    "treatments": "timestamp",
+    "device_status": "last_communication"
+}
+
+# Columns returned for glucose history by default, and the ones a caller may add
+HISTORY_COLUMNS = ("timestamp", "glucose", "trend", "status")
+HISTORY_EXTRA_FIELDS = ("raw", "filtered", "noise", "created_at")
+# Columns of the latest reading, all covered by idx_glucose_readings_patient_timestamp
+LATEST_COLUMNS = HISTORY_COLUMNS + ("raw", "filtered", "noise")
+
+# Set while running SOS work so its requests use the reserved slots
+_priority = contextvars.ContextVar("supabase_priority", default=False)
+
+def quote_filter_value(value: str) -> str:
+    """Quote a value for a PostgREST list or logic filter, so commas, parentheses and quotes stay literal"""
+    escaped = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{escaped}"'
+
+def is_supabase_failure(error: Exception) -> bool:
+    """Whether an error means Supabase itself is unreachable, as opposed to a rejected request"""
+    return isinstance(error, httpx.TransportError)
+
+@contextmanager
+def priority_requests() -> Iterator[None]:
+    """Send Supabase requests made inside this block through the slots reserved for SOS"""
+    token = _priority.set(True)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+class PooledPostgrestClient(AsyncPostgrestClient):
+    """Async PostgREST client on a shared HTTP/2 keep-alive pool with request timeouts"""
+
+    def create_session(self, base_url: str, headers: Dict[str, str], timeout, verify: bool = True) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            base_url=base_url,
+            headers=headers,
+            timeout=httpx.Timeout(supabase_config.timeout, connect=supabase_config.connect_timeout),
+            limits=httpx.Limits(
+                max_connections=supabase_config.max_concurrency + sos_config.db_slots,
+                max_keepalive_connections=supabase_config.max_keepalive_connections,
+                keepalive_expiry=supabase_config.keepalive_expiry
+            ),
+            verify=verify,
+            http2=True,
+            follow_redirects=True
+        )
+
 class SupabaseService:
     def __init__(self):
-        self.client: Optional[Client] = None
+        self.client: Optional[PooledPostgrestClient] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._priority_slots: Optional[asyncio.Semaphore] = None
         self._initialize_client()
     
     def _initialize_client(self):
         """Initialize Supabase client"""
         if supabase_config.is_configured():
             try:
-                self.client = create_client(supabase_config.url, supabase_config.key)
+                self.client = PooledPostgrestClient(
+                    f"{supabase_config.url.rstrip('/')}/rest/v1",
+                    headers={
+                        "apikey": supabase_config.key,
+                        "Authorization": f"Bearer {supabase_config.key}"
+                    }
+                )
                 logger.info("Supabase client initialized successfully")
             except Exception as e:
                 logger.error(f"Failed to initialize Supabase client: {e}")
@@ -24,7 +97,27 @@ class SupabaseService:
             logger.warning("Supabase not configured - data will not be persisted")
             self.client = None
     
-    def test_connection(self) -> Dict:
+    def _request_slots(self) -> asyncio.Semaphore:
+        """Get the slots for this request, creating them inside the running event loop on first use"""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(supabase_config.max_concurrency)
+            self._priority_slots = asyncio.Semaphore(sos_config.db_slots)
+        return self._priority_slots if _priority.get() else self._slots
+    
+    async def _execute(self, query):
+        """Execute a PostgREST query within the concurrency limit and through the Supabase circuit breaker"""
+        async with self._request_slots():
+            return await call_async(get_breaker("supabase"), query.execute, is_supabase_failure)
+    
+    async def aclose(self):
+        """Close pooled PostgREST connections"""
+        if self.client is not None:
+            await self.client.aclose()
+            logger.info("Closed Supabase client")
+        self._slots = None
+        self._priority_slots = None
+    
+    async def test_connection(self) -> Dict:
         """Test the connection to Supabase"""
         if not self.client:
             return {
@@ -35,7 +128,8 @@ class SupabaseService:
         
         try:
             # Test connection by querying a simple table
-            response = self.client.table("glucose_readings").select("count", count="exact").limit(1).execute()
+            query = self.client.table("glucose_readings").select("count", count="exact").limit(1)
+            response = await self._execute(query)
             return {
                 "connected": True,
                 "status": "success",
@@ -48,25 +142,19 @@ class SupabaseService:
                 "error": f"Failed to connect to Supabase: {str(e)}"
             }
     
-    def store_glucose_reading(self, patient_id: str, reading_data: Dict) -> Dict:
+    async def store_glucose_reading(self, patient_id: str, reading_data: Dict) -> Dict:
         """Store glucose reading in Supabase"""
         if not self.client:
             return {"error": "Supabase not configured"}
         
         try:
-            data = {
-                "patient_id": patient_id,
-                "glucose": reading_data.get("glucose", 0),
-                "timestamp": reading_data.get("timestamp", ""),
-                "trend": reading_data.get("trend", "unknown"),
-                "status": reading_data.get("status", "unknown"),
-                "raw": reading_data.get("raw", 0),
-                "filtered": reading_data.get("filtered", 0),
-                "noise": reading_data.get("noise", 0),
-                "created_at": datetime.utcnow().isoformat()
-            }
+            data = self._glucose_row(patient_id, reading_data)
+            if data["timestamp"] is None:
+                return {"success": True, "skipped": True, "message": "Glucose reading has no sensor time"}
             
-            response = self.client.table("glucose_readings").insert(data).execute()
+            query = self.client.table("glucose_readings")\
+                .upsert(data, on_conflict=GLUCOSE_READING_KEY, ignore_duplicates=True)
+            response = await self._execute(query)
             
             if response.data:
                 return {
@@ -75,31 +163,30 @@ class SupabaseService:
                     "message": "Glucose reading stored successfully"
                 }
             else:
-                return {"error": "Failed to store glucose reading"}
+                # Conflicting rows are skipped, so an empty result means it was already stored
+                return {
+                    "success": True,
+                    "duplicate": True,
+                    "message": "Glucose reading already stored"
+                }
                 
         except Exception as e:
             logger.error(f"Failed to store glucose reading: {e}")
             return {"error": f"Failed to store glucose reading: {str(e)}"}
     
-    def store_device_status(self, patient_id: str, status_data: Dict) -> Dict:
+    async def store_device_status(self, patient_id: str, status_data: Dict) -> Dict:
         """Store device status in Supabase"""
         if not self.client:
             return {"error": "Supabase not configured"}
         
         try:
-            data = {
-                "patient_id": patient_id,
-                "device_connected": status_data.get("device_connected", False),
-                "battery_level": status_data.get("battery_level", 0),
-                "signal_strength": status_data.get("signal_strength", "unknown"),
-                "device_name": status_data.get("device_name", "unknown"),
-                "last_communication": status_data.get("last_communication", ""),
-                "pump_status": status_data.get("pump_status", {}),
-                "loop_status": status_data.get("loop_status", {}),
-                "created_at": datetime.utcnow().isoformat()
-            }
+            data = self._device_status_row(patient_id, status_data)
+            if data["last_communication"] is None:
+                return {"success": True, "skipped": True, "message": "Device status has no communication time"}
             
-            response = self.client.table("device_status").insert(data).execute()
+            query = self.client.table("device_status")\
+                .upsert(data, on_conflict=DEVICE_STATUS_KEY, ignore_duplicates=True)
+            response = await self._execute(query)
             
             if response.data:
                 return {
@@ -108,31 +195,30 @@ class SupabaseService:
                     "message": "Device status stored successfully"
                 }
             else:
-                return {"error": "Failed to store device status"}
+                # Conflicting rows are skipped, so an empty result means it was already stored
+                return {
+                    "success": True,
+                    "duplicate": True,
+                    "message": "Device status already stored"
+                }
                 
         except Exception as e:
             logger.error(f"Failed to store device status: {e}")
             return {"error": f"Failed to store device status: {str(e)}"}
     
-    def store_treatment(self, patient_id: str, treatment_data: Dict) -> Dict:
+    async def store_treatment(self, patient_id: str, treatment_data: Dict) -> Dict:
         """Store treatment in Supabase"""
         if not self.client:
             return {"error": "Supabase not configured"}
         
         try:
-            data = {
-                "patient_id": patient_id,
-                "treatment_type": treatment_data.get("eventType", "unknown"),
-                "timestamp": treatment_data.get("created_at", ""),
-                "insulin": treatment_data.get("insulin", 0),
-                "carbs": treatment_data.get("carbs", 0),
-                "notes": treatment_data.get("notes", ""),
-                "entered_by": treatment_data.get("enteredBy", ""),
-                "raw_data": treatment_data,
-                "created_at": datetime.utcnow().isoformat()
-            }
+            data = self._treatment_row(patient_id, treatment_data)
+            if data["timestamp"] is None:
+                return {"success": True, "skipped": True, "message": "Treatment has no sensor time"}
             
-            response = self.client.table("treatments").insert(data).execute()
+            query = self.client.table("treatments")\
+                .upsert(data, on_conflict=TREATMENT_KEY, ignore_duplicates=True)
+            response = await self._execute(query)
             
             if response.data:
                 return {
@@ -141,54 +227,261 @@ class SupabaseService:
                     "message": "Treatment stored successfully"
                 }
             else:
-                return {"error": "Failed to store treatment"}
+                # Conflicting rows are skipped, so an empty result means it was already stored
+                return {
+                    "success": True,
+                    "duplicate": True,
+                    "message": "Treatment already stored"
+                }
                 
         except Exception as e:
             logger.error(f"Failed to store treatment: {e}")
             return {"error": f"Failed to store treatment: {str(e)}"}
     
-    def get_glucose_history(self, patient_id: str, hours: int = 24) -> Dict:
-        """Get glucose history from Supabase"""
+    async def store_glucose_readings(self, patient_id: str, readings: List[Dict],
+                               chunk_size: Optional[int] = None) -> Dict:
+        """Store a list of glucose readings in Supabase using chunked multi-row inserts"""
+        rows = [self._glucose_row(patient_id, reading) for reading in readings]
+        return await self._upsert_batch("glucose_readings", rows, GLUCOSE_READING_KEY, chunk_size, "glucose readings")
+    
+    async def store_treatments(self, patient_id: str, treatments: List[Dict],
+                         chunk_size: Optional[int] = None) -> Dict:
+        """Store a list of treatments in Supabase using chunked multi-row inserts"""
+        rows = [self._treatment_row(patient_id, treatment) for treatment in treatments]
+        return await self._upsert_batch("treatments", rows, TREATMENT_KEY, chunk_size, "treatments")
+    
+    async def store_batch(self, table: str, items: List[Tuple[str, Dict]]) -> Dict:
+        """Store (patient_id, data) pairs for any mix of patients into one table with chunked upserts"""
+        builders = {
+            "glucose_readings": (self._glucose_row, GLUCOSE_READING_KEY, "glucose readings"),
+            "treatments": (self._treatment_row, TREATMENT_KEY, "treatments"),
+            "device_status": (self._device_status_row, DEVICE_STATUS_KEY, "device statuses"),
+            "alerts": (self._alert_row, ALERT_KEY, "alerts")
+        }
+        build_row, on_conflict, label = builders[table]
+        rows = [build_row(patient_id, data) for patient_id, data in items]
+        return await self._upsert_batch(table, rows, on_conflict, None, label)
+    
+    async def _upsert_batch(self, table: str, rows: List[Dict], on_conflict: str,
+                      chunk_size: Optional[int], label: str) -> Dict:
+        """Upsert rows in chunks, skipping natural-key duplicates, and report a result for every row"""
+        if not self.client:
+            return {"error": "Supabase not configured"}
+        
+        chunk_size = chunk_size or supabase_config.batch_size
+        results: List[Optional[Dict]] = [None] * len(rows)
+        time_column = SENSOR_TIME_COLUMNS.get(table)
+        pending = []
+        for index, row in enumerate(rows):
+            if time_column and row[time_column] is None:
+                # Counted as handled so sync cursors can move past the row
+                results[index] = {"success": True, "skipped": True}
+            else:
+                pending.append(index)
+        
+        inserted_count = 0
+        for start in range(0, len(pending), chunk_size):
+            indexes = pending[start:start + chunk_size]
+            chunk = [rows[index] for index in indexes]
+            try:
+                query = self.client.table(table)\
+                    .upsert(chunk, on_conflict=on_conflict, ignore_duplicates=True)
+                response = await self._execute(query)
+                inserted = response.data or []
+                inserted_count += len(inserted)
+                if len(inserted) == len(chunk):
+                    chunk_results = [{"success": True, "id": row.get("id")} for row in inserted]
+                else:
+                    # Rows already stored are skipped and not returned, so ids cannot be matched up
+                    chunk_results = [{"success": True} for _ in chunk]
+            except Exception as e:
+                logger.error(f"Failed to store {label} batch of {len(chunk)}: {e}")
+                chunk_results = [{"error": f"Failed to store {label}: {str(e)}"} for _ in chunk]
+            for index, result in zip(indexes, chunk_results):
+                results[index] = result
+        
+        skipped_count = len(rows) - len(pending)
+        stored_count = sum(1 for result in results if result.get("success")) - skipped_count
+        return {
+            "success": stored_count + skipped_count == len(rows),
+            "stored": stored_count,
+            "inserted": inserted_count,
+            "duplicates": stored_count - inserted_count,
+            "skipped": skipped_count,
+            "failed": len(rows) - stored_count - skipped_count,
+            "results": results,
+            "message": f"Stored {stored_count}/{len(rows)} {label}"
+        }
+    
+    def _glucose_row(self, patient_id: str, reading_data: Dict) -> Dict:
+        """Build a glucose_readings row"""
+        return {
+            "patient_id": patient_id,
+            "glucose": reading_data.get("glucose", 0),
+            "timestamp": reading_data.get("timestamp") or None,
+            "trend": reading_data.get("trend", "unknown"),
+            "status": reading_data.get("status", "unknown"),
+            "raw": reading_data.get("raw", 0),
+            "filtered": reading_data.get("filtered", 0),
+            "noise": reading_data.get("noise", 0),
+            "created_at": datetime.utcnow().isoformat()
+        }
+    
+    def _device_status_row(self, patient_id: str, status_data: Dict) -> Dict:
+        """Build a device_status row"""
+        return {
+            "patient_id": patient_id,
+            "device_connected": status_data.get("device_connected", False),
+            "battery_level": status_data.get("battery_level", 0),
+            "signal_strength": status_data.get("signal_strength", "unknown"),
+            "device_name": status_data.get("device_name", "unknown"),
+            "last_communication": status_data.get("last_communication") or None,
+            "pump_status": status_data.get("pump_status", {}),
+            "loop_status": status_data.get("loop_status", {}),
+            "created_at": datetime.utcnow().isoformat()
+        }
+    
+    def _alert_row(self, patient_id: str, alert: Dict) -> Dict:
+        """Build an alerts row"""
+        return {
+            "id": alert["id"],
+            "patient_id": patient_id,
+            "alert_type": alert["type"],
+            "severity": alert["severity"],
+            "message": alert["message"],
+            "glucose": alert.get("glucose"),
+            "reading_timestamp": alert.get("timestamp"),
+            "acknowledged": alert.get("acknowledged", False),
+            "created_at": alert.get("created_at", datetime.utcnow().isoformat())
+        }
+    
+    def _treatment_row(self, patient_id: str, treatment_data: Dict) -> Dict:
+        """Build a treatments row"""
+        return {
+            "patient_id": patient_id,
+            "treatment_type": treatment_data.get("eventType", "unknown"),
+            "timestamp": treatment_data.get("created_at") or None,
+            "insulin": treatment_data.get("insulin", 0),
+            "carbs": treatment_data.get("carbs", 0),
+            "notes": treatment_data.get("notes", ""),
+            "entered_by": treatment_data.get("enteredBy", ""),
+            "nightscout_id": treatment_data.get("_id"),
+            "raw_data": treatment_data,
+            "created_at": datetime.utcnow().isoformat()
+        }
+    
+    async def get_glucose_history(self, patient_id: str, hours: int = 24, limit: Optional[int] = None,
+                                  before: Optional[str] = None, fields: Sequence[str] = ()) -> Dict:
+        """Get glucose history from Supabase, newest first, reading keyset pages on the sensor timestamp
+        
+        Only the default reading columns plus any of `fields` are selected. With `limit`, at
+        most that many readings before the `before` cursor are returned together with
+        `next_before`, the cursor for the following page; without it the whole window is read.
+        """
         if not self.client:
             return {"error": "Supabase not configured"}
         
         try:
-            # Calculate time range
             from datetime import timedelta
             end_time = datetime.utcnow()
             start_time = end_time - timedelta(hours=hours)
+            columns = ", ".join(HISTORY_COLUMNS + tuple(field for field in HISTORY_EXTRA_FIELDS if field in fields))
             
-            response = self.client.table("glucose_readings")\
-                .select("*")\
-                .eq("patient_id", patient_id)\
-                .gte("created_at", start_time.isoformat())\
-                .lte("created_at", end_time.isoformat())\
-                .order("created_at", desc=True)\
-                .execute()
+            readings = []
+            cursor = before
+            while True:
+                page_size = supabase_config.page_size
+                if limit is not None:
+                    page_size = min(page_size, limit - len(readings))
+                query = self.client.table("glucose_readings")\
+                    .select(columns)\
+                    .eq("patient_id", patient_id)\
+                    .gte("timestamp", start_time.isoformat())
+                if cursor is None:
+                    query = query.lte("timestamp", end_time.isoformat())
+                else:
+                    query = query.lt("timestamp", cursor)
+                query = query.order("timestamp", desc=True).limit(page_size)
+                rows = (await self._execute(query)).data or []
+                
+                readings.extend(rows)
+                if len(rows) < page_size:
+                    # The window is exhausted
+                    cursor = None
+                    break
+                cursor = rows[-1]["timestamp"]
+                if limit is not None and len(readings) >= limit:
+                    break
             
             return {
                 "patient_id": patient_id,
-                "readings": response.data,
+                "readings": readings,
                 "period_hours": hours,
-                "total_readings": len(response.data)
+                "total_readings": len(readings),
+                "next_before": cursor
             }
                 
         except Exception as e:
             logger.error(f"Failed to get glucose history: {e}")
             return {"error": f"Failed to get glucose history: {str(e)}"}
     
-    def get_latest_glucose(self, patient_id: str) -> Dict:
+    async def get_glucose_series(self, patient_id: str, days: int) -> Dict:
+        """Get sensor timestamps and glucose values for the last `days`, oldest first, as parallel lists"""
+        if not self.client:
+            return {"error": "Supabase not configured"}
+        
+        try:
+            from datetime import timedelta
+            end_time = datetime.utcnow()
+            start_time = end_time - timedelta(days=days)
+            
+            timestamps, glucose = [], []
+            last_timestamp = None
+            # Keyset paging on the sensor timestamp, which is unique per patient
+            while True:
+                query = self.client.table("glucose_readings")\
+                    .select("timestamp, glucose")\
+                    .eq("patient_id", patient_id)\
+                    .lte("timestamp", end_time.isoformat())
+                if last_timestamp is None:
+                    query = query.gte("timestamp", start_time.isoformat())
+                else:
+                    query = query.gt("timestamp", last_timestamp)
+                query = query.order("timestamp").limit(supabase_config.page_size)
+                rows = (await self._execute(query)).data or []
+                
+                for row in rows:
+                    timestamps.append(row["timestamp"])
+                    glucose.append(row["glucose"])
+                if len(rows) < supabase_config.page_size:
+                    break
+                last_timestamp = rows[-1]["timestamp"]
+            
+            return {
+                "patient_id": patient_id,
+                "period_days": days,
+                "timestamps": timestamps,
+                "glucose": glucose
+            }
+                
+        except Exception as e:
+            logger.error(f"Failed to get glucose series: {e}")
+            return {"error": f"Failed to get glucose series: {str(e)}"}
+    
+    async def get_latest_glucose(self, patient_id: str) -> Dict:
         """Get latest glucose reading from Supabase"""
         if not self.client:
             return {"error": "Supabase not configured"}
         
         try:
-            response = self.client.table("glucose_readings")\
-                .select("*")\
+            # Newest by sensor time, not insert time, so backfilled rows cannot shadow it
+            query = self.client.table("glucose_readings")\
+                .select(", ".join(LATEST_COLUMNS))\
                 .eq("patient_id", patient_id)\
-                .order("created_at", desc=True)\
-                .limit(1)\
-                .execute()
+                .not_.is_("timestamp", "null")\
+                .order("timestamp", desc=True)\
+                .limit(1)
+            response = await self._execute(query)
             
             if response.data:
                 reading = response.data[0]
@@ -212,29 +505,377 @@ class SupabaseService:
             logger.error(f"Failed to get latest glucose: {e}")
             return {"error": f"Failed to get latest glucose: {str(e)}"}
 
+    async def get_latest_glucose_many(self, patient_ids: List[str]) -> Dict:
+        """Get the latest glucose reading for each of several patients in one query"""
+        if not self.client:
+            return {"error": "Supabase not configured"}
+        
+        try:
+            query = self.client.table("latest_glucose_readings")\
+                .select("*")\
+                .filter("patient_id", "in", f"({','.join(map(quote_filter_value, patient_ids))})")
+            response = await self._execute(query)
+            return {"readings": {row.pop("patient_id"): row for row in response.data}}
+                
+        except Exception as e:
+            logger.error(f"Failed to get latest glucose for patients: {e}")
+            return {"error": f"Failed to get latest glucose for patients: {str(e)}"}
+    
+    async def get_caregiver_patients(self, caregiver_id: str) -> Dict:
+        """Get the patients a caregiver is assigned to through their contacts"""
+        if not self.client:
+            return {"error": "Supabase not configured"}
+        
+        try:
+            query = self.client.table("caregiver_contacts")\
+                .select("patient_id")\
+                .eq("caregiver_id", caregiver_id)\
+                .eq("active", True)\
+                .not_.is_("patient_id", "null")
+            response = await self._execute(query)
+            return {"patient_ids": sorted({row["patient_id"] for row in response.data})}
+                
+        except Exception as e:
+            logger.error(f"Failed to get caregiver patients: {e}")
+            return {"error": f"Failed to get caregiver patients: {str(e)}"}
+
+    async def get_nightscout_config(self, user_id: str) -> Dict:
+        """Get the Nightscout endpoint and credentials for one patient"""
+        if not self.client:
+            return {"error": "Supabase not configured"}
+        
+        try:
+            query = self.client.table("user_nightscout_config")\
+                .select("user_id, nightscout_url, api_secret")\
+                .eq("user_id", user_id)\
+                .limit(1)
+            response = await self._execute(query)
+            
+            if response.data:
+                return {"success": True, **response.data[0]}
+            else:
+                return {"success": False, "error": "User configuration not found"}
+                
+        except Exception as e:
+            logger.error(f"Failed to get Nightscout config for {user_id}: {e}")
+            return {"error": f"Failed to get Nightscout config: {str(e)}"}
+    
+    async def get_active_nightscout_configs(self) -> Dict:
+        """Get Nightscout endpoints for every active patient"""
+        if not self.client:
+            return {"error": "Supabase not configured"}
+        
+        try:
+            query = self.client.table("user_nightscout_config")\
+                .select("user_id, nightscout_url, api_secret")\
+                .eq("status", "active")
+            response = await self._execute(query)
+            
+            return {
+                "configs": response.data,
+                "total": len(response.data)
+            }
+                
+        except Exception as e:
+            logger.error(f"Failed to get active Nightscout configs: {e}")
+            return {"error": f"Failed to get active Nightscout configs: {str(e)}"}
+    
+    async def get_sync_cursor(self, patient_id: str, data_type: str) -> Dict:
+        """Get the Nightscout sync cursor for a patient and data type"""
+        if not self.client:
+            return {"error": "Supabase not configured"}
+        
+        try:
+            query = self.client.table("data_sync_status")\
+                .select("last_entry_date, last_entry_id, last_sync_at")\
+                .eq("patient_id", patient_id)\
+                .eq("data_type", data_type)\
+                .limit(1)
+            response = await self._execute(query)
+            
+            row = response.data[0] if response.data else {}
+            return {
+                "patient_id": patient_id,
+                "data_type": data_type,
+                "last_entry_date": row.get("last_entry_date") or 0,
+                "last_entry_id": row.get("last_entry_id"),
+                "last_sync_at": row.get("last_sync_at")
+            }
+                
+        except Exception as e:
+            logger.error(f"Failed to get sync cursor: {e}")
+            return {"error": f"Failed to get sync cursor: {str(e)}"}
+    
+    async def update_sync_cursor(self, patient_id: str, data_type: str, last_entry_date: int,
+                           last_entry_id: Optional[str], records_synced: int) -> Dict:
+        """Advance the Nightscout sync cursor for a patient and data type"""
+        if not self.client:
+            return {"error": "Supabase not configured"}
+        
+        try:
+            data = {
+                "patient_id": patient_id,
+                "data_type": data_type,
+                "last_entry_date": last_entry_date,
+                "last_entry_id": last_entry_id,
+                "records_synced": records_synced,
+                "sync_status": "success",
+                "last_sync_at": datetime.utcnow().isoformat()
+            }
+            
+            query = self.client.table("data_sync_status")\
+                .upsert(data, on_conflict="patient_id,data_type")
+            response = await self._execute(query)
+            
+            if response.data:
+                return {
+                    "success": True,
+                    "message": "Sync cursor updated successfully"
+                }
+            else:
+                return {"error": "Failed to update sync cursor"}
+                
+        except Exception as e:
+            logger.error(f"Failed to update sync cursor: {e}")
+            return {"error": f"Failed to update sync cursor: {str(e)}"}
+    
+    async def get_recent_alerts(self, patient_id: Optional[str], limit: int) -> Dict:
+        """Get the newest alerts, for one patient or for everyone"""
+        if not self.client:
+            return {"error": "Supabase not configured"}
+        
+        try:
+            query = self.client.table("alerts").select("*")
+            if patient_id is not None:
+                query = query.eq("patient_id", patient_id)
+            query = query.order("created_at", desc=True).limit(limit)
+            response = await self._execute(query)
+            
+            return {
+                "alerts": [
+                    {
+                        "id": row["id"],
+                        "patient_id": row["patient_id"],
+                        "type": row["alert_type"],
+                        "severity": row["severity"],
+                        "message": row.get("message", ""),
+                        "glucose": row.get("glucose"),
+                        "timestamp": row.get("reading_timestamp"),
+                        "created_at": row.get("created_at"),
+                        "acknowledged": row.get("acknowledged", False)
+                    }
+                    for row in response.data
+                ]
+            }
+                
+        except Exception as e:
+            logger.error(f"Failed to get alerts: {e}")
+            return {"error": f"Failed to get alerts: {str(e)}"}
+    
+    async def acknowledge_alert(self, alert_id: str) -> Dict:
+        """Mark a stored alert as acknowledged"""
+        if not self.client:
+            return {"error": "Supabase not configured"}
+        
+        try:
+            query = self.client.table("alerts")\
+                .update({"acknowledged": True, "acknowledged_at": datetime.utcnow().isoformat()})\
+                .eq("id", alert_id)
+            response = await self._execute(query)
+            
+            if response.data:
+                return {"success": True, "message": "Alert acknowledged"}
+            else:
+                return {"error": "Alert not found"}
+                
+        except Exception as e:
+            logger.error(f"Failed to acknowledge alert: {e}")
+            return {"error": f"Failed to acknowledge alert: {str(e)}"}
+    
+    async def create_sos_event(self, event: Dict) -> Dict:
+        """Write an SOS event to the outbox before it is dispatched"""
+        if not self.client:
+            return {"error": "Supabase not configured"}
+        
+        try:
+            query = self.client.table("sos_events").upsert(event, on_conflict="id", ignore_duplicates=True)
+            await self._execute(query)
+            return {"success": True, "id": event["id"]}
+                
+        except Exception as e:
+            logger.error(f"Failed to store SOS event: {e}")
+            return {"error": f"Failed to store SOS event: {str(e)}"}
+    
+    async def update_sos_event(self, sos_id: str, fields: Dict) -> Dict:
+        """Record dispatch progress for an SOS event"""
+        if not self.client:
+            return {"error": "Supabase not configured"}
+        
+        try:
+            query = self.client.table("sos_events").update(fields).eq("id", sos_id)
+            await self._execute(query)
+            return {"success": True}
+                
+        except Exception as e:
+            logger.error(f"Failed to update SOS event: {e}")
+            return {"error": f"Failed to update SOS event: {str(e)}"}
+    
+    async def get_undelivered_sos_events(self, since: str) -> Dict:
+        """Get outbox SOS events created after `since` that never finished dispatching"""
+        if not self.client:
+            return {"error": "Supabase not configured"}
+        
+        try:
+            query = self.client.table("sos_events")\
+                .select("*")\
+                .in_("status", ["pending", "dispatching"])\
+                .gte("created_at", since)\
+                .order("created_at")
+            response = await self._execute(query)
+            return {"events": response.data}
+                
+        except Exception as e:
+            logger.error(f"Failed to get undelivered SOS events: {e}")
+            return {"error": f"Failed to get undelivered SOS events: {str(e)}"}
+    
+    async def get_sos_history(self, patient_id: str, limit: int) -> Dict:
+        """Get a patient's SOS events, newest first"""
+        if not self.client:
+            return {"error": "Supabase not configured"}
+        
+        try:
+            query = self.client.table("sos_events")\
+                .select("id, type, timestamp, description, status, deliveries, created_at, dispatched_at")\
+                .eq("patient_id", patient_id)\
+                .order("created_at", desc=True)\
+                .limit(limit)
+            response = await self._execute(query)
+            return {"patient_id": patient_id, "sos_history": response.data}
+                
+        except Exception as e:
+            logger.error(f"Failed to get SOS history: {e}")
+            return {"error": f"Failed to get SOS history: {str(e)}"}
+    
+    async def get_caregiver_contacts(self, patient_id: Optional[str]) -> Dict:
+        """Get the active contacts to notify for a patient, including camp-wide on-call contacts"""
+        if not self.client:
+            return {"error": "Supabase not configured"}
+        
+        try:
+            def contacts_query():
+                return self.client.table("caregiver_contacts")\
+                    .select("caregiver_id, channel, address")\
+                    .eq("active", True)
+            
+            # Camp-wide on-call contacts and the patient's own, read side by side and merged
+            queries = [contacts_query().is_("patient_id", "null")]
+            if patient_id is not None:
+                queries.append(contacts_query().eq("patient_id", patient_id))
+            responses = await asyncio.gather(*(self._execute(query) for query in queries))
+            return {"contacts": [contact for response in responses for contact in response.data or []]}
+                
+        except Exception as e:
+            logger.error(f"Failed to get caregiver contacts: {e}")
+            return {"error": f"Failed to get caregiver contacts: {str(e)}"}
+
 # Create a global instance
 supabase_service = SupabaseService()
 
-def test_supabase_connection() -> Dict:
+async def test_supabase_connection() -> Dict:
     """Test connection to Supabase"""
-    return supabase_service.test_connection()
+    return await supabase_service.test_connection()
 
-def store_glucose_reading(patient_id: str, reading_data: Dict) -> Dict:
+async def store_glucose_reading(patient_id: str, reading_data: Dict) -> Dict:
     """Store glucose reading in Supabase"""
-    return supabase_service.store_glucose_reading(patient_id, reading_data)
+    return await supabase_service.store_glucose_reading(patient_id, reading_data)
 
-def store_device_status(patient_id: str, status_data: Dict) -> Dict:
+async def store_device_status(patient_id: str, status_data: Dict) -> Dict:
     """Store device status in Supabase"""
-    return supabase_service.store_device_status(patient_id, status_data)
+    return await supabase_service.store_device_status(patient_id, status_data)
 
-def store_treatment(patient_id: str, treatment_data: Dict) -> Dict:
+async def store_treatment(patient_id: str, treatment_data: Dict) -> Dict:
     """Store treatment in Supabase"""
-    return supabase_service.store_treatment(patient_id, treatment_data)
+    return await supabase_service.store_treatment(patient_id, treatment_data)
+
+async def store_glucose_readings(patient_id: str, readings: List[Dict]) -> Dict:
+    """Store a batch of glucose readings in Supabase"""
+    return await supabase_service.store_glucose_readings(patient_id, readings)
+
+async def store_treatments(patient_id: str, treatments: List[Dict]) -> Dict:
+    """Store a batch of treatments in Supabase"""
+    return await supabase_service.store_treatments(patient_id, treatments)
+
+async def store_batch(table: str, items: List[Tuple[str, Dict]]) -> Dict:
+    """Store rows for several patients into one table in Supabase"""
+    return await supabase_service.store_batch(table, items)
+
+async def get_glucose_history_from_db(patient_id: str, hours: int = 24, limit: Optional[int] = None,
+                                      before: Optional[str] = None, fields: Sequence[str] = ()) -> Dict:
+    """Get glucose history from Supabase, a page at a time with `limit`"""
+    return await supabase_service.get_glucose_history(patient_id, hours, limit, before, fields)
+
+async def get_glucose_series(patient_id: str, days: int) -> Dict:
+    """Get a patient's stored glucose values as parallel lists"""
+    return await supabase_service.get_glucose_series(patient_id, days)
+
+async def get_latest_glucose_from_db(patient_id: str) -> Dict:
+    """Get latest glucose reading from Supabase, cached until the next reading is due"""
+    cached = get_cached_latest("db", patient_id)
+    if cached is not None:
+        return cached
+    result = await supabase_service.get_latest_glucose(patient_id)
+    cache_latest("db", patient_id, result)
+    return result 
+
+async def get_latest_glucose_many_from_db(patient_ids: List[str]) -> Dict:
+    """Get the latest glucose reading for several patients from Supabase in one query"""
+    return await supabase_service.get_latest_glucose_many(patient_ids)
+
+async def get_caregiver_patients(caregiver_id: str) -> Dict:
+    """Get the patients a caregiver is assigned to"""
+    return await supabase_service.get_caregiver_patients(caregiver_id)
+
+async def get_nightscout_config(user_id: str) -> Dict:
+    """Get the Nightscout endpoint and credentials for one patient"""
+    return await supabase_service.get_nightscout_config(user_id)
+
+async def get_active_nightscout_configs() -> Dict:
+    """Get Nightscout endpoints for every active patient"""
+    return await supabase_service.get_active_nightscout_configs()
+
+async def get_sync_cursor(patient_id: str, data_type: str) -> Dict:
+    """Get the Nightscout sync cursor for a patient"""
+    return await supabase_service.get_sync_cursor(patient_id, data_type)
+
+async def update_sync_cursor(patient_id: str, data_type: str, last_entry_date: int,
+                       last_entry_id: Optional[str], records_synced: int) -> Dict:
+    """Advance the Nightscout sync cursor for a patient"""
+    return await supabase_service.update_sync_cursor(patient_id, data_type, last_entry_date, last_entry_id, records_synced)
+
+async def get_recent_alerts(patient_id: Optional[str], limit: int) -> Dict:
+    """Get the newest stored alerts"""
+    return await supabase_service.get_recent_alerts(patient_id, limit)
+
+async def acknowledge_alert(alert_id: str) -> Dict:
+    """Mark a stored alert as acknowledged"""
+    return await supabase_service.acknowledge_alert(alert_id)
+
+async def create_sos_event(event: Dict) -> Dict:
+    """Write an SOS event to the outbox"""
+    return await supabase_service.create_sos_event(event)
+
+async def update_sos_event(sos_id: str, fields: Dict) -> Dict:
+    """Record dispatch progress for an SOS event"""
+    return await supabase_service.update_sos_event(sos_id, fields)
+
+async def get_undelivered_sos_events(since: str) -> Dict:
+    """Get outbox SOS events that never finished dispatching"""
+    return await supabase_service.get_undelivered_sos_events(since)
 
-def get_glucose_history_from_db(patient_id: str, hours: int = 24) -> Dict:
-    """Get glucose history from Supabase"""
-    return supabase_service.get_glucose_history(patient_id, hours)
+async def get_sos_history(patient_id: str, limit: int) -> Dict:
+    """Get a patient's SOS events"""
+    return await supabase_service.get_sos_history(patient_id, limit)
 
-def get_latest_glucose_from_db(patient_id: str) -> Dict:
-    """Get latest glucose reading from Supabase"""
-    return supabase_service.get_latest_glucose(patient_id) 
\ No newline at end of file
+async def get_caregiver_contacts(patient_id: Optional[str]) -> Dict:
+    """Get the contacts to notify for a patient"""
+    return await supabase_service.get_caregiver_contacts(patient_id)
\ No newline at end of file
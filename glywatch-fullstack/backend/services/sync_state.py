@@ -0,0 +1,54 @@
+from typing import Dict, Optional, Tuple
+import logging
+from services.supabase_service import get_sync_cursor, update_sync_cursor
+from services.singleflight import upstream_flights
+
+logger = logging.getLogger(__name__)
+
+GLUCOSE_ENTRIES = "glucose"
+
+class SyncCursorStore:
+    """Per-patient Nightscout high-water marks, cached in process and persisted in data_sync_status"""
+
+    def __init__(self):
+        self._cursors: Dict[Tuple[str, str], Dict] = {}
+
+    async def get(self, patient_id: str, data_type: str) -> Dict:
+        """Get the cursor for a patient, loading it from Supabase on first use"""
+        key = (patient_id, data_type)
+        cursor = self._cursors.get(key)
+        if cursor is not None:
+            return cursor
+
+        result = await upstream_flights.do(
+            ("supabase", "sync_cursor", patient_id, data_type),
+            lambda: get_sync_cursor(patient_id, data_type)
+        )
+        cursor = {
+            "last_entry_date": result.get("last_entry_date", 0),
+            "last_entry_id": result.get("last_entry_id")
+        }
+        if "error" in result:
+            return cursor
+        # Another caller may have advanced the cursor while this one was loading
+        return self._cursors.setdefault(key, cursor)
+
+    async def advance(self, patient_id: str, data_type: str, last_entry_date: int,
+                      last_entry_id: Optional[str], records_synced: int) -> Dict:
+        """Move the cursor forward; never moves it backwards"""
+        key = (patient_id, data_type)
+        current = self._cursors.get(key)
+        if current is not None and current["last_entry_date"] >= last_entry_date:
+            return current
+
+        cursor = {"last_entry_date": last_entry_date, "last_entry_id": last_entry_id}
+        self._cursors[key] = cursor
+        result = await update_sync_cursor(
+            patient_id, data_type, last_entry_date, last_entry_id, records_synced
+        )
+        if "error" in result:
+            logger.warning(f"Sync cursor for {patient_id}/{data_type} not persisted: {result['error']}")
+        return cursor
+
+# Create a global instance
+sync_cursors = SyncCursorStore()
@@ -0,0 +1,172 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+import logging
+from config import supabase_config
+from services.supabase_service import store_batch
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+class _Submission:
+    """Rows handed in by one caller; resolved once every row has been flushed"""
+
+    def __init__(self, table: str, count: int, on_done: Optional[Callable[[Dict], Awaitable]]):
+        self.table = table
+        self.results: List[Optional[Dict]] = [None] * count
+        self.pending = count
+        self.on_done = on_done
+        self.future = asyncio.get_running_loop().create_future()
+
+    def storage_result(self) -> Dict:
+        skipped_count = sum(1 for result in self.results if result.get("skipped"))
+        stored_count = sum(1 for result in self.results if result.get("success")) - skipped_count
+        return {
+            "success": stored_count + skipped_count == len(self.results),
+            "stored": stored_count,
+            "skipped": skipped_count,
+            "failed": len(self.results) - stored_count - skipped_count,
+            "results": self.results,
+            "message": f"Stored {stored_count}/{len(self.results)} {self.table} rows"
+        }
+
+class WriteBehindQueue:
+    """Bounded in-process queue that batches Supabase writes by table off the request path
+
+    Producers block once `max_size` rows are waiting, so a slow database slows ingestion
+    down instead of growing memory. A background task flushes when `batch_size` rows are
+    queued or `flush_interval` seconds have passed, whichever comes first.
+    """
+
+    def __init__(self, max_size: int, batch_size: int, flush_interval: float):
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.flushes = 0
+        self.rows_written = 0
+        self.rows_failed = 0
+        self.last_flush_ms = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Start the background flusher in the running event loop"""
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Write-behind queue started (max {self.max_size} rows, batch {self.batch_size})")
+
+    async def stop(self):
+        """Flush everything still queued, then stop the flusher"""
+        if not self.running:
+            return
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+        logger.info("Write-behind queue stopped")
+
+    async def submit(self, table: str, patient_id: str, rows: List[Dict],
+                     on_done: Optional[Callable[[Dict], Awaitable]] = None) -> asyncio.Future:
+        """Queue rows for `table`; the returned future resolves to the storage result once they are flushed
+
+        `on_done` is awaited with the same result before the future resolves. Without a running
+        flusher the rows are written immediately.
+        """
+        submission = _Submission(table, len(rows), on_done)
+        if not rows:
+            await self._complete(submission)
+        elif not self.running:
+            result = await store_batch(table, [(patient_id, row) for row in rows])
+            submission.results = result.get("results") or [result] * len(rows)
+            await self._complete(submission)
+        else:
+            for index, row in enumerate(rows):
+                await self._queue.put((submission, index, patient_id, row))
+        return submission.future
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            items = []
+            item = await self._queue.get()
+            deadline = time.monotonic() + self.flush_interval
+            while item is not _STOP:
+                items.append(item)
+                if len(items) >= self.batch_size:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), max(0, deadline - time.monotonic()))
+                except asyncio.TimeoutError:
+                    break
+            if item is _STOP:
+                stopping = True
+            if items:
+                await self._flush(items)
+
+    async def _flush(self, items: List):
+        """Write one batch, one upsert per table, and settle the submissions it completes"""
+        started = time.monotonic()
+        by_table: Dict[str, List] = {}
+        for item in items:
+            by_table.setdefault(item[0].table, []).append(item)
+
+        for table, table_items in by_table.items():
+            try:
+                result = await store_batch(
+                    table, [(patient_id, row) for _, _, patient_id, row in table_items]
+                )
+            except Exception as e:
+                logger.error(f"Write-behind flush to {table} failed: {e}")
+                result = {"error": str(e)}
+            row_results = result.get("results") or [result] * len(table_items)
+
+            completed = []
+            for (submission, index, _, _), row_result in zip(table_items, row_results):
+                submission.results[index] = row_result
+                submission.pending -= 1
+                if row_result.get("success"):
+                    self.rows_written += 1
+                else:
+                    self.rows_failed += 1
+                if submission.pending == 0:
+                    completed.append(submission)
+            for submission in completed:
+                await self._complete(submission)
+
+        self.flushes += 1
+        self.last_flush_ms = round((time.monotonic() - started) * 1000, 2)
+
+    async def _complete(self, submission: _Submission):
+        result = submission.storage_result()
+        if submission.on_done is not None:
+            try:
+                await submission.on_done(result)
+            except Exception as e:
+                logger.error(f"Write-behind completion callback failed: {e}")
+        if not submission.future.done():
+            submission.future.set_result(result)
+
+    def get_stats(self) -> Dict:
+        """Get queue depth and flush counters"""
+        return {
+            "running": self.running,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "max_size": self.max_size,
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "rows_failed": self.rows_failed,
+            "last_flush_ms": self.last_flush_ms
+        }
+
+# Create a global instance
+write_queue = WriteBehindQueue(
+    max_size=supabase_config.write_queue_size,
+    batch_size=supabase_config.batch_size,
+    flush_interval=supabase_config.write_flush_interval
+)
@@ -49,7 +49,6 @@ def install_python_dependencies():
         "fastapi",
         "uvicorn",
         "requests",
-        "supabase",
         "postgrest"
     ]
     
@@ -20,10 +20,19 @@ CREATE TABLE IF NOT EXISTS glucose_readings (
 );
 
 -- Create index for faster queries
-CREATE INDEX IF NOT EXISTS idx_glucose_readings_patient_id ON glucose_readings(patient_id);
 CREATE INDEX IF NOT EXISTS idx_glucose_readings_created_at ON glucose_readings(created_at);
 CREATE INDEX IF NOT EXISTS idx_glucose_readings_timestamp ON glucose_readings(timestamp);
 
+-- Natural key: one reading per patient per sensor timestamp (used for idempotent upserts)
+-- Remove duplicates left by earlier non-idempotent ingestion before adding the key
+DELETE FROM glucose_readings a USING glucose_readings b
+    WHERE a.patient_id = b.patient_id AND a.timestamp = b.timestamp AND a.id > b.id;
+-- It also covers the reading columns, so latest and range reads by sensor time are index-only
+-- scans (existing databases: see migrations/001_sensor_time_indexes.sql)
+CREATE UNIQUE INDEX IF NOT EXISTS idx_glucose_readings_patient_timestamp
+    ON glucose_readings(patient_id, timestamp)
+    INCLUDE (glucose, trend, status, raw, filtered, noise);
+
 -- 2. Device Status Table
 CREATE TABLE IF NOT EXISTS device_status (
     id BIGSERIAL PRIMARY KEY,
@@ -40,9 +49,13 @@ CREATE TABLE IF NOT EXISTS device_status (
 );
 
 -- Create index for faster queries
-CREATE INDEX IF NOT EXISTS idx_device_status_patient_id ON device_status(patient_id);
 CREATE INDEX IF NOT EXISTS idx_device_status_created_at ON device_status(created_at);
 
+-- Natural key: one status per patient per device report time
+DELETE FROM device_status a USING device_status b
+    WHERE a.patient_id = b.patient_id AND a.last_communication = b.last_communication AND a.id > b.id;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_device_status_patient_communication ON device_status(patient_id, last_communication);
+
 -- 3. Treatments Table
 CREATE TABLE IF NOT EXISTS treatments (
     id BIGSERIAL PRIMARY KEY,
@@ -53,16 +66,24 @@ CREATE TABLE IF NOT EXISTS treatments (
     carbs INTEGER,
     notes TEXT,
     entered_by VARCHAR(255),
+    nightscout_id VARCHAR(64), -- Nightscout treatment `_id`
     raw_data JSONB,
     created_at TIMESTAMPTZ DEFAULT NOW(),
     updated_at TIMESTAMPTZ DEFAULT NOW()
 );
 
 -- Create index for faster queries
-CREATE INDEX IF NOT EXISTS idx_treatments_patient_id ON treatments(patient_id);
+CREATE INDEX IF NOT EXISTS idx_treatments_patient_timestamp_desc ON treatments(patient_id, timestamp DESC);
 CREATE INDEX IF NOT EXISTS idx_treatments_created_at ON treatments(created_at);
 CREATE INDEX IF NOT EXISTS idx_treatments_timestamp ON treatments(timestamp);
 
+-- Natural key: the Nightscout `_id` of each treatment
+ALTER TABLE treatments ADD COLUMN IF NOT EXISTS nightscout_id VARCHAR(64);
+UPDATE treatments SET nightscout_id = raw_data->>'_id' WHERE nightscout_id IS NULL;
+DELETE FROM treatments a USING treatments b
+    WHERE a.patient_id = b.patient_id AND a.nightscout_id = b.nightscout_id AND a.id > b.id;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_treatments_patient_nightscout_id ON treatments(patient_id, nightscout_id);
+
 -- 4. User Nightscout Configuration Table
 CREATE TABLE IF NOT EXISTS user_nightscout_config (
     id BIGSERIAL PRIMARY KEY,
@@ -104,13 +125,82 @@ CREATE TABLE IF NOT EXISTS data_sync_status (
     records_synced INTEGER DEFAULT 0,
     sync_status VARCHAR(50) DEFAULT 'success', -- 'success', 'error', 'partial'
     error_message TEXT,
+    last_entry_date BIGINT DEFAULT 0, -- Nightscout `date` (epoch ms) of the newest stored entry
+    last_entry_id VARCHAR(64), -- Nightscout `_id` of the newest stored entry
     created_at TIMESTAMPTZ DEFAULT NOW(),
     updated_at TIMESTAMPTZ DEFAULT NOW()
 );
 
+-- Sync cursor columns for tables created before incremental sync
+ALTER TABLE data_sync_status ADD COLUMN IF NOT EXISTS last_entry_date BIGINT DEFAULT 0;
+ALTER TABLE data_sync_status ADD COLUMN IF NOT EXISTS last_entry_id VARCHAR(64);
+
 -- Create index for sync status
 CREATE INDEX IF NOT EXISTS idx_data_sync_status_patient_id ON data_sync_status(patient_id);
 CREATE INDEX IF NOT EXISTS idx_data_sync_status_data_type ON data_sync_status(data_type);
+-- One cursor per patient and data type (required for upserts)
+CREATE UNIQUE INDEX IF NOT EXISTS idx_data_sync_status_patient_type ON data_sync_status(patient_id, data_type);
+
+-- 7. Alerts Table (raised by the alert engine as readings are ingested)
+CREATE TABLE IF NOT EXISTS alerts (
+    id UUID PRIMARY KEY, -- Assigned by the backend so queued writes stay idempotent
+    patient_id VARCHAR(255) NOT NULL,
+    alert_type VARCHAR(50) NOT NULL, -- 'low_glucose', 'high_glucose', 'falling_fast', 'rising_fast', 'predicted_low'
+    severity VARCHAR(20) NOT NULL, -- 'critical', 'warning', 'info'
+    message TEXT,
+    glucose INTEGER,
+    reading_timestamp TIMESTAMPTZ,
+    acknowledged BOOLEAN DEFAULT FALSE,
+    acknowledged_at TIMESTAMPTZ,
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- Create index for alerts
+CREATE INDEX IF NOT EXISTS idx_alerts_patient_created_at ON alerts(patient_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_alerts_created_at ON alerts(created_at DESC);
+
+-- 8. Caregiver Contacts Table (who is notified for a patient's SOS; NULL patient_id = camp-wide on-call)
+CREATE TABLE IF NOT EXISTS caregiver_contacts (
+    id BIGSERIAL PRIMARY KEY,
+    caregiver_id VARCHAR(255) NOT NULL,
+    patient_id VARCHAR(255),
+    channel VARCHAR(20) NOT NULL, -- 'push', 'sms', 'email'
+    address TEXT NOT NULL,
+    active BOOLEAN DEFAULT TRUE,
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- Create index for caregiver contacts
+CREATE INDEX IF NOT EXISTS idx_caregiver_contacts_patient_id ON caregiver_contacts(patient_id);
+CREATE INDEX IF NOT EXISTS idx_caregiver_contacts_caregiver_id ON caregiver_contacts(caregiver_id);
+
+-- 9. SOS Events Table (outbox: written before dispatch, updated as deliveries complete)
+CREATE TABLE IF NOT EXISTS sos_events (
+    id UUID PRIMARY KEY,
+    patient_id VARCHAR(255),
+    type VARCHAR(20) NOT NULL, -- 'manual' or 'automated'
+    timestamp TIMESTAMPTZ,
+    description TEXT,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending', -- 'pending', 'dispatching', 'delivered', 'partial', 'failed'
+    attempts INTEGER DEFAULT 0,
+    deliveries JSONB DEFAULT '{}',
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    dispatched_at TIMESTAMPTZ
+);
+
+-- Create index for SOS events
+CREATE INDEX IF NOT EXISTS idx_sos_events_patient_created_at ON sos_events(patient_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_sos_events_status ON sos_events(status);
+
+-- 10. Latest Glucose View (one row per patient: their newest reading by sensor time)
+-- DISTINCT ON walks idx_glucose_readings_patient_timestamp backwards, so a caregiver dashboard
+-- reads every child's latest value with one query filtered by patient_id IN (...)
+CREATE OR REPLACE VIEW latest_glucose_readings AS
+SELECT DISTINCT ON (patient_id)
+    patient_id, glucose, timestamp, trend, status, raw, filtered, noise
+FROM glucose_readings
+WHERE timestamp IS NOT NULL
+ORDER BY patient_id, timestamp DESC;
 
 -- Enable Row Level Security (RLS) - Optional
 -- Uncomment the following lines if you want to enable RLS
@@ -121,6 +211,9 @@ CREATE INDEX IF NOT EXISTS idx_data_sync_status_data_type ON data_sync_status(da
 -- ALTER TABLE user_nightscout_config ENABLE ROW LEVEL SECURITY;
 -- ALTER TABLE connection_logs ENABLE ROW LEVEL SECURITY;
 -- ALTER TABLE data_sync_status ENABLE ROW LEVEL SECURITY;
+-- ALTER TABLE alerts ENABLE ROW LEVEL SECURITY;
+-- ALTER TABLE caregiver_contacts ENABLE ROW LEVEL SECURITY;
+-- ALTER TABLE sos_events ENABLE ROW LEVEL SECURITY;
 
 -- Example RLS policies (customize based on your needs)
 -- CREATE POLICY "Users can view their own glucose readings" ON glucose_readings
@@ -6,10 +6,12 @@ Run this script to test your Nightscout configuration
 
 import os
 import sys
+import asyncio
+from services.http_client import close_http_clients
 from services.nightscout import test_nightscout_connection, get_latest_glucose, get_device_status
 from config import nightscout_config
 
-def test_connection():
+async def test_connection():
     """Test the Nightscout connection"""
     print("🔍 Testing Nightscout Connection...")
     print("=" * 50)
@@ -30,7 +32,7 @@ def test_connection():
         return False
     
     # Test connection
-    result = test_nightscout_connection()
+    result = await test_nightscout_connection()
     
     if result['connected']:
         print("✅ Connection Successful!")
@@ -40,7 +42,7 @@ def test_connection():
         
         # Test getting latest glucose
         print("🔬 Testing Glucose Data Retrieval...")
-        glucose_result = get_latest_glucose("test_patient")
+        glucose_result = await get_latest_glucose("test_patient")
         if 'error' not in glucose_result:
             print("✅ Glucose Data Retrieved Successfully!")
             print(f"   Glucose: {glucose_result.get('glucose', 'N/A')} mg/dL")
@@ -53,7 +55,7 @@ def test_connection():
         
         # Test device status
         print("📱 Testing Device Status...")
-        device_result = get_device_status("test_patient")
+        device_result = await get_device_status("test_patient")
         if 'error' not in device_result:
             print("✅ Device Status Retrieved Successfully!")
             print(f"   Device Connected: {device_result.get('device_connected', False)}")
@@ -74,13 +76,20 @@ def test_connection():
         print("   4. Ensure your Nightscout instance allows API access")
         return False
 
+async def run_connection_test():
+    """Run the connection test and release pooled connections"""
+    try:
+        return await test_connection()
+    finally:
+        await close_http_clients()
+
 def main():
     """Main function"""
     print("🌙 Nightscout Connection Test")
     print("=" * 50)
     print()
     
-    success = test_connection()
+    success = asyncio.run(run_connection_test())
     
     print()
     print("=" * 50)
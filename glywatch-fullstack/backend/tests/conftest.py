@@ -0,0 +1,57 @@
+"""
+Shared fixtures: Supabase and Nightscout answered in-process instead of over the network
+"""
+
+import json
+import httpx
+import pytest
+from postgrest import AsyncPostgrestClient
+from services.http_client import nightscout_http
+from services.resilience import get_breaker
+from services.supabase_service import supabase_service
+
+class FakeSupabase:
+    """Answers PostgREST requests from per-table handlers and records every request"""
+
+    def __init__(self):
+        self.handlers = {}
+        self.requests = []
+
+    def on(self, table: str, handler):
+        """Answer requests for `table` with handler(request) -> rows"""
+        self.handlers[table] = handler
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        table = request.url.path.rsplit("/", 1)[-1]
+        handler = self.handlers.get(table)
+        if handler is None:
+            return httpx.Response(404, json={"message": f"no handler for {table}"})
+        rows = handler(request)
+        if isinstance(rows, httpx.Response):
+            return rows
+        return httpx.Response(200, content=json.dumps(rows), headers={"content-type": "application/json"})
+
+class _FakeClient(AsyncPostgrestClient):
+    def __init__(self, fake: FakeSupabase):
+        self._fake = fake
+        super().__init__("http://supabase.test/rest/v1")
+
+    def create_session(self, base_url, headers, timeout, verify=True):
+        return httpx.AsyncClient(base_url=base_url, headers=headers, transport=httpx.MockTransport(self._fake))
+
+@pytest.fixture
+def fake_supabase(monkeypatch):
+    """Route the Supabase service through an in-process PostgREST stand-in"""
+    fake = FakeSupabase()
+    monkeypatch.setattr(supabase_service, "client", _FakeClient(fake))
+    get_breaker("supabase").record_success()
+    return fake
+
+@pytest.fixture
+def fake_nightscout(monkeypatch):
+    """Answer Nightscout requests from a handler(request) -> httpx.Response instead of the network"""
+    def install(handler):
+        monkeypatch.setattr(nightscout_http, "_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+        monkeypatch.setattr(nightscout_http, "_host_slots", {})
+    return install
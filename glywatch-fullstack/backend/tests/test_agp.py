@@ -0,0 +1,97 @@
+"""
+Tests for the incrementally maintained ambulatory glucose profile
+"""
+
+import asyncio
+import time
+from datetime import datetime, timezone
+import numpy as np
+import pytest
+from services.agp import AGPProfile, AGPStore, DAY_MS, BIN_MINUTES
+
+MINUTE_MS = 60 * 1000
+
+def iso(ms):
+    return datetime.fromtimestamp(ms / 1000, timezone.utc).isoformat()
+
+@pytest.fixture
+def stored(fake_supabase):
+    """An hour of stored readings ending ten minutes ago"""
+    now = int(time.time() * 1000)
+    timestamps = [now - (10 + 5 * index) * MINUTE_MS for index in range(12)][::-1]
+    fake_supabase.on("glucose_readings", lambda request: [
+        {"timestamp": iso(timestamp), "glucose": 120} for timestamp in timestamps
+    ])
+    return fake_supabase, timestamps
+
+def test_profile_is_built_once_then_served_from_memory(stored):
+    fake, timestamps = stored
+    store = AGPStore(days=14, max_patients=10)
+
+    first = asyncio.run(store.get("p1"))
+    second = asyncio.run(store.get("p1"))
+
+    assert first["readings"] == second["readings"] == 12
+    assert len(first["history"]) == 24 * 60 // BIN_MINUTES
+    assert len(fake.requests) == 1
+    assert store.get_stats()["hits"] == 1
+
+def test_new_readings_are_folded_in_and_duplicates_ignored(stored):
+    fake, timestamps = stored
+    store = AGPStore(days=14, max_patients=10)
+    asyncio.run(store.get("p1"))
+
+    newer = timestamps[-1] + 5 * MINUTE_MS
+    store.record("p1", [newer], [130])
+    # The same reading stored again by an overlapping page, alongside already counted ones
+    store.record("p1", [timestamps[3], newer], [120, 130])
+
+    assert asyncio.run(store.get("p1"))["readings"] == 13
+    assert len(fake.requests) == 1
+    assert store.get_stats()["invalidations"] == 0
+
+def test_an_older_uncounted_reading_invalidates_the_profile(stored):
+    fake, timestamps = stored
+    store = AGPStore(days=14, max_patients=10)
+    asyncio.run(store.get("p1"))
+
+    store.record("p1", [timestamps[0] - 5 * MINUTE_MS], [90])
+    asyncio.run(store.get("p1"))
+
+    assert store.get_stats()["invalidations"] == 1
+    assert len(fake.requests) == 2
+
+def test_write_during_a_rebuild_is_not_cached(stored, monkeypatch):
+    fake, timestamps = stored
+    store = AGPStore(days=14, max_patients=10)
+    original = store._build
+
+    def build_racing_a_write(series):
+        store.record("p1", [timestamps[-1] + 5 * MINUTE_MS], [130])
+        return original(series)
+
+    monkeypatch.setattr(store, "_build", build_racing_a_write)
+    asyncio.run(store.get("p1"))
+
+    assert store.get_stats()["size"] == 0
+
+def test_percentiles_interpolate_within_a_bin():
+    profile = AGPProfile()
+    start = 10 * DAY_MS
+    glucose = np.arange(100, 200, 2)
+    profile.add(np.full(glucose.size, start, dtype=np.int64), glucose, first_day=0)
+
+    midnight = profile.percentiles()[0]
+    assert midnight["readings"] == 50
+    assert midnight["p5"] < midnight["p50"] < midnight["p95"]
+    assert midnight["p50"] == pytest.approx(150, abs=2)
+    assert profile.percentiles()[1]["p50"] is None
+
+def test_expired_days_are_subtracted():
+    profile = AGPProfile()
+    profile.add(np.array([10 * DAY_MS, 11 * DAY_MS], dtype=np.int64), np.array([100, 100]), first_day=0)
+    profile.expire(first_day=11)
+
+    assert profile.readings == 1
+    assert int(profile.histogram.sum()) == 1
+    assert profile.uncounted(np.array([10 * DAY_MS]), np.array([100]), first_day=0).tolist() == [True]
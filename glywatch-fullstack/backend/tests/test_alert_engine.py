@@ -0,0 +1,97 @@
+"""
+Tests for per-reading alert rules
+"""
+
+import asyncio
+import time
+import pytest
+from services import alert_engine as alert_module
+from services.alert_engine import AlertEngine, LOW, HIGH, FALLING, PREDICTED_LOW
+
+MINUTE_MS = 60 * 1000
+
+@pytest.fixture
+def queued(monkeypatch):
+    rows = []
+
+    async def submit(table, patient_id, alerts, on_done=None):
+        rows.extend(alerts)
+
+    monkeypatch.setattr(alert_module.write_queue, "submit", submit)
+    return rows
+
+def recent(values, trend="Flat"):
+    """(epoch ms, glucose, trend) readings five minutes apart ending now"""
+    now = int(time.time() * 1000)
+    return [(now - (len(values) - 1 - index) * 5 * MINUTE_MS, value, trend) for index, value in enumerate(values)]
+
+def types(alerts):
+    return [alert["type"] for alert in alerts]
+
+def test_low_alerts_once_and_clears_past_the_hysteresis_margin(queued):
+    engine = AlertEngine()
+
+    # Hovering just above the threshold does not clear the low; 85 does
+    alerts = asyncio.run(engine.evaluate("p1", recent([75, 68, 72, 66, 78, 85, 69])))
+
+    assert types(alerts) == [LOW, LOW]
+    assert queued == alerts
+    assert engine.get_active("p1")[0]["type"] == LOW
+
+def test_readings_are_evaluated_once(queued):
+    engine = AlertEngine()
+    readings = recent([65])
+
+    asyncio.run(engine.evaluate("p1", readings))
+    assert asyncio.run(engine.evaluate("p1", readings)) == []
+    assert engine.evaluated == 1
+
+def test_a_held_condition_realerts_after_the_interval(queued, monkeypatch):
+    monkeypatch.setattr(alert_module.alert_config, "realert_minutes", 10)
+    engine = AlertEngine()
+
+    alerts = asyncio.run(engine.evaluate("p1", recent([200, 210, 220, 230, 240])))
+
+    assert types(alerts) == [HIGH, HIGH, HIGH]
+
+def test_stale_readings_update_state_without_alerting(queued):
+    engine = AlertEngine()
+    now = int(time.time() * 1000)
+
+    alerts = asyncio.run(engine.evaluate("p1", [(now - 60 * MINUTE_MS, 60, "SingleDown")]))
+
+    assert alerts == []
+    assert sorted(item["type"] for item in engine.get_active("p1")) == [FALLING, LOW]
+
+def test_patient_settings_override_the_defaults(queued):
+    engine = AlertEngine()
+    engine.update_settings("p1", {"low_threshold": 90, "trend_alerts": False})
+
+    alerts = asyncio.run(engine.evaluate("p1", recent([85], trend="DoubleDown")))
+
+    assert types(alerts) == [LOW]
+    assert engine.custom_low_thresholds() == {"p1": 90}
+
+def test_predicted_lows_are_suppressed_until_they_clear(queued):
+    engine = AlertEngine()
+    prediction = {"patient_id": "p1", "threshold": 70, "minutes_to_low": 12.0, "glucose": 95,
+                  "reading_date": int(time.time() * 1000)}
+
+    assert types(asyncio.run(engine.raise_predicted_lows([prediction]))) == [PREDICTED_LOW]
+    assert asyncio.run(engine.raise_predicted_lows([prediction])) == []
+    asyncio.run(engine.raise_predicted_lows([]))
+    assert types(asyncio.run(engine.raise_predicted_lows([prediction]))) == [PREDICTED_LOW]
+
+def test_stored_alerts_are_loaded_once_and_merged(queued, fake_supabase):
+    stored = {"id": "stored-1", "patient_id": "p1", "alert_type": HIGH, "severity": "warning",
+              "created_at": "2000-01-01T00:00:00+00:00"}
+    fake_supabase.on("alerts", lambda request: [stored])
+    engine = AlertEngine()
+    raised = asyncio.run(engine.evaluate("p1", recent([60])))
+
+    first = asyncio.run(engine.get_alerts("p1"))
+    second = asyncio.run(engine.get_alerts("p1"))
+
+    assert [alert["id"] for alert in first["alerts"]] == [raised[0]["id"], "stored-1"]
+    assert second == first
+    assert len(fake_supabase.requests) == 1
@@ -0,0 +1,98 @@
+"""
+Tests for the COPY-based bulk loader
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+from decimal import Decimal
+from services.bulk_loader import BulkLoader, _treatment_record
+
+class FakeConnection:
+    """Records statements and COPY records; the merge inserts every distinct timestamp once"""
+
+    def __init__(self, already_stored=0):
+        self.statements = []
+        self.records = []
+        self.already_stored = already_stored
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield
+
+    async def execute(self, statement):
+        self.statements.append(statement)
+        if statement.startswith("INSERT"):
+            distinct = len({record[2] for record in self.records})
+            return f"INSERT 0 {distinct - self.already_stored}"
+        return "CREATE TABLE"
+
+    async def copy_records_to_table(self, table, records, columns):
+        self.statements.append(f"COPY {table}")
+        async for record in records:
+            self.records.append(record)
+
+class FakePool:
+    def __init__(self, connection):
+        self.connection = connection
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield self.connection
+
+def loader_with(connection):
+    loader = BulkLoader("postgresql://db.test/postgres", pool_size=1)
+    loader._pool = FakePool(connection)
+    return loader
+
+def test_readings_are_copied_then_merged_on_the_natural_key():
+    connection = FakeConnection(already_stored=1)
+    readings = [
+        {"glucose": 110, "timestamp": "2024-01-01T10:00:00Z"},
+        {"glucose": 110, "timestamp": "2024-01-01T10:00:00Z"},
+        {"glucose": 120, "timestamp": "2024-01-01T10:05:00Z"},
+        {"glucose": 130, "timestamp": None}
+    ]
+
+    result = asyncio.run(loader_with(connection).load("glucose_readings", "p1", readings))
+
+    assert result["copied"] == 3 and result["skipped"] == 1
+    assert result["inserted"] == 1 and result["duplicates"] == 2
+    create, copy, merge = connection.statements
+    assert create.startswith("CREATE TEMP TABLE staging_glucose_readings ON COMMIT DROP")
+    assert copy == "COPY staging_glucose_readings"
+    assert "DISTINCT ON (patient_id, timestamp)" in merge
+    assert merge.endswith("ON CONFLICT (patient_id, timestamp) DO NOTHING")
+
+def test_rows_can_be_streamed():
+    connection = FakeConnection()
+
+    async def treatments():
+        for index in range(3):
+            yield {"_id": f"t{index}", "eventType": "Bolus", "created_at": f"2024-01-01T10:0{index}:00Z"}
+
+    result = asyncio.run(loader_with(connection).load("treatments", "p1", treatments()))
+
+    assert result["inserted"] == 3
+    assert "ON CONFLICT (patient_id, nightscout_id)" in connection.statements[-1]
+
+def test_unconfigured_loader_reports_an_error():
+    result = asyncio.run(BulkLoader("", pool_size=1).load("glucose_readings", "p1", []))
+
+    assert "SUPABASE_DB_URL" in result["error"]
+
+def test_database_errors_are_reported():
+    class FailingConnection(FakeConnection):
+        async def copy_records_to_table(self, table, records, columns):
+            raise ConnectionError("server closed the connection")
+
+    result = asyncio.run(loader_with(FailingConnection()).load("glucose_readings", "p1", []))
+
+    assert result["error"].endswith("server closed the connection")
+
+def test_treatment_records():
+    record = _treatment_record("p1", {"_id": "t1", "eventType": "Bolus", "insulin": 1.5,
+                                      "created_at": "2024-01-01T10:00:00.000Z"})
+
+    assert record[1] == "Bolus" and record[3] == Decimal("1.5") and record[7] == "t1"
+    assert _treatment_record("p1", {"eventType": "Bolus", "created_at": "2024-01-01T10:00:00Z"}) is None
+    assert _treatment_record("p1", {"_id": "t2", "created_at": ""}) is None
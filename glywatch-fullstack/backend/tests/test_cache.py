@@ -0,0 +1,84 @@
+"""
+Tests for reading timestamp parsing and the latest-reading cache
+"""
+
+import time
+from datetime import datetime, timezone
+import pytest
+from config import cache_config
+from services import cache as cache_module
+from services.bulk_loader import _glucose_record
+from services.cache import (
+    TTLCache, parse_timestamp, reading_ttl, cache_latest, get_cached_latest, invalidate_latest
+)
+
+EXPECTED = datetime(2024, 1, 1, 10, 0, 0, 120000, tzinfo=timezone.utc)
+
+@pytest.mark.parametrize("value", [
+    "2024-01-01T10:00:00.12+00:00",
+    "2024-01-01T10:00:00.120Z",
+    "2024-01-01T10:00:00.120000+00:00",
+    "2024-01-01T10:00:00.1200000Z",
+    "2024-01-01T10:00:00.12+0000",
+    "2024-01-01T10:00:00.12"
+])
+def test_fraction_and_offset_variants(value):
+    assert parse_timestamp(value) == EXPECTED
+
+def test_whole_seconds_and_offsets():
+    assert parse_timestamp("2024-01-01T10:00:00Z") == datetime(2024, 1, 1, 10, tzinfo=timezone.utc)
+    assert parse_timestamp("2024-01-01T12:00:00.5+02:00") == datetime(2024, 1, 1, 10, 0, 0, 500000, tzinfo=timezone.utc)
+
+@pytest.mark.parametrize("value", ["", "not a time", "2024-13-01T00:00:00Z"])
+def test_unparseable(value):
+    assert parse_timestamp(value) is None
+
+def test_bulk_loader_keeps_postgrest_timestamps():
+    record = _glucose_record("p1", {"glucose": 110, "timestamp": "2024-01-01T10:00:00.12+00:00"})
+    assert record is not None and record[2] == EXPECTED
+
+def iso_ago(seconds):
+    return datetime.fromtimestamp(time.time() - seconds, timezone.utc).isoformat()
+
+def test_entries_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    cache = TTLCache(max_size=4)
+    cache.set("a", 1, ttl=10)
+
+    assert cache.get("a") == 1
+    now[0] += 10
+    assert cache.get("a") is None
+    assert cache.get_stats()["size"] == 0
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(max_size=2)
+    cache.set("a", 1, ttl=60)
+    cache.set("b", 2, ttl=60)
+    cache.get("a")
+    cache.set("c", 3, ttl=60)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.get_stats()["evictions"] == 1
+
+def test_reading_ttl_tracks_the_next_reading():
+    interval, grace, floor = cache_config.cgm_interval, cache_config.latest_grace, cache_config.latest_min_ttl
+
+    assert reading_ttl(iso_ago(60)) == pytest.approx(interval - 60 + grace, abs=1)
+    assert reading_ttl(iso_ago(interval * 3)) == floor
+    assert reading_ttl(iso_ago(-interval)) == interval
+    assert reading_ttl("") == floor
+
+def test_latest_cache_skips_errors_and_is_invalidated_for_both_sources():
+    reading = {"glucose": 110, "timestamp": iso_ago(30)}
+    cache_latest("nightscout", "cache-p1", reading)
+    cache_latest("db", "cache-p1", reading)
+    cache_latest("db", "cache-p2", {"error": "Supabase down"})
+
+    assert get_cached_latest("nightscout", "cache-p1") == reading
+    assert get_cached_latest("db", "cache-p2") is None
+
+    invalidate_latest("cache-p1")
+    assert get_cached_latest("nightscout", "cache-p1") is None
+    assert get_cached_latest("db", "cache-p1") is None
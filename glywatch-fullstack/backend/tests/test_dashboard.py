@@ -0,0 +1,35 @@
+"""
+Tests for the caregiver dashboard
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+from services.dashboard import get_caregiver_dashboard
+from services.recent_readings import recent_readings
+from services.supabase_service import quote_filter_value
+
+def iso(minutes_ago: float) -> str:
+    return (datetime.now(timezone.utc) - timedelta(minutes=minutes_ago)).isoformat()
+
+def test_quote_filter_value():
+    assert quote_filter_value("camper-1") == '"camper-1"'
+    assert quote_filter_value('a,b)"c\\') == '"a,b)\\"c\\\\"'
+
+def test_memory_first_then_one_quoted_query(fake_supabase):
+    recent_readings.record("dash-memory", [{"timestamp": iso(1), "glucose": 110, "trend": "Flat", "status": "normal"}])
+    stored = {"dash,stored": {"patient_id": "dash,stored", "timestamp": iso(20), "glucose": 65,
+                              "trend": "SingleDown", "status": "low"}}
+
+    def latest(request):
+        return [dict(row) for row in stored.values()]
+    fake_supabase.on("latest_glucose_readings", latest)
+
+    result = asyncio.run(get_caregiver_dashboard(["dash-memory", "dash,stored", 'dash"none']))
+
+    assert result["total"] == 3 and result["from_memory"] == 1
+    assert len(fake_supabase.requests) == 1
+    assert fake_supabase.requests[0].url.params["patient_id"] == 'in.("dash\\"none","dash,stored")'
+    cards = {card["patient_id"]: card for card in result["patients"]}
+    assert cards["dash-memory"]["glucose"] == 110 and not cards["dash-memory"]["stale"]
+    assert cards["dash,stored"]["glucose"] == 65 and cards["dash,stored"]["stale"]
+    assert cards['dash"none']["glucose"] is None and cards['dash"none']["stale"]
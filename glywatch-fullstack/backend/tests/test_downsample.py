@@ -0,0 +1,41 @@
+"""
+Tests for LTTB downsampling of history responses
+"""
+
+from datetime import datetime, timezone
+import numpy as np
+from services.downsample import downsample_readings, lttb
+
+def test_keeps_the_ends_and_the_extremes():
+    x = np.arange(1000)
+    y = np.full(1000, 120.0)
+    y[400], y[700] = 45, 320
+
+    kept = lttb(x, y, 50)
+
+    assert kept.size == 50
+    assert kept[0] == 0 and kept[-1] == 999
+    assert np.all(np.diff(kept) > 0)
+    assert 400 in kept and 700 in kept
+
+def test_small_series_are_returned_whole():
+    assert lttb(np.arange(10), np.arange(10), 10).tolist() == list(range(10))
+    assert lttb(np.arange(10), np.arange(10), 2).tolist() == list(range(10))
+
+def test_readings_keep_their_original_order():
+    def reading(minute, glucose):
+        timestamp = datetime.fromtimestamp(1704103200 + minute * 60, timezone.utc).isoformat()
+        return {"timestamp": timestamp, "glucose": glucose}
+
+    # Newest first, as the history endpoints return them
+    readings = [reading(minute, 300 if minute == 250 else 110) for minute in range(500, 0, -5)]
+
+    sampled = downsample_readings(readings, 10)
+
+    assert len(sampled) == 10
+    assert sampled[0] is readings[0] and sampled[-1] is readings[-1]
+    assert any(item["glucose"] == 300 for item in sampled)
+    positions = [readings.index(item) for item in sampled]
+    assert positions == sorted(positions)
+
+    assert downsample_readings(readings, 500) is readings
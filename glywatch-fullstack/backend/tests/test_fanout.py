@@ -0,0 +1,48 @@
+"""
+Tests for the deadline-bounded fan-out of upstream calls
+"""
+
+import asyncio
+import time
+from services.fanout import gather_with_deadline
+
+async def answer(value, delay=0.0):
+    await asyncio.sleep(delay)
+    return value
+
+async def fail():
+    raise RuntimeError("upstream down")
+
+def test_calls_run_concurrently():
+    started = time.monotonic()
+    fanout = asyncio.run(gather_with_deadline(
+        {"nightscout": answer({"connected": True}, 0.05), "supabase": answer({"connected": True}, 0.05)}, 1
+    ))
+
+    assert fanout["complete"] is True
+    assert fanout["results"]["nightscout"] == {"connected": True}
+    assert time.monotonic() - started < 0.09
+
+def test_slow_and_failing_calls_do_not_hold_back_the_others():
+    cancelled = []
+
+    async def hang():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def run():
+        fanout = await gather_with_deadline({"latest": answer(110), "history": hang(), "alerts": fail()}, 0.05)
+        await asyncio.sleep(0)
+        return fanout
+
+    fanout = asyncio.run(run())
+
+    assert fanout["complete"] is False
+    assert fanout["results"]["latest"] == 110
+    assert fanout["results"]["history"]["status"] == "timeout"
+    assert fanout["results"]["alerts"] == {"status": "error", "error": "upstream down"}
+    assert cancelled == [True]
+    assert fanout["elapsed_ms"] < 1000
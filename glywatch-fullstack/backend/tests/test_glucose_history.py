@@ -0,0 +1,75 @@
+"""
+Tests for keyset-paged glucose history reads from Supabase
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+from services import supabase_service as supabase_module
+from services.supabase_service import get_glucose_history_from_db
+
+OPERATORS = {
+    "gte": lambda value, bound: value >= bound,
+    "lte": lambda value, bound: value <= bound,
+    "lt": lambda value, bound: value < bound
+}
+
+def selected_columns(request):
+    return [column.strip() for column in request.url.params["select"].split(",")]
+
+@pytest.fixture
+def stored(fake_supabase, monkeypatch):
+    """Ten readings five minutes apart, served newest first with the request's timestamp filters"""
+    monkeypatch.setattr(supabase_module.supabase_config, "page_size", 4)
+    now = datetime.utcnow()
+    rows = [
+        {"timestamp": (now - timedelta(minutes=5 * index + 1)).isoformat(), "glucose": 100 + index,
+         "trend": "Flat", "status": "normal", "raw": 1000, "filtered": 990, "noise": 1}
+        for index in range(10)
+    ]
+
+    def readings(request):
+        selected = rows
+        for condition in request.url.params.get_list("timestamp"):
+            operator, bound = condition.split(".", 1)
+            selected = [row for row in selected if OPERATORS[operator](row["timestamp"], bound)]
+        columns = selected_columns(request)
+        return [{column: row[column] for column in columns if column in row} for row in selected][:int(request.url.params["limit"])]
+
+    fake_supabase.on("glucose_readings", readings)
+    return fake_supabase, rows
+
+def test_whole_window_is_read_in_keyset_pages(stored):
+    fake, rows = stored
+
+    result = asyncio.run(get_glucose_history_from_db("p1", hours=1))
+
+    assert [reading["glucose"] for reading in result["readings"]] == list(range(100, 110))
+    assert result["next_before"] is None
+    assert len(fake.requests) == 3
+    later = fake.requests[1].url.params
+    assert later.get_list("timestamp")[1] == f"lt.{rows[3]['timestamp']}"
+    assert later["order"] == "timestamp.desc"
+
+def test_limited_pages_chain_through_next_before(stored):
+    fake, rows = stored
+
+    first = asyncio.run(get_glucose_history_from_db("p1", hours=1, limit=6))
+    second = asyncio.run(get_glucose_history_from_db("p1", hours=1, limit=6, before=first["next_before"]))
+
+    assert [reading["glucose"] for reading in first["readings"]] == list(range(100, 106))
+    assert first["next_before"] == rows[5]["timestamp"]
+    assert [reading["glucose"] for reading in second["readings"]] == list(range(106, 110))
+    assert second["next_before"] is None
+    # The second page of the first call only asks for what the limit still allows
+    assert fake.requests[1].url.params["limit"] == "2"
+
+def test_only_requested_columns_are_selected(stored):
+    fake, rows = stored
+
+    narrow = asyncio.run(get_glucose_history_from_db("p1", hours=1, limit=1))
+    wide = asyncio.run(get_glucose_history_from_db("p1", hours=1, limit=1, fields=("raw", "noise", "bogus")))
+
+    assert set(narrow["readings"][0]) == {"timestamp", "glucose", "trend", "status"}
+    assert selected_columns(fake.requests[-1]) == ["timestamp", "glucose", "trend", "status", "raw", "noise"]
+    assert wide["readings"][0]["raw"] == 1000
@@ -0,0 +1,61 @@
+"""
+Tests for the pooled Nightscout HTTP client
+"""
+
+import asyncio
+import httpx
+from services.http_client import PooledHTTPClient
+from services.nightscout import NightscoutService
+
+def test_get_json_sends_secret_and_parses(fake_nightscout):
+    seen = []
+
+    def handler(request):
+        seen.append(request)
+        return httpx.Response(200, json=[{"sgv": 120, "dateString": "2024-01-01T10:00:00.000Z"}])
+    fake_nightscout(handler)
+    service = NightscoutService(base_url="http://ns-json.test/", api_secret="hashed-secret")
+
+    entries = asyncio.run(service._get_json("/api/v1/entries.json", params={"count": 1}))
+
+    assert entries[0]["sgv"] == 120
+    assert str(seen[0].url) == "http://ns-json.test/api/v1/entries.json?count=1"
+    assert seen[0].headers["api-secret"] == "hashed-secret"
+
+def test_non_json_body_returns_error_dict(fake_nightscout):
+    fake_nightscout(lambda request: httpx.Response(200, text="<html>Down for maintenance</html>"))
+    service = NightscoutService(base_url="http://ns-maintenance.test", api_secret="")
+
+    result = asyncio.run(service.get_latest_glucose("p1"))
+
+    assert result["patient_id"] == "p1"
+    assert result["error"].startswith("Failed to fetch data from Nightscout")
+
+def test_requests_per_host_are_bounded():
+    running = {"now": 0, "peak": 0}
+
+    async def handler(request):
+        running["now"] += 1
+        running["peak"] = max(running["peak"], running["now"])
+        await asyncio.sleep(0.01)
+        running["now"] -= 1
+        return httpx.Response(200, json=[])
+
+    pool = PooledHTTPClient(timeout=5, connect_timeout=1, max_connections=10, max_keepalive_connections=5,
+                            max_connections_per_host=2, keepalive_expiry=5)
+
+    async def burst():
+        pool._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        responses = await asyncio.gather(
+            *(pool.get("http://one.test/api") for _ in range(5)),
+            *(pool.get("http://two.test/api") for _ in range(5))
+        )
+        await pool.aclose()
+        return responses
+
+    responses = asyncio.run(burst())
+
+    assert all(response.status_code == 200 for response in responses)
+    # Two hosts, each held to two requests at a time
+    assert running["peak"] == 4
+    assert pool._client is None
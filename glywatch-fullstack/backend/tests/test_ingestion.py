@@ -0,0 +1,71 @@
+"""
+Tests for the background multi-patient ingestion scheduler
+"""
+
+import asyncio
+import time
+import pytest
+from services import ingestion as ingestion_module
+from services.ingestion import HostRateLimiter, IngestionScheduler
+
+class FakeService:
+    def __init__(self, patient_id, url):
+        self.base_url = url
+
+    async def sync_glucose(self, patient_id, hours):
+        if patient_id == "broken":
+            raise KeyError("sgv")
+        if patient_id == "unreachable":
+            raise ValueError("not JSON")
+        return {"patient_id": patient_id, "stored": 3}
+
+    async def get_device_status(self, patient_id):
+        return {}
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    scans = []
+
+    async def configs():
+        return {"configs": [
+            {"user_id": patient_id, "nightscout_url": f"http://{patient_id}.test"}
+            for patient_id in ("ok-1", "broken", "unreachable", "ok-2")
+        ] + [{"user_id": "no-url", "nightscout_url": ""}]}
+
+    async def scan():
+        scans.append(True)
+        return []
+
+    monkeypatch.setattr(ingestion_module, "get_active_nightscout_configs", configs)
+    monkeypatch.setattr(ingestion_module.nightscout_registry, "warm",
+                        lambda patient_id, url, secret: FakeService(patient_id, url))
+    monkeypatch.setattr(ingestion_module.predictive_lows, "scan", scan)
+    return IngestionScheduler(interval=60, jitter=0, max_concurrency=2, host_rate_limit=0, lookback_hours=1), scans
+
+def test_one_failing_patient_does_not_abort_the_cycle(scheduler):
+    ingestion, scans = scheduler
+
+    cycle = asyncio.run(ingestion.run_cycle())
+
+    assert cycle["patients"] == 4
+    assert cycle["succeeded"] == 2 and cycle["failed"] == 2
+    assert cycle["new_readings"] == 6
+    assert scans == [True]
+    assert ingestion.last_cycle is cycle
+
+def test_host_rate_limiter_spaces_requests_per_host():
+    limiter = HostRateLimiter(rate=20)
+
+    async def run():
+        started = time.monotonic()
+        await asyncio.gather(*(limiter.wait("http://same.test/api") for _ in range(4)))
+        same_host = time.monotonic() - started
+        started = time.monotonic()
+        await asyncio.gather(*(limiter.wait(f"http://host{index}.test/api") for index in range(4)))
+        return same_host, time.monotonic() - started
+
+    same_host, other_hosts = asyncio.run(run())
+
+    # Four requests at 20/s need three 50 ms gaps on one host and none across hosts
+    assert same_host >= 0.14
+    assert other_hosts < 0.05
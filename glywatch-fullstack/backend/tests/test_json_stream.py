@@ -0,0 +1,43 @@
+"""
+Tests for the streaming JSON array parser used for Nightscout responses
+Run with: python -m pytest tests/
+"""
+
+import asyncio
+import json
+import pytest
+from services.json_stream import iter_json_array
+
+DOCUMENT = b'[1.5, -20, 3e2, 0.25E-1, "a,]b", true, null, {"sgv": 120, "n": [1, 2.5]}, [], 7]'
+
+async def chunked(data: bytes, sizes):
+    position = 0
+    for size in sizes:
+        yield data[position:position + size]
+        position += size
+    yield data[position:]
+
+def parse(data: bytes, sizes) -> list:
+    async def collect():
+        return [value async for value in iter_json_array(chunked(data, sizes))]
+    return asyncio.run(collect())
+
+def test_split_at_every_offset():
+    expected = json.loads(DOCUMENT)
+    for offset in range(len(DOCUMENT) + 1):
+        assert parse(DOCUMENT, [offset]) == expected, offset
+
+def test_single_byte_chunks():
+    assert parse(b"[1.5]", [1] * 5) == [1.5]
+    assert parse(DOCUMENT, [1] * len(DOCUMENT)) == json.loads(DOCUMENT)
+
+def test_empty_array():
+    assert parse(b" [ ] ", [1] * 5) == []
+
+def test_truncated_array():
+    with pytest.raises(ValueError):
+        parse(b"[1, 2", [1] * 5)
+
+def test_not_an_array():
+    with pytest.raises(ValueError):
+        parse(b"<html>Maintenance</html>", [4] * 6)
@@ -0,0 +1,73 @@
+"""
+Tests for the vectorized glycemic metrics
+"""
+
+import asyncio
+import numpy as np
+import pytest
+from services.metrics import compute_glycemic_metrics, get_glycemic_summary, timestamps_to_ms
+
+MINUTE_MS = 60 * 1000
+
+def every_five_minutes(glucose):
+    return np.arange(len(glucose), dtype=np.int64) * 5 * MINUTE_MS, np.array(glucose, dtype=np.float64)
+
+def test_ranges_mean_and_gmi():
+    # The zero is a sensor error and is left out
+    metrics = compute_glycemic_metrics(*every_five_minutes([50, 60, 100, 100, 200, 300, 0]), 6 * 300)
+
+    assert metrics["readings"] == 6
+    assert metrics["time_in_ranges"] == {
+        "very_low": 16.7, "low": 16.7, "in_range": 33.3, "high": 16.7, "very_high": 16.7
+    }
+    assert metrics["mean_glucose"] == 135.0
+    assert metrics["gmi"] == 6.54
+    assert metrics["sensor_active_percent"] == 100.0
+    assert metrics["lbgi"] > 0 and metrics["hbgi"] > 0
+
+def test_events_need_fifteen_minutes():
+    metrics = compute_glycemic_metrics(*every_five_minutes([100, 60, 60, 60, 60, 100, 65, 65, 100, 190, 190, 190]), 86400)
+
+    assert metrics["hypo_events"] == 1
+    assert metrics["hyper_events"] == 1
+
+def test_sensor_gap_splits_an_event():
+    timestamps = np.array([0, 5, 25, 30], dtype=np.int64) * MINUTE_MS
+    metrics = compute_glycemic_metrics(timestamps, np.array([60.0, 60, 60, 60]), 86400)
+
+    assert metrics["hypo_events"] == 0
+    assert metrics["sensor_active_percent"] == pytest.approx(4 * 300 / 86400 * 100, abs=0.1)
+
+def test_mage_and_variability():
+    metrics = compute_glycemic_metrics(*every_five_minutes([100, 200, 200, 100, 200]), 86400)
+
+    assert metrics["mage"] == 100.0
+    assert metrics["sd"] == pytest.approx(np.std([100, 200, 200, 100, 200], ddof=1), abs=0.1)
+
+    flat = compute_glycemic_metrics(*every_five_minutes([120, 120, 120]), 86400)
+    assert flat["sd"] == 0.0 and flat["cv"] == 0.0 and flat["mage"] == 0.0
+
+def test_unsorted_readings_are_ordered_before_events():
+    timestamps, glucose = every_five_minutes([60, 60, 60, 60])
+    order = [2, 0, 3, 1]
+
+    assert compute_glycemic_metrics(timestamps[order], glucose[order], 86400)["hypo_events"] == 1
+
+def test_no_readings():
+    assert compute_glycemic_metrics(np.array([], dtype=np.int64), np.array([]), 86400) == {"readings": 0}
+
+def test_timestamps_to_ms_handles_utc_and_offsets():
+    expected = [1704103200000, 1704103200500]
+    assert timestamps_to_ms(["2024-01-01T10:00:00Z", "2024-01-01T10:00:00.5+00:00"]).tolist() == expected
+    assert timestamps_to_ms(["2024-01-01T12:00:00+02:00", "2024-01-01T05:00:00.5-05:00"]).tolist() == expected
+
+def test_summary_loads_the_stored_series(fake_supabase):
+    fake_supabase.on("glucose_readings", lambda request: [
+        {"timestamp": "2024-01-01T10:00:00+00:00", "glucose": 100},
+        {"timestamp": "2024-01-01T10:05:00+00:00", "glucose": 140}
+    ])
+
+    result = asyncio.run(get_glycemic_summary("p1", 14))
+
+    assert result["period_days"] == 14
+    assert result["summary"]["readings"] == 2 and result["summary"]["mean_glucose"] == 120.0
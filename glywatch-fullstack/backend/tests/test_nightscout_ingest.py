@@ -0,0 +1,131 @@
+"""
+Tests for the Nightscout ingestion paths that run readings through the alert rules
+"""
+
+import asyncio
+import time
+import pytest
+from services import alert_engine as alert_module
+from services import nightscout as nightscout_module
+from services.alert_engine import AlertEngine, LOW
+from services.nightscout import NightscoutService
+from services.prediction import PredictiveLowMonitor
+
+MINUTE_MS = 60 * 1000
+
+class FakeCursors:
+    def __init__(self):
+        self.cursor = {"last_entry_date": 0, "last_entry_id": None}
+        self.advanced = []
+
+    async def get(self, patient_id, data_type):
+        return self.cursor
+
+    async def advance(self, patient_id, data_type, last_entry_date, last_entry_id, records_synced):
+        self.advanced.append(last_entry_date)
+        self.cursor = {"last_entry_date": last_entry_date, "last_entry_id": last_entry_id}
+        return self.cursor
+
+def entries_newest_first(values):
+    """Nightscout entries five minutes apart ending now, newest first as the API returns them"""
+    now = int(time.time() * 1000)
+    return [
+        {"_id": f"e{index}", "date": now - index * 5 * MINUTE_MS, "sgv": value, "direction": "Flat",
+         "dateString": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime((now - index * 5 * MINUTE_MS) / 1000))}
+        for index, value in enumerate(reversed(values))
+    ]
+
+@pytest.fixture
+def ingest(monkeypatch):
+    """A Nightscout service whose alert, projection, cursor and storage collaborators are observable"""
+    engine = AlertEngine()
+    monitor = PredictiveLowMonitor()
+    cursors = FakeCursors()
+    stored = []
+
+    async def queue_alerts(table, patient_id, rows, on_done=None):
+        return None
+
+    async def store(patient_id, readings):
+        stored.extend(readings)
+        return {"success": True, "stored": len(readings), "results": [{"success": True} for _ in readings]}
+
+    monkeypatch.setattr(alert_module.write_queue, "submit", queue_alerts)
+    monkeypatch.setattr(nightscout_module, "alert_engine", engine)
+    monkeypatch.setattr(nightscout_module, "predictive_lows", monitor)
+    monkeypatch.setattr(nightscout_module, "sync_cursors", cursors)
+    monkeypatch.setattr(nightscout_module, "store_glucose_readings", store)
+    service = NightscoutService(base_url="http://nightscout.test", api_secret="")
+    return service, engine, monitor, cursors, stored
+
+def serve(service, entries):
+    async def window(path, field, lower, upper, *args, **kwargs):
+        for entry in entries:
+            yield entry
+    service._iter_window = window
+
+def test_streamed_history_raises_alerts_before_the_cursor_moves(ingest):
+    service, engine, monitor, cursors, stored = ingest
+    entries = entries_newest_first([120, 100, 80, 62, 55])
+    serve(service, entries)
+
+    async def stream():
+        summary = {}
+        readings = [reading async for reading in service.stream_glucose_history("p1", 3, summary)]
+        return readings, summary
+
+    readings, summary = asyncio.run(stream())
+
+    assert len(readings) == summary["total_readings"] == 5
+    assert len(stored) == 5
+    assert LOW in [alert["type"] for alert in engine._recent["p1"]]
+    row = monitor._rows["p1"]
+    assert int(monitor.glucose[row, -1]) == 55
+    assert cursors.advanced == [entries[0]["date"]]
+
+def test_streamed_entries_behind_the_cursor_are_not_evaluated(ingest):
+    service, engine, monitor, cursors, stored = ingest
+    entries = entries_newest_first([60, 58])
+    cursors.cursor = {"last_entry_date": entries[0]["date"], "last_entry_id": entries[0]["_id"]}
+    serve(service, entries)
+
+    async def stream():
+        return [reading async for reading in service.stream_glucose_history("p1", 3, {})]
+
+    asyncio.run(stream())
+
+    assert stored == []
+    assert engine.evaluated == 0
+    assert "p1" not in monitor._rows
+
+@pytest.fixture
+def backfill(ingest, monkeypatch):
+    service, engine, monitor, cursors, stored = ingest
+    invalidated = []
+
+    async def bulk_load(patient_id, rows):
+        count = 0
+        async for _ in rows:
+            count += 1
+        return {"success": True, "copied": count, "inserted": count}
+
+    monkeypatch.setattr(nightscout_module, "bulk_load_glucose_readings", bulk_load)
+    monkeypatch.setattr(nightscout_module, "bulk_load_treatments", bulk_load)
+    monkeypatch.setattr(nightscout_module.agp_profiles, "invalidate", invalidated.append)
+    return service, engine, monitor, cursors, invalidated
+
+def test_backfill_evaluates_its_newest_entries(backfill):
+    service, engine, monitor, cursors, invalidated = backfill
+    # Two days of steady readings ending in a low that is still in progress
+    entries = entries_newest_first([120] * 576 + [90, 72, 60, 55])
+    serve(service, entries)
+
+    result = asyncio.run(service.backfill("p1", 2))
+
+    assert result["glucose_readings"]["inserted"] == len(entries)
+    assert LOW in [alert["type"] for alert in engine._recent["p1"]]
+    # Only the alertable tail is evaluated, not the whole import
+    assert engine.evaluated <= 7
+    assert int(monitor.glucose[monitor._rows["p1"], -1]) == 55
+    assert invalidated == ["p1"]
+    assert cursors.advanced == [entries[0]["date"]]
@@ -0,0 +1,70 @@
+"""
+Tests for the per-patient Nightscout client registry
+"""
+
+import asyncio
+import httpx
+from services.nightscout import NightscoutClientRegistry, NightscoutService
+
+DEFAULT = NightscoutService(base_url="http://default.test", api_secret="")
+
+def configs(request):
+    user_id = request.url.params["user_id"][len("eq."):]
+    if user_id == "down":
+        return httpx.Response(500, json={"message": "unavailable"})
+    if user_id == "shared":
+        return []
+    return [{"user_id": user_id, "nightscout_url": f"http://{user_id}.test/", "api_secret": f"secret-{user_id}"}]
+
+def test_config_is_looked_up_once_per_patient(fake_supabase):
+    fake_supabase.on("user_nightscout_config", configs)
+    registry = NightscoutClientRegistry(capacity=4, default=DEFAULT)
+
+    async def resolve():
+        first = await asyncio.gather(*(registry.get("p1") for _ in range(5)))
+        return first, await registry.get("p1")
+
+    first, again = asyncio.run(resolve())
+
+    assert all(client is again for client in first)
+    assert again.base_url == "http://p1.test"
+    assert len(fake_supabase.requests) == 1
+    assert registry.get_stats()["hits"] == 1
+
+def test_patients_without_an_instance_share_the_default(fake_supabase):
+    fake_supabase.on("user_nightscout_config", configs)
+    registry = NightscoutClientRegistry(capacity=4, default=DEFAULT)
+
+    assert asyncio.run(registry.get("shared")) is DEFAULT
+    assert asyncio.run(registry.get("shared")) is DEFAULT
+    assert len(fake_supabase.requests) == 1
+
+def test_failed_lookup_falls_back_without_caching(fake_supabase):
+    fake_supabase.on("user_nightscout_config", configs)
+    registry = NightscoutClientRegistry(capacity=4, default=DEFAULT)
+
+    assert asyncio.run(registry.get("down")) is DEFAULT
+    asyncio.run(registry.get("down"))
+
+    assert len(fake_supabase.requests) == 2
+    assert registry.get_stats()["size"] == 0
+
+def test_least_recently_used_client_is_evicted():
+    registry = NightscoutClientRegistry(capacity=2, default=DEFAULT)
+    registry.warm("p1", "http://p1.test", None)
+    registry.warm("p2", "http://p2.test", None)
+    registry.warm("p1", "http://p1.test", None)
+    registry.warm("p3", "http://p3.test", None)
+
+    assert list(registry._clients) == ["p1", "p3"]
+    assert registry.get_stats()["evictions"] == 1
+
+def test_warm_reuses_unchanged_clients_and_replaces_changed_ones():
+    registry = NightscoutClientRegistry(capacity=4, default=DEFAULT)
+    client = registry.warm("p1", "http://p1.test/", "secret")
+
+    assert registry.warm("p1", "http://p1.test", "secret") is client
+    assert registry.warm("p1", "http://p1.test", "rotated") is not client
+
+    registry.invalidate("p1")
+    assert "p1" not in registry._clients
@@ -0,0 +1,103 @@
+"""
+Tests for time-window queries against the Nightscout API
+"""
+
+import asyncio
+import json
+import re
+import httpx
+import pytest
+from services import nightscout as nightscout_module
+from services.nightscout import NightscoutService
+
+FILTER = re.compile(r"find\[(\w+)\]\[\$(gt|gte|lt|lte)\]")
+COMPARE = {
+    "gt": lambda value, bound: value > bound,
+    "gte": lambda value, bound: value >= bound,
+    "lt": lambda value, bound: value < bound,
+    "lte": lambda value, bound: value <= bound
+}
+
+class FakeNightscout:
+    """Applies find[field][$op] filters and count to a document list, newest first"""
+
+    def __init__(self, documents, field):
+        self.documents = documents
+        self.field = field
+        self.requests = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(dict(request.url.params))
+        selected = self.documents
+        for name, bound in request.url.params.items():
+            match = FILTER.fullmatch(name)
+            if match:
+                field, op = match.groups()
+                cast = type(selected[0][field]) if selected else str
+                selected = [document for document in selected if COMPARE[op](document[field], cast(bound))]
+        selected = sorted(selected, key=lambda document: document[self.field], reverse=True)
+        return httpx.Response(200, content=json.dumps(selected[:int(request.url.params["count"])]))
+
+@pytest.fixture
+def small_pages(monkeypatch):
+    monkeypatch.setattr(nightscout_module.nightscout_config, "page_size", 3)
+
+def collect(service, *args, **kwargs):
+    async def run():
+        return [document async for document in service._iter_window(*args, **kwargs)]
+    return asyncio.run(run())
+
+def test_window_pages_through_every_entry(fake_nightscout, small_pages):
+    # Several entries share a timestamp across each page boundary
+    dates = [1000, 2000, 2000, 2000, 2000, 3000, 4000, 4000, 5000, 6000]
+    server = FakeNightscout([{"_id": f"e{index}", "date": date} for index, date in enumerate(dates)], "date")
+    fake_nightscout(server)
+    service = NightscoutService(base_url="http://window-paging.test", api_secret="")
+
+    documents = collect(service, "/api/v1/entries.json", "date", 1000, 6000, lower_op="$gt")
+
+    assert sorted(document["_id"] for document in documents) == [f"e{index}" for index in range(1, 10)]
+    assert len(server.requests) > 3
+    assert all(request["find[date][$gt]"] == "1000" for request in server.requests)
+
+def test_window_steps_past_a_page_of_identical_times(fake_nightscout, small_pages):
+    server = FakeNightscout([{"_id": f"e{index}", "date": 2000} for index in range(7)] + [{"_id": "old", "date": 1000}], "date")
+    fake_nightscout(server)
+    service = NightscoutService(base_url="http://window-ties.test", api_secret="")
+
+    documents = collect(service, "/api/v1/entries.json", "date", 0, 5000)
+
+    assert sorted(document["_id"] for document in documents) == sorted([f"e{index}" for index in range(7)] + ["old"])
+
+def test_entries_are_fetched_from_the_sync_cursor(fake_nightscout):
+    server = FakeNightscout([{"_id": "e1", "date": 5000}], "date")
+    fake_nightscout(server)
+    service = NightscoutService(base_url="http://window-cursor.test", api_secret="")
+
+    asyncio.run(service._get_entries_since(4000))
+
+    params = server.requests[0]
+    assert params["find[date][$gt]"] == "4000"
+    assert int(params["find[date][$lte]"]) > 4000
+    assert "find[date][$gte]" not in params
+
+def test_treatments_use_a_created_at_range(fake_nightscout, monkeypatch):
+    server = FakeNightscout([
+        {"_id": "t1", "created_at": "2000-01-01T00:00:00.000Z"},
+        {"_id": "t2", "created_at": "2999-01-01T00:00:00.000Z"}
+    ], "created_at")
+    fake_nightscout(server)
+    queued = []
+
+    async def submit(table, patient_id, rows, on_done=None):
+        queued.extend(rows)
+
+    monkeypatch.setattr(nightscout_module.write_queue, "submit", submit)
+    service = NightscoutService(base_url="http://window-treatments.test", api_secret="")
+
+    result = asyncio.run(service.get_treatments("p1", hours=6))
+
+    assert result["total_treatments"] == 0 and queued == []
+    params = server.requests[0]
+    assert params["find[created_at][$gte]"].endswith("Z") and params["find[created_at][$lte]"].endswith("Z")
+    assert "count" in params
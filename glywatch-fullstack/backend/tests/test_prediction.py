@@ -0,0 +1,74 @@
+"""
+Tests for the vectorized predicted-low projection
+"""
+
+import asyncio
+import pytest
+from services import prediction as prediction_module
+from services.alert_engine import AlertEngine
+from services.prediction import PredictiveLowMonitor
+
+MINUTE_MS = 60 * 1000
+NOW = 1_700_000_000_000
+
+@pytest.fixture
+def engine(monkeypatch):
+    engine = AlertEngine()
+    monkeypatch.setattr(prediction_module, "alert_engine", engine)
+    return engine
+
+def observe(monitor, patient_id, values, ending=NOW):
+    dates = [ending - (len(values) - 1 - index) * 5 * MINUTE_MS for index in range(len(values))]
+    monitor.observe(patient_id, dates, values)
+
+def flagged(monitor, now=NOW):
+    return {prediction["patient_id"]: prediction for prediction in monitor.project(now)}
+
+def test_only_a_fresh_falling_trend_above_the_threshold_is_flagged(engine):
+    monitor = PredictiveLowMonitor(initial_patients=2)
+    observe(monitor, "falling", [130, 120, 110, 100, 90])
+    observe(monitor, "flat", [90, 90, 91, 90, 90])
+    observe(monitor, "already-low", [80, 72, 66, 60])
+    observe(monitor, "few-points", [100, 85])
+    observe(monitor, "stale", [130, 120, 110, 100, 90], ending=NOW - 30 * MINUTE_MS)
+
+    predictions = flagged(monitor)
+
+    assert list(predictions) == ["falling"]
+    falling = predictions["falling"]
+    assert falling["slope_per_minute"] == -2.0
+    assert falling["minutes_to_low"] == 10.0
+    assert falling["glucose"] == 90 and falling["threshold"] == 70
+    assert monitor.dates.shape[0] >= 5
+
+def test_patient_thresholds_are_used(engine):
+    monitor = PredictiveLowMonitor()
+    observe(monitor, "p1", [200, 190, 180, 170])
+    assert flagged(monitor) == {}
+
+    engine.update_settings("p1", {"low_threshold": 150})
+    assert flagged(monitor)["p1"]["threshold"] == 150
+
+def test_repeated_and_older_readings_are_ignored(engine):
+    monitor = PredictiveLowMonitor(history=4)
+    observe(monitor, "p1", [130, 120, 110, 100])
+    monitor.observe("p1", [NOW - 5 * MINUTE_MS, NOW], [300, 300])
+
+    row = monitor._rows["p1"]
+    assert monitor.glucose[row].tolist() == [130, 120, 110, 100]
+
+def test_scan_raises_alerts_and_keeps_the_result(engine, monkeypatch):
+    raised = []
+
+    async def raise_predicted_lows(predictions):
+        raised.extend(predictions)
+
+    monkeypatch.setattr(engine, "raise_predicted_lows", raise_predicted_lows)
+    monitor = PredictiveLowMonitor()
+    monkeypatch.setattr(prediction_module.time, "time", lambda: NOW / 1000)
+    observe(monitor, "p1", [130, 120, 110, 100, 90])
+
+    predictions = asyncio.run(monitor.scan())
+
+    assert raised == predictions and len(predictions) == 1
+    assert monitor.last_scan["patients"] == 1
@@ -0,0 +1,78 @@
+"""
+Tests for the per-patient ring buffers of recent readings
+"""
+
+import time
+from datetime import datetime, timezone
+from services.recent_readings import GlucoseRingBuffer, RecentReadingsStore
+
+MINUTE_MS = 60 * 1000
+
+def readings_until_now(count, step_minutes=5):
+    """`count` readings `step_minutes` apart ending now, oldest first"""
+    now = int(time.time() * 1000)
+    return [
+        {"timestamp": datetime.fromtimestamp((now - index * step_minutes * MINUTE_MS) / 1000, timezone.utc).isoformat(),
+         "glucose": 100 + index, "trend": "Flat", "status": "normal", "noise": 1}
+        for index in range(count - 1, -1, -1)
+    ]
+
+def window_start(hours):
+    return int((time.time() - hours * 3600) * 1000)
+
+def test_window_is_served_after_a_full_sync():
+    store = RecentReadingsStore(capacity=288, max_patients=10)
+    store.record("p1", readings_until_now(12), since=window_start(1))
+
+    window = store.window("p1", 1)
+
+    assert window is not None and len(window) == 12
+    assert window[0]["glucose"] == 100 and window[0]["trend"] == "Flat"
+    assert store.window("p1", 3) is None
+
+def test_latest_poll_extends_coverage_without_a_gap():
+    store = RecentReadingsStore(capacity=288, max_patients=10)
+    history = readings_until_now(12)
+    store.record("p1", history[:-1], since=window_start(1) - 5 * MINUTE_MS)
+    store.record("p1", history[-1:])
+
+    assert store.latest("p1")["glucose"] == 100
+    assert len(store.window("p1", 1)) == 12
+
+def test_latest_poll_after_a_missed_reading_restarts_coverage():
+    store = RecentReadingsStore(capacity=288, max_patients=10)
+    history = readings_until_now(12)
+    store.record("p1", history[:-3], since=window_start(1) - 15 * MINUTE_MS)
+    store.record("p1", history[-1:])
+
+    assert store.latest("p1")["glucose"] == 100
+    assert store.window("p1", 1) is None
+
+    # The next full sync fills the gap in front of the held readings
+    store.record("p1", history, since=window_start(1))
+    assert len(store.window("p1", 1)) == 12
+
+def test_latest_poll_alone_cannot_serve_a_window():
+    store = RecentReadingsStore(capacity=288, max_patients=10)
+    store.record("p1", readings_until_now(1))
+
+    assert store.latest("p1") is not None
+    assert store.window("p1", 1) is None
+
+def test_full_buffer_drops_the_oldest_and_its_coverage():
+    buffer = GlucoseRingBuffer(capacity=3)
+    buffer.covered_from = 0
+    for date in (1000, 2000, 3000, 4000):
+        buffer.append(date, {"glucose": date // 10})
+
+    assert [buffer.dates[index] for index in buffer.newest_first(0)] == [4000, 3000, 2000]
+    assert buffer.covered_from == 1001
+
+def test_least_recently_used_patient_is_evicted():
+    store = RecentReadingsStore(capacity=10, max_patients=2)
+    for patient_id in ("p1", "p2", "p1", "p3"):
+        store.record(patient_id, readings_until_now(1))
+
+    assert store.latest("p2") is None
+    assert store.latest("p1") is not None and store.latest("p3") is not None
+    assert store.get_stats()["evictions"] == 1
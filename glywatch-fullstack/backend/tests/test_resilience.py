@@ -0,0 +1,103 @@
+"""
+Tests for upstream retries and circuit breakers
+"""
+
+import asyncio
+import httpx
+import pytest
+from services import resilience as resilience_module
+from services.resilience import CircuitBreaker, CircuitOpenError, call_async, CLOSED, OPEN
+from services.nightscout import is_nightscout_failure, is_nightscout_retryable
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(resilience_module.time, "monotonic", lambda: now[0])
+    return now
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(resilience_module, "backoff_delay", lambda attempt: 0)
+    monkeypatch.setattr(resilience_module.resilience_config, "max_retries", 2)
+
+def status_error(code):
+    request = httpx.Request("GET", "http://nightscout.test/api/v1/entries.json")
+    return httpx.HTTPStatusError("error", request=request, response=httpx.Response(code, request=request))
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=30)
+    for _ in range(2):
+        breaker.record_failure()
+    breaker.record_success()
+    for _ in range(3):
+        breaker.before_call()
+        breaker.record_failure()
+
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError) as raised:
+        breaker.before_call()
+    assert raised.value.retry_after == pytest.approx(30)
+
+def test_half_open_lets_one_probe_through(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock[0] += 30
+
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    clock[0] += 30
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.get_stats()["times_opened"] == 2
+
+def test_cancelled_probe_frees_the_slot(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock[0] += 30
+    breaker.before_call()
+    breaker.cancel_call()
+
+    breaker.before_call()
+
+def test_retryable_failures_are_retried(no_backoff):
+    breaker = CircuitBreaker("test", failure_threshold=5, reset_timeout=30)
+    attempts = []
+
+    async def flaky():
+        attempts.append(True)
+        if len(attempts) < 3:
+            raise status_error(503)
+        return "ok"
+
+    assert asyncio.run(call_async(breaker, flaky, is_nightscout_failure, is_nightscout_retryable)) == "ok"
+    assert len(attempts) == 3
+    assert breaker.state == CLOSED and breaker.consecutive_failures == 0
+
+def test_read_timeouts_count_but_are_not_retried(no_backoff):
+    breaker = CircuitBreaker("test", failure_threshold=5, reset_timeout=30)
+    attempts = []
+
+    async def slow():
+        attempts.append(True)
+        raise httpx.ReadTimeout("timed out")
+
+    with pytest.raises(httpx.ReadTimeout):
+        asyncio.run(call_async(breaker, slow, is_nightscout_failure, is_nightscout_retryable))
+    assert len(attempts) == 1
+    assert breaker.consecutive_failures == 1
+
+def test_client_errors_do_not_trip_the_breaker(no_backoff):
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=30)
+
+    async def not_found():
+        raise status_error(404)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(call_async(breaker, not_found, is_nightscout_failure, is_nightscout_retryable))
+    assert breaker.state == CLOSED
+    assert breaker.get_stats()["successes"] == 1
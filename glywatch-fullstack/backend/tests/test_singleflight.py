@@ -0,0 +1,71 @@
+"""
+Tests for coalescing concurrent upstream calls
+"""
+
+import asyncio
+import pytest
+from services.singleflight import SingleFlight
+
+def test_concurrent_calls_share_one_result():
+    flights = SingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(True)
+        await asyncio.sleep(0.01)
+        return {"glucose": 110}
+
+    async def run():
+        results = await asyncio.gather(*(flights.do("latest", fetch) for _ in range(5)))
+        later = await flights.do("latest", fetch)
+        return results, later
+
+    results, later = asyncio.run(run())
+
+    assert all(result is results[0] for result in results)
+    assert later == {"glucose": 110} and later is not results[0]
+    assert len(calls) == 2
+    assert flights.get_stats() == {"in_flight": 0, "started": 2, "shared": 4}
+
+def test_different_keys_are_not_coalesced():
+    flights = SingleFlight()
+
+    async def run():
+        return await asyncio.gather(flights.do("a", lambda: asyncio.sleep(0, "a")),
+                                    flights.do("b", lambda: asyncio.sleep(0, "b")))
+
+    assert asyncio.run(run()) == ["a", "b"]
+    assert flights.get_stats()["shared"] == 0
+
+def test_errors_reach_every_caller_and_are_not_cached():
+    flights = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    async def run():
+        return await asyncio.gather(*(flights.do("k", fail) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(run())
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert flights.get_stats()["in_flight"] == 0
+
+def test_a_cancelled_caller_does_not_cancel_the_others():
+    flights = SingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.02)
+        return "ok"
+
+    async def run():
+        first = asyncio.ensure_future(flights.do("k", fetch))
+        second = asyncio.ensure_future(flights.do("k", fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(run()) == "ok"
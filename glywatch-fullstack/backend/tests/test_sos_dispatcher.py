@@ -0,0 +1,111 @@
+"""
+Tests for SOS contact lookup and dispatch outcomes
+"""
+
+import asyncio
+from services import sos_dispatcher as dispatcher_module
+from services.sos_dispatcher import SOSDispatcher, ON_CALL_CONTACT
+from services.supabase_service import get_caregiver_contacts
+
+CAREGIVER = {"caregiver_id": "c1", "channel": "sms", "address": "+15550001"}
+ON_CALL = {"caregiver_id": "c2", "channel": "sms", "address": "+15550002"}
+
+class RecordingNotifier:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, contact, event):
+        self.sent.append(contact["address"])
+        return {"status": "delivered"}
+
+def test_contacts_merge_patient_and_on_call(fake_supabase):
+    def contacts(request):
+        patient_filter = request.url.params["patient_id"]
+        return [ON_CALL] if patient_filter == "is.null" else [CAREGIVER]
+    fake_supabase.on("caregiver_contacts", contacts)
+
+    result = asyncio.run(get_caregiver_contacts("camper,7"))
+
+    assert "error" not in result
+    assert sorted(contact["caregiver_id"] for contact in result["contacts"]) == ["c1", "c2"]
+    filters = sorted(request.url.params["patient_id"] for request in fake_supabase.requests)
+    assert filters == ["eq.camper,7", "is.null"]
+
+def test_on_call_only_without_patient(fake_supabase):
+    fake_supabase.on("caregiver_contacts", lambda request: [ON_CALL])
+
+    result = asyncio.run(get_caregiver_contacts(None))
+
+    assert result["contacts"] == [ON_CALL]
+    assert len(fake_supabase.requests) == 1
+
+def make_event():
+    return {"id": "e1", "patient_id": "p1", "type": "manual", "description": "help",
+            "status": "pending", "attempts": 0, "deliveries": {}}
+
+def test_failed_lookup_is_not_delivered(monkeypatch):
+    lookups = [{"error": "Supabase down"}, {"contacts": [CAREGIVER]}]
+    updates = []
+
+    async def contacts(patient_id):
+        return lookups.pop(0)
+
+    async def update(event_id, fields):
+        updates.append(fields["status"])
+        return {"success": True}
+
+    monkeypatch.setattr(dispatcher_module, "get_caregiver_contacts", contacts)
+    monkeypatch.setattr(dispatcher_module, "update_sos_event", update)
+    notifier = RecordingNotifier()
+    dispatcher = SOSDispatcher(workers=1, notifiers={"sms": notifier, "log": notifier})
+    event = make_event()
+
+    assert asyncio.run(dispatcher._dispatch(event)) is False
+    assert event["status"] == "dispatching"
+    assert notifier.sent == [ON_CALL_CONTACT["address"]]
+
+    assert asyncio.run(dispatcher._dispatch(event)) is True
+    assert event["status"] == "delivered"
+    assert notifier.sent[-1] == CAREGIVER["address"]
+    assert updates == ["dispatching", "delivered"]
+
+def test_failed_lookup_ends_partial(monkeypatch):
+    async def contacts(patient_id):
+        return {"error": "Supabase down"}
+
+    async def update(event_id, fields):
+        return {"success": True}
+
+    monkeypatch.setattr(dispatcher_module, "get_caregiver_contacts", contacts)
+    monkeypatch.setattr(dispatcher_module, "update_sos_event", update)
+    monkeypatch.setattr(dispatcher_module.sos_config, "max_attempts", 1)
+    dispatcher = SOSDispatcher(workers=1)
+    event = make_event()
+
+    assert asyncio.run(dispatcher._dispatch(event)) is False
+    assert event["status"] == "partial"
+    assert dispatcher.failed == 1
+
+def test_repeat_submissions_are_merged(monkeypatch):
+    async def stored(*args):
+        return {"success": True}
+
+    async def contacts(patient_id):
+        return {"contacts": [CAREGIVER]}
+
+    monkeypatch.setattr(dispatcher_module, "create_sos_event", stored)
+    monkeypatch.setattr(dispatcher_module, "update_sos_event", stored)
+    monkeypatch.setattr(dispatcher_module, "get_caregiver_contacts", contacts)
+    notifier = RecordingNotifier()
+    dispatcher = SOSDispatcher(workers=1, notifiers={"sms": notifier})
+
+    async def submit_twice():
+        first = await dispatcher.submit("p1", "manual", "2026-01-01T00:00:00Z", "help")
+        second = await dispatcher.submit("p1", "manual", "2026-01-01T00:00:05Z", "help")
+        return first, second
+
+    first, second = asyncio.run(submit_twice())
+
+    assert first["status"] == "delivered"
+    assert second["status"] == "duplicate" and second["id"] == first["id"]
+    assert notifier.sent == [CAREGIVER["address"]]
@@ -0,0 +1,130 @@
+"""
+Tests for the pooled Supabase data layer
+"""
+
+import asyncio
+import json
+import httpx
+from services import supabase_service as supabase_module
+from services.supabase_service import SupabaseService, priority_requests, supabase_service
+
+class SlowQuery:
+    """Stands in for a PostgREST request builder and records how many run at once"""
+
+    running = 0
+    peak = 0
+
+    async def execute(self):
+        SlowQuery.running += 1
+        SlowQuery.peak = max(SlowQuery.peak, SlowQuery.running)
+        await asyncio.sleep(0.01)
+        SlowQuery.running -= 1
+        return "ok"
+
+def test_request_slots_bind_to_the_running_loop(monkeypatch):
+    monkeypatch.setattr(supabase_module.supabase_config, "max_concurrency", 2)
+    # Created outside any event loop, as the module-level instance is at import time
+    service = SupabaseService()
+    SlowQuery.peak = 0
+
+    async def contend():
+        return await asyncio.gather(*(service._execute(SlowQuery()) for _ in range(6)))
+
+    assert asyncio.run(contend()) == ["ok"] * 6
+    assert SlowQuery.peak == 2
+    # A second loop, e.g. after a restart, gets fresh slots once the service is closed
+    asyncio.run(service.aclose())
+    assert asyncio.run(contend()) == ["ok"] * 6
+
+def test_priority_requests_use_reserved_slots(monkeypatch):
+    monkeypatch.setattr(supabase_module.supabase_config, "max_concurrency", 1)
+    monkeypatch.setattr(supabase_module.sos_config, "db_slots", 1)
+    service = SupabaseService()
+
+    async def run():
+        service._request_slots()
+        async with service._slots:
+            # The shared slot is taken; an SOS request still goes through
+            with priority_requests():
+                return await asyncio.wait_for(service._execute(SlowQuery()), timeout=1)
+
+    assert asyncio.run(run()) == "ok"
+
+def readings(count, start_minute=0):
+    return [
+        {"glucose": 100 + index, "timestamp": f"2024-01-01T10:{start_minute + index:02d}:00Z", "trend": "Flat"}
+        for index in range(count)
+    ]
+
+def test_readings_are_stored_in_chunked_multi_row_inserts(fake_supabase):
+    chunks = []
+
+    def insert(request):
+        rows = json.loads(request.content)
+        chunks.append(len(rows))
+        if len(chunks) == 2:
+            return httpx.Response(400, json={"message": "bad chunk"})
+        return [{**row, "id": index} for index, row in enumerate(rows)]
+    fake_supabase.on("glucose_readings", insert)
+
+    result = asyncio.run(supabase_service.store_glucose_readings("batch-p1", readings(5), chunk_size=2))
+
+    assert chunks == [2, 2, 1]
+    assert [bool(row.get("success")) for row in result["results"]] == [True, True, False, False, True]
+    assert result["stored"] == 3 and result["failed"] == 2 and not result["success"]
+
+def test_upserts_skip_natural_key_duplicates(fake_supabase):
+    def insert(request):
+        rows = json.loads(request.content)
+        # The first reading is already stored, so the database returns only the second
+        return [{**rows[1], "id": 7}]
+    fake_supabase.on("glucose_readings", insert)
+
+    result = asyncio.run(supabase_service.store_glucose_readings("dedup-p1", readings(2)))
+
+    request = fake_supabase.requests[0]
+    assert request.url.params["on_conflict"] == "patient_id,timestamp"
+    assert "resolution=ignore-duplicates" in request.headers["prefer"]
+    assert result["success"] and result["inserted"] == 1 and result["duplicates"] == 1
+
+def test_single_duplicate_reading_is_reported_as_stored(fake_supabase):
+    fake_supabase.on("glucose_readings", lambda request: [])
+
+    result = asyncio.run(supabase_service.store_glucose_reading("dedup-p1", readings(1)[0]))
+
+    assert result["success"] and result["duplicate"]
+
+def test_rows_without_a_sensor_time_are_skipped(fake_supabase):
+    sent = []
+
+    def insert(request):
+        rows = json.loads(request.content)
+        sent.extend(rows)
+        return [{**row, "id": index} for index, row in enumerate(rows)]
+    fake_supabase.on("glucose_readings", insert)
+    batch = readings(3)
+    batch[1]["timestamp"] = ""
+
+    result = asyncio.run(supabase_service.store_batch("glucose_readings", [("null-p1", reading) for reading in batch]))
+
+    assert [row["glucose"] for row in sent] == [100, 102]
+    assert result["results"][1] == {"success": True, "skipped": True}
+    assert result["success"] and result["stored"] == 2 and result["skipped"] == 1 and result["failed"] == 0
+
+    single = asyncio.run(supabase_service.store_glucose_reading("null-p1", {"glucose": 90}))
+    assert single["success"] and single["skipped"]
+    assert len(fake_supabase.requests) == 1
+
+def test_latest_reading_is_newest_by_sensor_time(fake_supabase):
+    fake_supabase.on("glucose_readings", lambda request: [
+        {"glucose": 110, "timestamp": "2024-01-01T10:00:00+00:00", "trend": "Flat", "status": "normal",
+         "raw": 1000, "filtered": 990, "noise": 1}
+    ])
+
+    result = asyncio.run(supabase_service.get_latest_glucose("latest-p1"))
+
+    params = fake_supabase.requests[0].url.params
+    assert params["timestamp"] == "not.is.null"
+    assert params["order"] == "timestamp.desc"
+    assert params["limit"] == "1"
+    assert result["glucose"] == 110 and result["noise"] == 1
@@ -0,0 +1,71 @@
+"""
+Tests for incremental Nightscout sync from a per-patient cursor
+"""
+
+import asyncio
+import json
+import time
+import httpx
+from services import nightscout as nightscout_module
+from services.nightscout import NightscoutService
+from services.sync_state import SyncCursorStore, GLUCOSE_ENTRIES
+
+MINUTE_MS = 60 * 1000
+
+def cursor_table(stored):
+    """data_sync_status handler: reads return the stored row, upserts replace it"""
+    def handler(request):
+        if request.method == "GET":
+            return [stored] if stored else []
+        row = json.loads(request.content)
+        stored.update(row)
+        return [row]
+    return handler
+
+def test_cursor_loads_once_and_never_moves_back(fake_supabase):
+    stored = {"last_entry_date": 1000, "last_entry_id": "a"}
+    fake_supabase.on("data_sync_status", cursor_table(stored))
+    cursors = SyncCursorStore()
+
+    async def run():
+        first = await cursors.get("cursor-p1", GLUCOSE_ENTRIES)
+        again = await cursors.get("cursor-p1", GLUCOSE_ENTRIES)
+        await cursors.advance("cursor-p1", GLUCOSE_ENTRIES, 2000, "b", 1)
+        await cursors.advance("cursor-p1", GLUCOSE_ENTRIES, 1500, "c", 1)
+        return first, again, await cursors.get("cursor-p1", GLUCOSE_ENTRIES)
+
+    first, again, latest = asyncio.run(run())
+
+    assert first == again == {"last_entry_date": 1000, "last_entry_id": "a"}
+    assert latest == {"last_entry_date": 2000, "last_entry_id": "b"}
+    methods = [request.method for request in fake_supabase.requests]
+    assert methods == ["GET", "POST"]
+    assert stored["last_entry_date"] == 2000
+
+def test_sync_fetches_and_stores_only_entries_past_the_cursor(fake_supabase, fake_nightscout, monkeypatch):
+    now = int(time.time() * 1000)
+    last = now - 10 * MINUTE_MS
+    stored = {"last_entry_date": last, "last_entry_id": "e-last"}
+    fake_supabase.on("data_sync_status", cursor_table(stored))
+    fake_supabase.on("glucose_readings", lambda request: json.loads(request.content))
+    fake_supabase.on("alerts", lambda request: json.loads(request.content))
+    monkeypatch.setattr(nightscout_module, "sync_cursors", SyncCursorStore())
+
+    entries = [
+        {"_id": f"e{index}", "date": now - index * 5 * MINUTE_MS, "sgv": 110, "direction": "Flat",
+         "dateString": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime((now - index * 5 * MINUTE_MS) / 1000))}
+        for index in range(2)
+    ]
+    requested = []
+
+    def nightscout(request):
+        requested.append(request.url.params)
+        return httpx.Response(200, json=entries)
+    fake_nightscout(nightscout)
+    service = NightscoutService(base_url="http://ns-sync.test", api_secret="")
+
+    result = asyncio.run(service.sync_glucose("sync-p1", 24))
+
+    assert requested[0]["find[date][$gt]"] == str(last)
+    assert result["fetched"] == 2 and result["new_entries"] == 2 and result["stored"] == 2
+    assert stored["last_entry_date"] == now and stored["last_entry_id"] == "e0"
@@ -0,0 +1,105 @@
+"""
+Tests for the write-behind queue that batches Supabase writes
+"""
+
+import asyncio
+import pytest
+from services import write_behind as write_behind_module
+from services.write_behind import WriteBehindQueue
+
+@pytest.fixture
+def batches(monkeypatch):
+    """Record every store_batch call; rows with glucose 0 fail"""
+    calls = []
+
+    async def store_batch(table, rows):
+        calls.append((table, rows))
+        if table == "broken":
+            raise RuntimeError("connection reset")
+        return {"success": True, "results": [
+            {"success": row["glucose"] != 0} for _, row in rows
+        ]}
+
+    monkeypatch.setattr(write_behind_module, "store_batch", store_batch)
+    return calls
+
+def reading(glucose):
+    return {"glucose": glucose}
+
+def test_submissions_from_several_patients_share_one_write(batches):
+    queue = WriteBehindQueue(max_size=100, batch_size=5, flush_interval=0.05)
+
+    async def run():
+        queue.start()
+        first = await queue.submit("glucose_readings", "p1", [reading(100), reading(0)])
+        second = await queue.submit("glucose_readings", "p2", [reading(120), reading(130), reading(140)])
+        return await first, await second
+
+    first, second = asyncio.run(run())
+
+    assert len(batches) == 1
+    assert [patient_id for patient_id, _ in batches[0][1]] == ["p1", "p1", "p2", "p2", "p2"]
+    assert first["stored"] == 1 and first["failed"] == 1 and first["success"] is False
+    assert second["stored"] == 3 and second["success"] is True
+    assert queue.get_stats()["rows_written"] == 4
+
+def test_partial_batches_flush_after_the_interval(batches):
+    queue = WriteBehindQueue(max_size=100, batch_size=50, flush_interval=0.02)
+
+    async def run():
+        queue.start()
+        pending = await queue.submit("treatments", "p1", [reading(100)])
+        result = await asyncio.wait_for(pending, 1)
+        await queue.stop()
+        return result
+
+    assert asyncio.run(run())["stored"] == 1
+    assert batches[0][0] == "treatments"
+
+def test_completion_callback_runs_before_the_future_resolves(batches):
+    queue = WriteBehindQueue(max_size=100, batch_size=50, flush_interval=10)
+    order = []
+
+    async def on_done(result):
+        order.append(("callback", result["stored"]))
+
+    async def run():
+        queue.start()
+        pending = await queue.submit("glucose_readings", "p1", [reading(100)], on_done=on_done)
+        pending.add_done_callback(lambda _: order.append(("future", None)))
+        # Stopping flushes rows that were still waiting for the interval
+        await queue.stop()
+        await asyncio.sleep(0)
+        return pending.result()
+
+    assert asyncio.run(run())["stored"] == 1
+    assert order == [("callback", 1), ("future", None)]
+    assert queue.running is False
+
+def test_failed_flush_marks_every_row_failed(batches):
+    queue = WriteBehindQueue(max_size=100, batch_size=2, flush_interval=0.05)
+
+    async def run():
+        queue.start()
+        stored = await queue.submit("glucose_readings", "p1", [reading(100)])
+        failed = await queue.submit("broken", "p1", [reading(100)])
+        results = await stored, await failed
+        await queue.stop()
+        return results
+
+    stored, failed = asyncio.run(run())
+
+    assert stored["success"] is True
+    assert failed["failed"] == 1 and failed["results"][0]["error"] == "connection reset"
+
+def test_without_a_flusher_rows_are_written_immediately(batches):
+    queue = WriteBehindQueue(max_size=100, batch_size=50, flush_interval=10)
+
+    async def run():
+        pending = await queue.submit("glucose_readings", "p1", [reading(100), reading(110)])
+        return pending.done(), pending.result()
+
+    done, result = asyncio.run(run())
+
+    assert done is True and result["stored"] == 2
+    assert len(batches) == 1